@@ -10,7 +10,17 @@ DB_CONFIG = {
     'user': 'root',
     'password': '121024',
     'database': 'supermarket_db',
-    'charset': 'utf8mb4'
+    'charset': 'utf8mb4',
+    # 连接池配置（12个收银台建议 max_size 不低于 收银台数 + 后台终端数）
+    'pool': {
+        'enabled': True,
+        'min_size': 2,          # 最小保留连接数
+        'max_size': 10,         # 最大连接数
+        'idle_timeout': 300,    # 空闲回收时间（秒）
+        'max_lifetime': 3600,   # 连接最长存活时间（秒）
+        'ping_on_borrow': True, # 借出前检测连接
+        'borrow_timeout': 10,   # 连接耗尽时最长等待时间（秒）
+    }
 }
 
 # 系统配置
@@ -19,4 +29,25 @@ SYSTEM_CONFIG = {
     'version': '1.0.0',
     'return_limit_days': 7,  # 退货期限（天）
     'points_rate': 1,  # 积分比例：1元=1积分
+    'barcode_cache_size': 5000,  # 收银台条码缓存最大条目数
+    'barcode_cache_ttl': 300,  # 条码缓存有效期（秒），其他终端改价后最迟在此时间后生效
+    'lane_id': 1,  # 收银台编号（0-99），写入订单号便于区分来源
+    'order_no_block_size': 50,  # 每次向数据库预留的订单号数量
+    'category_cache_ttl': 300,  # 分类树缓存有效期（秒），本机增删改分类时立即失效
+    'closure_retry_interval': 300,  # 分类闭包表检查/重建失败（非权限不足）后再次尝试的间隔（秒）
+    'search_index_refresh': 30,  # 商品搜索索引检查更新的间隔（秒）
+    'search_in_list_max': 500,  # 列表按关键词查询时 IN 条件最多携带的商品ID数，超出时分页查询按游标分段，统计改用 LIKE
+    'member_cache_size': 2000,  # 收银台会员查询缓存最大条目数
+    'member_cache_ttl': 60,  # 会员查询缓存有效期（秒），其他终端修改会员后最迟在此时间后生效
+    'rule_cache_check_interval': 30,  # 会员等级规则缓存检查版本号的间隔（秒）
+    'inventory_snapshot_keep_days': 90,  # 库存快照保留天数（流水不清理）
+    'warning_scan_overlap': 60,  # 库存预警增量扫描的水位线回退秒数（无 PROCESS 权限查询进行中事务时，应不小于 innodb_lock_wait_timeout）
+    'warning_full_scan_interval': 3600,  # 库存预警全量扫描兜底间隔（秒）
+    'notification_dedup_window': 3600,  # 同类库存预警在此时间内（秒）且未读时原地更新，不新建通知
+    'notify_broker': None,  # 通知中转服务地址 ('127.0.0.1', 9631)，None 表示只在本机进程内推送
+    'notification_poll_interval': 30,  # 未连接中转服务时查询未读通知数的间隔（秒）
+    'notification_resync_interval': 600,  # 已连接中转服务时校正未读通知数的间隔（秒）
+    'notification_keep_days': 30,  # 已读通知在通知表中保留的天数，超过后由归档任务移入归档表
+    'return_order_cache_size': 500,  # 退货台会员可退货订单缓存最大会员数
+    'return_order_cache_ttl': 60,  # 会员可退货订单缓存有效期（秒），0表示不缓存；本机退货后立即失效
 }
@@ -3,53 +3,345 @@
 数据库连接与基础CRUD操作
 """
 
+import threading
+import time
 import pymysql
 from config import DB_CONFIG
 
 
+# 连接池默认参数（可在 config.DB_CONFIG['pool'] 中覆盖）
+POOL_DEFAULTS = {
+    'enabled': True,         # 是否启用连接池
+    'min_size': 1,           # 最小保留连接数
+    'max_size': 10,          # 最大连接数
+    'idle_timeout': 300,     # 空闲超过该秒数的连接在借出前回收
+    'max_lifetime': 3600,    # 连接最长存活秒数，超过后回收重建
+    'ping_on_borrow': True,  # 借出前ping检测连接是否可用
+    'borrow_timeout': 10,    # 连接耗尽时等待的最长秒数
+}
+
+
+class PoolTimeoutError(Exception):
+    """连接池耗尽且等待超时"""
+
+
+class _PooledConn:
+    """连接池中的连接及其元信息"""
+
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """有界、线程安全的数据库连接池"""
+
+    def __init__(self, conn_kwargs, min_size=1, max_size=10, idle_timeout=300,
+                 max_lifetime=3600, ping_on_borrow=True, borrow_timeout=10, **_):
+        if max_size < 1:
+            raise ValueError("max_size 必须大于0")
+        self.conn_kwargs = conn_kwargs
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_on_borrow = ping_on_borrow
+        self.borrow_timeout = borrow_timeout
+
+        self._idle = []          # 空闲连接（后进先出，热连接优先复用）
+        self._in_use = {}        # id(raw) -> _PooledConn
+        self._size = 0           # 已创建且未关闭的连接总数
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._stats = {
+            'borrowed': 0,
+            'created': 0,
+            'recycled': 0,
+            'ping_failed': 0,
+            'timeouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+        }
+
+        self._prefill()
+
+    def _prefill(self):
+        """预建最小连接数（数据库暂不可用时忽略，首次借出时再建）"""
+        for _ in range(self.min_size):
+            try:
+                pooled = self._new_conn()
+            except Exception:
+                return
+            with self._cond:
+                self._size += 1
+                self._idle.append(pooled)
+
+    def _new_conn(self):
+        raw = pymysql.connect(**self.conn_kwargs)
+        with self._cond:
+            self._stats['created'] += 1
+        return _PooledConn(raw)
+
+    def _is_expired(self, pooled, now):
+        if self.max_lifetime and now - pooled.created_at > self.max_lifetime:
+            return True
+        if self.idle_timeout and now - pooled.last_used > self.idle_timeout:
+            return True
+        return False
+
+    @staticmethod
+    def _close_raw(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """
+        借出一个连接
+        :return: pymysql 连接对象
+        """
+        start = time.monotonic()
+        deadline = start + self.borrow_timeout if self.borrow_timeout else None
+
+        while True:
+            pooled = None
+            need_new = False
+            discard = []
+
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if self._is_expired(candidate, now):
+                            self._size -= 1
+                            self._stats['recycled'] += 1
+                            discard.append(candidate)
+                            continue
+                        pooled = candidate
+                        break
+                    if pooled:
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        need_new = True
+                        break
+                    remaining = None if deadline is None else deadline - now
+                    if remaining is not None and remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        for item in discard:
+                            self._close_raw(item.raw)
+                        raise PoolTimeoutError(
+                            f"获取数据库连接超时（{self.borrow_timeout}秒，连接数已达上限{self.max_size}）")
+                    self._cond.wait(remaining)
+
+            for item in discard:
+                self._close_raw(item.raw)
+
+            if need_new:
+                try:
+                    pooled = self._new_conn()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif self.ping_on_borrow:
+                try:
+                    pooled.raw.ping(reconnect=False)
+                except Exception:
+                    self._close_raw(pooled.raw)
+                    with self._cond:
+                        self._size -= 1
+                        self._stats['ping_failed'] += 1
+                        self._stats['recycled'] += 1
+                        self._cond.notify()
+                    continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._in_use[id(pooled.raw)] = pooled
+                self._stats['borrowed'] += 1
+                self._stats['wait_total'] += waited
+                if waited > self._stats['wait_max']:
+                    self._stats['wait_max'] = waited
+            return pooled.raw
+
+    def release(self, raw, discard=False):
+        """
+        归还连接
+        :param raw: acquire 借出的连接
+        :param discard: 为True时直接关闭该连接（如连接已出错）
+        """
+        with self._cond:
+            pooled = self._in_use.pop(id(raw), None)
+        if pooled is None:
+            self._close_raw(raw)
+            return
+
+        if not discard:
+            # 归还前回滚未提交的事务，保证下一个借用者拿到干净的连接
+            try:
+                raw.rollback()
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        if not discard and self.max_lifetime and now - pooled.created_at > self.max_lifetime:
+            discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                self._stats['recycled'] += 1
+            else:
+                pooled.last_used = now
+                self._idle.append(pooled)
+            self._cond.notify()
+
+        if discard or self._closed:
+            self._close_raw(raw)
+
+    def get_stats(self):
+        """
+        获取连接池统计信息
+        :return: dict
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        borrowed = stats['borrowed']
+        stats['wait_avg'] = stats['wait_total'] / borrowed if borrowed else 0.0
+        return stats
+
+    def close_all(self):
+        """关闭连接池中的所有空闲连接，借出中的连接在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_raw(pooled.raw)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _split_config():
+    """拆分 DB_CONFIG：连接参数 + 连接池参数"""
+    conn_kwargs = {k: v for k, v in DB_CONFIG.items() if k != 'pool'}
+    pool_options = dict(POOL_DEFAULTS)
+    pool_options.update(DB_CONFIG.get('pool') or {})
+    return conn_kwargs, pool_options
+
+
+def get_pool():
+    """获取进程内共享的连接池（未启用时返回None）"""
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            conn_kwargs, pool_options = _split_config()
+            if not pool_options.get('enabled'):
+                return None
+            _pool = ConnectionPool(conn_kwargs, **pool_options)
+    return _pool
+
+
+def get_pool_stats():
+    """获取连接池统计信息（借出等待时间、使用中、已创建、已回收等）"""
+    pool = get_pool()
+    if pool is None:
+        return {"success": False, "data": None, "message": "连接池未启用"}
+    return {"success": True, "data": pool.get_stats(), "message": "获取成功"}
+
+
+def close_pool():
+    """关闭连接池（程序退出时调用）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+
 class DBConnection:
     """数据库连接类"""
-    
+
     def __init__(self):
         self.conn = None
         self.cursor = None
-    
+        self._pool = None
+
     def connect(self):
-        """建立数据库连接"""
-        self.conn = pymysql.connect(**DB_CONFIG)
+        """建立数据库连接（启用连接池时从池中借出）"""
+        self._pool = get_pool()
+        if self._pool is not None:
+            self.conn = self._pool.acquire()
+        else:
+            conn_kwargs, _ = _split_config()
+            self.conn = pymysql.connect(**conn_kwargs)
         self.cursor = self.conn.cursor(pymysql.cursors.DictCursor)
         return self
-    
+
     def close(self):
-        """关闭数据库连接"""
+        """关闭数据库连接（启用连接池时归还到池中）"""
         if self.cursor:
-            self.cursor.close()
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+            self.cursor = None
         if self.conn:
-            self.conn.close()
-    
+            if self._pool is not None:
+                self._pool.release(self.conn)
+            else:
+                self.conn.close()
+            self.conn = None
+
     def execute(self, sql, params=None):
         """执行SQL语句"""
         self.cursor.execute(sql, params)
         return self.cursor
-    
+
+    def executemany(self, sql, params_list):
+        """批量执行SQL语句"""
+        self.cursor.executemany(sql, params_list)
+        return self.cursor
+
     def commit(self):
         """提交事务"""
         self.conn.commit()
-    
+
     def rollback(self):
         """回滚事务"""
         self.conn.rollback()
-    
+
     def fetchone(self):
         """获取单条记录"""
         return self.cursor.fetchone()
-    
+
     def fetchall(self):
         """获取所有记录"""
         return self.cursor.fetchall()
-    
+
     def __enter__(self):
         return self.connect()
-    
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
@@ -68,9 +68,12 @@ CREATE TABLE member (
     status ENUM('active', 'disabled') DEFAULT 'active' COMMENT '状态: active-正常, disabled-禁用',
     create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '注册时间',
     update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    phone_rev VARCHAR(20) AS (REVERSE(phone)) STORED COMMENT '倒序手机号(按尾号查询用)',
     FOREIGN KEY (user_id) REFERENCES sys_user(user_id),
     INDEX idx_card_no (card_no),
     INDEX idx_phone (phone),
+    INDEX idx_phone_rev (phone_rev),
+    INDEX idx_name (name),
     INDEX idx_level (level_code)
 ) ENGINE=InnoDB COMMENT='会员表';
 
@@ -107,6 +110,17 @@ CREATE TABLE goods_category (
     INDEX idx_level (level)
 ) ENGINE=InnoDB COMMENT='商品分类表(课-类-种)';
 
+-- 3.1.1 商品分类闭包表 (goods_category_closure)，每个分类与其所有祖先（含自身）各一行
+CREATE TABLE goods_category_closure (
+    ancestor_id INT NOT NULL COMMENT '祖先分类ID',
+    descendant_id INT NOT NULL COMMENT '后代分类ID',
+    depth TINYINT NOT NULL COMMENT '层级差: 0-自身',
+    PRIMARY KEY (ancestor_id, descendant_id),
+    INDEX idx_descendant (descendant_id),
+    FOREIGN KEY (ancestor_id) REFERENCES goods_category(category_id),
+    FOREIGN KEY (descendant_id) REFERENCES goods_category(category_id)
+) ENGINE=InnoDB COMMENT='商品分类闭包表';
+
 -- 3.2 货架区域表 (shelf_area)
 CREATE TABLE shelf_area (
     area_id INT PRIMARY KEY AUTO_INCREMENT COMMENT '区域ID',
@@ -151,7 +165,8 @@ CREATE TABLE goods (
     FOREIGN KEY (shelf_id) REFERENCES shelf(shelf_id),
     INDEX idx_barcode (barcode),
     INDEX idx_category (category_id),
-    INDEX idx_shelf_status (shelf_status)
+    INDEX idx_shelf_status (shelf_status),
+    INDEX idx_update_time (update_time)
 ) ENGINE=InnoDB COMMENT='商品表';
 
 -- 3.5 库存表 (inventory)
@@ -165,9 +180,36 @@ CREATE TABLE inventory (
     stock_status ENUM('sufficient', 'stock_shortage', 'shelf_shortage') DEFAULT 'sufficient' COMMENT '库存状态: sufficient-充足, stock_shortage-库存短缺, shelf_shortage-在架短缺',
     update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     FOREIGN KEY (goods_id) REFERENCES goods(goods_id),
-    INDEX idx_status (stock_status)
+    INDEX idx_status (stock_status),
+    INDEX idx_update_time (update_time)
 ) ENGINE=InnoDB COMMENT='库存表';
 
+-- 3.5.1 库存流水表 (inventory_movement)，只追加，与库存变更在同一事务中写入
+CREATE TABLE inventory_movement (
+    movement_id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '流水ID',
+    goods_id INT NOT NULL COMMENT '商品ID',
+    location ENUM('stock', 'shelf') NOT NULL COMMENT '库位: stock-仓库, shelf-货架',
+    change_qty DECIMAL(12,3) NOT NULL COMMENT '变动数量(增加为正, 减少为负)',
+    balance_after DECIMAL(12,3) NOT NULL COMMENT '变动后数量',
+    movement_type VARCHAR(20) NOT NULL COMMENT '变动类型: sale-销售, return-退货, stock_in-入库, transfer-移库上架, adjust-调整',
+    ref_no VARCHAR(50) COMMENT '关联单号(订单号/退货单号/批次号)',
+    create_time DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) COMMENT '变动时间',
+    FOREIGN KEY (goods_id) REFERENCES goods(goods_id),
+    INDEX idx_goods_time (goods_id, create_time),
+    INDEX idx_create_time (create_time)
+) ENGINE=InnoDB COMMENT='库存流水表';
+
+-- 3.5.2 库存快照表 (inventory_snapshot)，定期整表快照，时点查询 = 最近快照 + 流水ID在快照之后的流水
+CREATE TABLE inventory_snapshot (
+    snapshot_time DATETIME(6) NOT NULL COMMENT '快照时间',
+    goods_id INT NOT NULL COMMENT '商品ID',
+    stock_num DECIMAL(12,3) NOT NULL COMMENT '仓库数量',
+    on_shelf_num DECIMAL(12,3) NOT NULL COMMENT '在架数量',
+    last_movement_id BIGINT NOT NULL DEFAULT 0 COMMENT '快照包含的最大流水ID（之后的流水 movement_id 都大于它）',
+    PRIMARY KEY (goods_id, snapshot_time),
+    INDEX idx_snapshot_time (snapshot_time)
+) ENGINE=InnoDB COMMENT='库存快照表';
+
 -- 3.6 商品操作记录表 (goods_operation_log)
 CREATE TABLE goods_operation_log (
     log_id INT PRIMARY KEY AUTO_INCREMENT COMMENT '日志ID',
@@ -203,7 +245,7 @@ CREATE TABLE order_info (
     FOREIGN KEY (member_id) REFERENCES member(member_id),
     FOREIGN KEY (cashier_id) REFERENCES sys_user(user_id),
     INDEX idx_order_no (order_no),
-    INDEX idx_member (member_id),
+    INDEX idx_member_status_time (member_id, order_status, complete_time),
     INDEX idx_status (order_status),
     INDEX idx_create_time (create_time)
 ) ENGINE=InnoDB COMMENT='订单表';
@@ -219,6 +261,7 @@ CREATE TABLE order_detail (
     quantity DECIMAL(10,3) NOT NULL COMMENT '数量/重量',
     discount DECIMAL(3,2) DEFAULT 1.00 COMMENT '折扣',
     subtotal DECIMAL(12,2) NOT NULL COMMENT '小计金额',
+    cost_price DECIMAL(10,2) COMMENT '结账时成本价(统计毛利用，结账时写入)',
     is_returned TINYINT DEFAULT 0 COMMENT '是否已退货: 0-否, 1-是',
     returned_quantity DECIMAL(10,3) DEFAULT 0 COMMENT '已退货数量',
     FOREIGN KEY (order_id) REFERENCES order_info(order_id),
@@ -238,6 +281,55 @@ CREATE TABLE payment_record (
     INDEX idx_order (order_id)
 ) ENGINE=InnoDB COMMENT='支付记录表';
 
+-- 4.4 单号序列表 (sys_sequence)
+CREATE TABLE sys_sequence (
+    seq_name VARCHAR(50) PRIMARY KEY COMMENT '序列名（如 order_no:20260118）',
+    current_value BIGINT NOT NULL DEFAULT 0 COMMENT '已分配的最大值',
+    update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB COMMENT='单号序列表';
+
+-- 4.5 销售汇总表-按小时 (stat_sales_hourly)，结账时增量维护，按订单创建时间归档
+CREATE TABLE stat_sales_hourly (
+    stat_date DATE NOT NULL COMMENT '日期',
+    stat_hour TINYINT NOT NULL COMMENT '小时(0-23)',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '订单数',
+    sales_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '实收金额',
+    member_order_count INT NOT NULL DEFAULT 0 COMMENT '会员订单数',
+    member_sales DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '会员实收金额',
+    cost_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '成本金额(按结账时进价)',
+    PRIMARY KEY (stat_date, stat_hour)
+) ENGINE=InnoDB COMMENT='销售汇总表(小时)';
+
+-- 4.6 商品销售汇总表-按天 (stat_goods_daily)，退货数量记入原订单日期
+CREATE TABLE stat_goods_daily (
+    stat_date DATE NOT NULL COMMENT '日期',
+    goods_id INT NOT NULL COMMENT '商品ID',
+    sale_qty DECIMAL(14,3) NOT NULL DEFAULT 0 COMMENT '销售数量',
+    sale_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '销售金额(明细小计)',
+    cost_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '成本金额',
+    return_qty DECIMAL(14,3) NOT NULL DEFAULT 0 COMMENT '退货数量',
+    return_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '退款金额',
+    PRIMARY KEY (stat_date, goods_id),
+    INDEX idx_goods (goods_id)
+) ENGINE=InnoDB COMMENT='商品销售汇总表(天)';
+
+-- 4.7 会员消费汇总表-按天 (stat_member_daily)
+CREATE TABLE stat_member_daily (
+    stat_date DATE NOT NULL COMMENT '日期',
+    member_id INT NOT NULL COMMENT '会员ID',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '订单数',
+    sales_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '消费金额',
+    PRIMARY KEY (stat_date, member_id),
+    INDEX idx_member (member_id)
+) ENGINE=InnoDB COMMENT='会员消费汇总表(天)';
+
+-- 4.8 退货汇总表-按天 (stat_return_daily)，按退货时间归档
+CREATE TABLE stat_return_daily (
+    stat_date DATE NOT NULL PRIMARY KEY COMMENT '日期',
+    return_count INT NOT NULL DEFAULT 0 COMMENT '退货单数',
+    refund_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '退款金额'
+) ENGINE=InnoDB COMMENT='退货汇总表(天)';
+
 -- =====================================================
 -- 五、退货管理模块
 -- =====================================================
@@ -370,11 +462,48 @@ CREATE TABLE sys_notification (
     is_read TINYINT DEFAULT 0 COMMENT '是否已读: 0-未读, 1-已读',
     create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     read_time DATETIME COMMENT '阅读时间',
+    audience_role VARCHAR(20) AS (COALESCE(NULLIF(target_role, ''), '*')) STORED COMMENT '受众角色键(*表示不限)',
+    audience_user INT AS (COALESCE(target_user_id, 0)) STORED COMMENT '受众用户键(0表示不限)',
     FOREIGN KEY (target_user_id) REFERENCES sys_user(user_id),
     INDEX idx_target_user (target_user_id),
-    INDEX idx_is_read (is_read)
+    INDEX idx_is_read (is_read),
+    INDEX idx_audience_time (audience_role, audience_user, create_time),
+    INDEX idx_unread_audience (is_read, audience_role, audience_user),
+    INDEX idx_read_time (is_read, read_time)
 ) ENGINE=InnoDB COMMENT='系统通知表';
 
+-- 8.1.1 未读通知计数表 (sys_notification_unread)，按受众键物化未读数，随通知新建/已读在同一事务中维护
+CREATE TABLE sys_notification_unread (
+    audience_role VARCHAR(20) NOT NULL COMMENT '受众角色键(*表示不限)',
+    audience_user INT NOT NULL COMMENT '受众用户键(0表示不限)',
+    unread_count INT NOT NULL DEFAULT 0 COMMENT '未读数',
+    PRIMARY KEY (audience_role, audience_user)
+) ENGINE=InnoDB COMMENT='未读通知计数表';
+
+-- 8.1.2 通知归档表 (sys_notification_archive)，已读超过保留天数的通知由归档任务移入
+CREATE TABLE sys_notification_archive (
+    notification_id INT PRIMARY KEY COMMENT '通知ID',
+    target_user_id INT COMMENT '目标用户ID(空表示广播)',
+    target_role ENUM('admin', 'cashier', 'goods_manager', 'after_sale') COMMENT '目标角色',
+    notification_type VARCHAR(50) NOT NULL COMMENT '通知类型',
+    title VARCHAR(100) NOT NULL COMMENT '通知标题',
+    content TEXT COMMENT '通知内容',
+    related_id INT COMMENT '关联业务ID',
+    is_read TINYINT DEFAULT 1 COMMENT '是否已读',
+    create_time DATETIME COMMENT '创建时间',
+    read_time DATETIME COMMENT '阅读时间',
+    archive_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '归档时间',
+    INDEX idx_create_time (create_time)
+) ENGINE=InnoDB COMMENT='通知归档表';
+
+-- 8.1.3 集合型通知去重表 (sys_notification_digest)，如库存预警：记录上次通知时的商品集合，只在有新商品进入集合时通知
+CREATE TABLE sys_notification_digest (
+    digest_key VARCHAR(64) PRIMARY KEY COMMENT '去重键: 通知类型:子类',
+    notification_id INT COMMENT '最近一次通知ID',
+    related_ids MEDIUMTEXT COMMENT '上次检查时集合中的关联ID(逗号分隔)',
+    notify_time DATETIME COMMENT '最近一次新建通知的时间'
+) ENGINE=InnoDB COMMENT='集合型通知去重表';
+
 -- =====================================================
 -- 初始化数据
 -- =====================================================
@@ -534,24 +663,37 @@ GRANT SELECT ON supermarket_db.goods TO 'sm_cashier'@'localhost';
 GRANT SELECT ON supermarket_db.inventory TO 'sm_cashier'@'localhost';
 GRANT SELECT, INSERT, UPDATE ON supermarket_db.order_info TO 'sm_cashier'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.order_detail TO 'sm_cashier'@'localhost';
+GRANT UPDATE (cost_price) ON supermarket_db.order_detail TO 'sm_cashier'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.payment_record TO 'sm_cashier'@'localhost';
-GRANT UPDATE (total_consume, total_points) ON supermarket_db.member TO 'sm_cashier'@'localhost';
+GRANT UPDATE (total_consume, total_points, level_code) ON supermarket_db.member TO 'sm_cashier'@'localhost';
 GRANT UPDATE (on_shelf_num, stock_status) ON supermarket_db.inventory TO 'sm_cashier'@'localhost';
+GRANT INSERT ON supermarket_db.inventory_movement TO 'sm_cashier'@'localhost';
 GRANT INSERT ON supermarket_db.member_change_log TO 'sm_cashier'@'localhost';
+GRANT INSERT ON supermarket_db.sys_notification TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_unread TO 'sm_cashier'@'localhost';
 GRANT SELECT ON supermarket_db.v_goods_on_sale TO 'sm_cashier'@'localhost';
 GRANT SELECT ON supermarket_db.v_member_info TO 'sm_cashier'@'localhost';
 GRANT SELECT ON supermarket_db.v_hanged_orders TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_sequence TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_sales_hourly TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_goods_daily TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_member_daily TO 'sm_cashier'@'localhost';
 
 -- 商品管理员权限
 GRANT SELECT, INSERT, UPDATE ON supermarket_db.goods_category TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT, DELETE ON supermarket_db.goods_category_closure TO 'sm_goods_manager'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.shelf_area TO 'sm_goods_manager'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.shelf TO 'sm_goods_manager'@'localhost';
 GRANT SELECT, INSERT, UPDATE ON supermarket_db.goods TO 'sm_goods_manager'@'localhost';
 GRANT SELECT, INSERT, UPDATE ON supermarket_db.inventory TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT ON supermarket_db.inventory_movement TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT ON supermarket_db.inventory_snapshot TO 'sm_goods_manager'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.goods_operation_log TO 'sm_goods_manager'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.stock_in_record TO 'sm_goods_manager'@'localhost';
 GRANT SELECT, UPDATE ON supermarket_db.quality_feedback TO 'sm_goods_manager'@'localhost';
-GRANT SELECT ON supermarket_db.sys_notification TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_digest TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_unread TO 'sm_goods_manager'@'localhost';
 GRANT SELECT ON supermarket_db.v_inventory_warning TO 'sm_goods_manager'@'localhost';
 GRANT SELECT ON supermarket_db.v_pending_quality_feedback TO 'sm_goods_manager'@'localhost';
 GRANT SELECT ON supermarket_db.v_category_tree TO 'sm_goods_manager'@'localhost';
@@ -562,6 +704,8 @@ GRANT SELECT ON supermarket_db.order_info TO 'sm_after_sale'@'localhost';
 GRANT SELECT ON supermarket_db.order_detail TO 'sm_after_sale'@'localhost';
 GRANT SELECT ON supermarket_db.payment_record TO 'sm_after_sale'@'localhost';
 GRANT SELECT ON supermarket_db.goods TO 'sm_after_sale'@'localhost';
+GRANT SELECT ON supermarket_db.goods_category TO 'sm_after_sale'@'localhost';
+GRANT SELECT ON supermarket_db.goods_category_closure TO 'sm_after_sale'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.return_record TO 'sm_after_sale'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.return_detail TO 'sm_after_sale'@'localhost';
 GRANT SELECT, INSERT ON supermarket_db.quality_feedback TO 'sm_after_sale'@'localhost';
@@ -570,9 +714,15 @@ GRANT UPDATE (order_status) ON supermarket_db.order_info TO 'sm_after_sale'@'loc
 GRANT UPDATE (is_returned, returned_quantity) ON supermarket_db.order_detail TO 'sm_after_sale'@'localhost';
 GRANT UPDATE (total_consume, total_points, level_code) ON supermarket_db.member TO 'sm_after_sale'@'localhost';
 GRANT UPDATE (stock_num, on_shelf_num, stock_status) ON supermarket_db.inventory TO 'sm_after_sale'@'localhost';
+GRANT INSERT ON supermarket_db.inventory_movement TO 'sm_after_sale'@'localhost';
 GRANT INSERT ON supermarket_db.member_change_log TO 'sm_after_sale'@'localhost';
+GRANT INSERT ON supermarket_db.sys_notification TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_unread TO 'sm_after_sale'@'localhost';
 GRANT SELECT ON supermarket_db.v_returnable_orders TO 'sm_after_sale'@'localhost';
 GRANT SELECT ON supermarket_db.v_return_summary TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_sequence TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_goods_daily TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_return_daily TO 'sm_after_sale'@'localhost';
 
 -- 统计视图权限
 GRANT SELECT ON supermarket_db.v_daily_sales TO 'sm_admin'@'localhost';
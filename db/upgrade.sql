@@ -0,0 +1,246 @@
+-- =====================================================
+-- 超市前台销售系统 - 数据库升级脚本
+-- 将按旧版 schema.sql 建立的 supermarket_db 升级到当前结构
+-- 可重复执行：表用 CREATE TABLE IF NOT EXISTS，列和索引先查 information_schema 再添加
+-- 执行后重建分类闭包表和统计汇总表（见 README 安装步骤 2）
+-- =====================================================
+
+USE supermarket_db;
+
+-- =====================================================
+-- 辅助存储过程（脚本末尾删除）
+-- =====================================================
+
+DROP PROCEDURE IF EXISTS sm_add_column;
+DROP PROCEDURE IF EXISTS sm_add_index;
+DROP PROCEDURE IF EXISTS sm_drop_index;
+
+DELIMITER $$
+
+-- 列不存在时执行 ALTER TABLE tbl ADD COLUMN ddl
+CREATE PROCEDURE sm_add_column(IN tbl VARCHAR(64), IN col VARCHAR(64), IN ddl TEXT)
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.COLUMNS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = tbl AND COLUMN_NAME = col) THEN
+        SET @sm_sql = CONCAT('ALTER TABLE ', tbl, ' ADD COLUMN ', ddl);
+        PREPARE stmt FROM @sm_sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+
+-- 索引不存在时执行 ALTER TABLE tbl ADD INDEX idx (cols)
+CREATE PROCEDURE sm_add_index(IN tbl VARCHAR(64), IN idx VARCHAR(64), IN cols VARCHAR(255))
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.STATISTICS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = tbl AND INDEX_NAME = idx) THEN
+        SET @sm_sql = CONCAT('ALTER TABLE ', tbl, ' ADD INDEX ', idx, ' (', cols, ')');
+        PREPARE stmt FROM @sm_sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+
+-- 索引存在时删除
+CREATE PROCEDURE sm_drop_index(IN tbl VARCHAR(64), IN idx VARCHAR(64))
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.STATISTICS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = tbl AND INDEX_NAME = idx) THEN
+        SET @sm_sql = CONCAT('ALTER TABLE ', tbl, ' DROP INDEX ', idx);
+        PREPARE stmt FROM @sm_sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+
+DELIMITER ;
+
+-- =====================================================
+-- 一、已有表的新增列和索引
+-- =====================================================
+
+-- 会员表：倒序手机号（按尾号查询）、姓名索引
+CALL sm_add_column('member', 'phone_rev',
+    "phone_rev VARCHAR(20) AS (REVERSE(phone)) STORED COMMENT '倒序手机号(按尾号查询用)'");
+CALL sm_add_index('member', 'idx_phone_rev', 'phone_rev');
+CALL sm_add_index('member', 'idx_name', 'name');
+
+-- 订单明细表：结账时成本价（升级前的明细为空，统计时按商品当前成本价计算）
+CALL sm_add_column('order_detail', 'cost_price',
+    "cost_price DECIMAL(10,2) COMMENT '结账时成本价(统计毛利用，结账时写入)' AFTER subtotal");
+
+-- 商品表、库存表：按更新时间增量扫描
+CALL sm_add_index('goods', 'idx_update_time', 'update_time');
+CALL sm_add_index('inventory', 'idx_update_time', 'update_time');
+
+-- 订单表：会员订单查询用组合索引替换 idx_member（先建新索引，外键始终有可用索引）
+CALL sm_add_index('order_info', 'idx_member_status_time', 'member_id, order_status, complete_time');
+CALL sm_drop_index('order_info', 'idx_member');
+
+-- 系统通知表：受众键和未读/归档查询索引
+CALL sm_add_column('sys_notification', 'audience_role',
+    "audience_role VARCHAR(20) AS (COALESCE(NULLIF(target_role, ''), '*')) STORED COMMENT '受众角色键(*表示不限)'");
+CALL sm_add_column('sys_notification', 'audience_user',
+    "audience_user INT AS (COALESCE(target_user_id, 0)) STORED COMMENT '受众用户键(0表示不限)'");
+CALL sm_add_index('sys_notification', 'idx_audience_time', 'audience_role, audience_user, create_time');
+CALL sm_add_index('sys_notification', 'idx_unread_audience', 'is_read, audience_role, audience_user');
+CALL sm_add_index('sys_notification', 'idx_read_time', 'is_read, read_time');
+
+-- =====================================================
+-- 二、新增表
+-- =====================================================
+
+-- 商品分类闭包表 (goods_category_closure)，升级后执行 python -m logic.goods_category_logic rebuild 填充
+CREATE TABLE IF NOT EXISTS goods_category_closure (
+    ancestor_id INT NOT NULL COMMENT '祖先分类ID',
+    descendant_id INT NOT NULL COMMENT '后代分类ID',
+    depth TINYINT NOT NULL COMMENT '层级差: 0-自身',
+    PRIMARY KEY (ancestor_id, descendant_id),
+    INDEX idx_descendant (descendant_id),
+    FOREIGN KEY (ancestor_id) REFERENCES goods_category(category_id),
+    FOREIGN KEY (descendant_id) REFERENCES goods_category(category_id)
+) ENGINE=InnoDB COMMENT='商品分类闭包表';
+
+-- 库存流水表 (inventory_movement)
+CREATE TABLE IF NOT EXISTS inventory_movement (
+    movement_id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '流水ID',
+    goods_id INT NOT NULL COMMENT '商品ID',
+    location ENUM('stock', 'shelf') NOT NULL COMMENT '库位: stock-仓库, shelf-货架',
+    change_qty DECIMAL(12,3) NOT NULL COMMENT '变动数量(增加为正, 减少为负)',
+    balance_after DECIMAL(12,3) NOT NULL COMMENT '变动后数量',
+    movement_type VARCHAR(20) NOT NULL COMMENT '变动类型: sale-销售, return-退货, stock_in-入库, transfer-移库上架, adjust-调整',
+    ref_no VARCHAR(50) COMMENT '关联单号(订单号/退货单号/批次号)',
+    create_time DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) COMMENT '变动时间',
+    FOREIGN KEY (goods_id) REFERENCES goods(goods_id),
+    INDEX idx_goods_time (goods_id, create_time),
+    INDEX idx_create_time (create_time)
+) ENGINE=InnoDB COMMENT='库存流水表';
+
+-- 库存快照表 (inventory_snapshot)，升级后执行 python -m logic.inventory_ledger_logic snapshot 写入首个快照
+CREATE TABLE IF NOT EXISTS inventory_snapshot (
+    snapshot_time DATETIME(6) NOT NULL COMMENT '快照时间',
+    goods_id INT NOT NULL COMMENT '商品ID',
+    stock_num DECIMAL(12,3) NOT NULL COMMENT '仓库数量',
+    on_shelf_num DECIMAL(12,3) NOT NULL COMMENT '在架数量',
+    last_movement_id BIGINT NOT NULL DEFAULT 0 COMMENT '快照包含的最大流水ID（之后的流水 movement_id 都大于它）',
+    PRIMARY KEY (goods_id, snapshot_time),
+    INDEX idx_snapshot_time (snapshot_time)
+) ENGINE=InnoDB COMMENT='库存快照表';
+CALL sm_add_column('inventory_snapshot', 'last_movement_id',
+    "last_movement_id BIGINT NOT NULL DEFAULT 0 COMMENT '快照包含的最大流水ID（之后的流水 movement_id 都大于它）'");
+
+-- 单号序列表 (sys_sequence)，当天序号首次分配时按已有单号自动接续
+CREATE TABLE IF NOT EXISTS sys_sequence (
+    seq_name VARCHAR(50) PRIMARY KEY COMMENT '序列名（如 order_no:20260118）',
+    current_value BIGINT NOT NULL DEFAULT 0 COMMENT '已分配的最大值',
+    update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB COMMENT='单号序列表';
+
+-- 统计汇总表 (stat_*)，升级后执行 python -m logic.stat_rollup_logic 按历史订单重算
+CREATE TABLE IF NOT EXISTS stat_sales_hourly (
+    stat_date DATE NOT NULL COMMENT '日期',
+    stat_hour TINYINT NOT NULL COMMENT '小时(0-23)',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '订单数',
+    sales_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '实收金额',
+    member_order_count INT NOT NULL DEFAULT 0 COMMENT '会员订单数',
+    member_sales DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '会员实收金额',
+    cost_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '成本金额(按结账时进价)',
+    PRIMARY KEY (stat_date, stat_hour)
+) ENGINE=InnoDB COMMENT='销售汇总表(小时)';
+
+CREATE TABLE IF NOT EXISTS stat_goods_daily (
+    stat_date DATE NOT NULL COMMENT '日期',
+    goods_id INT NOT NULL COMMENT '商品ID',
+    sale_qty DECIMAL(14,3) NOT NULL DEFAULT 0 COMMENT '销售数量',
+    sale_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '销售金额(明细小计)',
+    cost_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '成本金额',
+    return_qty DECIMAL(14,3) NOT NULL DEFAULT 0 COMMENT '退货数量',
+    return_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '退款金额',
+    PRIMARY KEY (stat_date, goods_id),
+    INDEX idx_goods (goods_id)
+) ENGINE=InnoDB COMMENT='商品销售汇总表(天)';
+
+CREATE TABLE IF NOT EXISTS stat_member_daily (
+    stat_date DATE NOT NULL COMMENT '日期',
+    member_id INT NOT NULL COMMENT '会员ID',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '订单数',
+    sales_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '消费金额',
+    PRIMARY KEY (stat_date, member_id),
+    INDEX idx_member (member_id)
+) ENGINE=InnoDB COMMENT='会员消费汇总表(天)';
+
+CREATE TABLE IF NOT EXISTS stat_return_daily (
+    stat_date DATE NOT NULL PRIMARY KEY COMMENT '日期',
+    return_count INT NOT NULL DEFAULT 0 COMMENT '退货单数',
+    refund_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '退款金额'
+) ENGINE=InnoDB COMMENT='退货汇总表(天)';
+
+-- 未读通知计数表 (sys_notification_unread)，升级后执行 python -m logic.notification_logic archive 按通知表校正
+CREATE TABLE IF NOT EXISTS sys_notification_unread (
+    audience_role VARCHAR(20) NOT NULL COMMENT '受众角色键(*表示不限)',
+    audience_user INT NOT NULL COMMENT '受众用户键(0表示不限)',
+    unread_count INT NOT NULL DEFAULT 0 COMMENT '未读数',
+    PRIMARY KEY (audience_role, audience_user)
+) ENGINE=InnoDB COMMENT='未读通知计数表';
+
+-- 通知归档表 (sys_notification_archive)
+CREATE TABLE IF NOT EXISTS sys_notification_archive (
+    notification_id INT PRIMARY KEY COMMENT '通知ID',
+    target_user_id INT COMMENT '目标用户ID(空表示广播)',
+    target_role ENUM('admin', 'cashier', 'goods_manager', 'after_sale') COMMENT '目标角色',
+    notification_type VARCHAR(50) NOT NULL COMMENT '通知类型',
+    title VARCHAR(100) NOT NULL COMMENT '通知标题',
+    content TEXT COMMENT '通知内容',
+    related_id INT COMMENT '关联业务ID',
+    is_read TINYINT DEFAULT 1 COMMENT '是否已读',
+    create_time DATETIME COMMENT '创建时间',
+    read_time DATETIME COMMENT '阅读时间',
+    archive_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '归档时间',
+    INDEX idx_create_time (create_time)
+) ENGINE=InnoDB COMMENT='通知归档表';
+
+-- 集合型通知去重表 (sys_notification_digest)
+CREATE TABLE IF NOT EXISTS sys_notification_digest (
+    digest_key VARCHAR(64) PRIMARY KEY COMMENT '去重键: 通知类型:子类',
+    notification_id INT COMMENT '最近一次通知ID',
+    related_ids MEDIUMTEXT COMMENT '上次检查时集合中的关联ID(逗号分隔)',
+    notify_time DATETIME COMMENT '最近一次新建通知的时间'
+) ENGINE=InnoDB COMMENT='集合型通知去重表';
+
+DROP PROCEDURE IF EXISTS sm_add_column;
+DROP PROCEDURE IF EXISTS sm_add_index;
+DROP PROCEDURE IF EXISTS sm_drop_index;
+
+-- =====================================================
+-- 三、新增权限（使用了 schema.sql 第十部分的多用户权限时，用root执行）
+-- =====================================================
+
+/*
+GRANT UPDATE (total_consume, total_points, level_code) ON supermarket_db.member TO 'sm_cashier'@'localhost';
+GRANT UPDATE (cost_price) ON supermarket_db.order_detail TO 'sm_cashier'@'localhost';
+GRANT INSERT ON supermarket_db.inventory_movement TO 'sm_cashier'@'localhost';
+GRANT INSERT ON supermarket_db.sys_notification TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_unread TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_sequence TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_sales_hourly TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_goods_daily TO 'sm_cashier'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_member_daily TO 'sm_cashier'@'localhost';
+
+GRANT SELECT, INSERT, DELETE ON supermarket_db.goods_category_closure TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT ON supermarket_db.inventory_movement TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT ON supermarket_db.inventory_snapshot TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_digest TO 'sm_goods_manager'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_unread TO 'sm_goods_manager'@'localhost';
+
+GRANT SELECT ON supermarket_db.goods_category TO 'sm_after_sale'@'localhost';
+GRANT SELECT ON supermarket_db.goods_category_closure TO 'sm_after_sale'@'localhost';
+GRANT INSERT ON supermarket_db.inventory_movement TO 'sm_after_sale'@'localhost';
+GRANT INSERT ON supermarket_db.sys_notification TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_notification_unread TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.sys_sequence TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_goods_daily TO 'sm_after_sale'@'localhost';
+GRANT SELECT, INSERT, UPDATE ON supermarket_db.stat_return_daily TO 'sm_after_sale'@'localhost';
+
+FLUSH PRIVILEGES;
+*/
@@ -39,6 +39,16 @@ def import_test_data():
     cursor.close()
     conn.close()
     print("测试数据导入完成！")
+    
+    # 测试数据直接写入分类表，需要重建分类闭包表
+    from logic.goods_category_logic import GoodsCategoryLogic
+    ok, msg = GoodsCategoryLogic().rebuild_closure()
+    print(msg)
+    
+    # 测试数据直接写入订单表，需要重算统计汇总表
+    from logic.stat_rollup_logic import rebuild
+    result = rebuild()
+    print(result['message'])
 
 if __name__ == "__main__":
     import_test_data()
@@ -7,6 +7,9 @@ from datetime import datetime
 from decimal import Decimal
 from db.db_conn import DBConnection
 from logic.cashier_logic import generate_order_no, calculate_order_total
+from logic import stat_rollup_logic
+from logic import member_level_engine
+from logic.member_manage_logic import invalidate_member_cache
 
 
 def hang_order(cashier_id, member_id, items):
@@ -247,12 +250,14 @@ def cancel_order(order_id, is_completed=False):
 
 def resume_order(order_id, cashier_id, pay_method):
     """
-    继续结算挂单订单
+    继续结算挂单订单（与 create_order 共用同一事务内的锁库存/扣库存流程）
     :param order_id: 订单ID
     :param cashier_id: 收银员ID
     :param pay_method: 支付方式
     :return: {"success": bool, "data": dict, "message": str}
     """
+    from logic.cashier_logic import _lock_and_check_stock, _reduce_shelf_stock, _get_discount_rate
+    
     # 支付方式映射
     pay_method_map = {
         "现金": "cash",
@@ -262,42 +267,59 @@ def resume_order(order_id, cashier_id, pay_method):
     }
     payment_type = pay_method_map.get(pay_method, "cash")
     
-    db = None
+    db = DBConnection()
     try:
-        # 先加载订单
-        load_result = load_order(order_id)
-        if not load_result["success"]:
-            return load_result
-        
-        order_data = load_result["data"]
-        member_id = order_data["member_id"]
-        items = order_data["items"]
-        
-        # 检查库存
-        from logic.cashier_logic import check_stock
-        stock_check = check_stock(items)
-        if not stock_check["success"]:
-            return stock_check
-        
-        # 获取会员折扣
-        discount_rate = 1.0
-        if member_id:
-            try:
-                from logic.member_rule_logic import get_member_discount
-                discount_result = get_member_discount(member_id)
-                if discount_result["success"]:
-                    discount_rate = discount_result["data"]["discount_rate"]
-            except ImportError:
-                pass
-        
-        # 计算金额
-        amounts = calculate_order_total(items, discount_rate)
-        points_earned = int(amounts["actual_amount"]) if member_id else 0
-        
-        db = DBConnection()
         db.connect()
         
         try:
+            # 锁定挂单，防止两个收银台同时结算同一挂单
+            db.execute("""
+                SELECT order_id, order_no, member_id, order_status
+                FROM order_info WHERE order_id = %s FOR UPDATE
+            """, (order_id,))
+            order = db.fetchone()
+            
+            if not order:
+                db.rollback()
+                return {"success": False, "data": None, "message": "订单不存在"}
+            
+            if order["order_status"] != "hanged":
+                db.rollback()
+                return {"success": False, "data": None, "message": "该订单不是挂单状态"}
+            
+            db.execute("""
+                SELECT goods_id, goods_name, barcode, unit_price, quantity, discount, subtotal
+                FROM order_detail WHERE order_id = %s
+            """, (order_id,))
+            items = [{
+                "goods_id": d["goods_id"],
+                "goods_name": d["goods_name"],
+                "barcode": d["barcode"],
+                "unit_price": float(d["unit_price"]),
+                "quantity": float(d["quantity"]),
+                "discount": float(d["discount"]),
+                "subtotal": float(d["subtotal"])
+            } for d in db.fetchall()]
+            
+            if not items:
+                db.rollback()
+                return {"success": False, "data": None, "message": "挂单明细为空"}
+            
+            member_id = order["member_id"]
+            
+            # 锁定并校验库存
+            error = _lock_and_check_stock(db, items)
+            if error:
+                db.rollback()
+                return {"success": False, "data": None, "message": error}
+            
+            # 获取会员折扣
+            discount_rate = _get_discount_rate(db, member_id)
+            
+            # 计算金额
+            amounts = calculate_order_total(items, discount_rate)
+            points_earned = int(amounts["actual_amount"]) if member_id else 0
+            
             # 更新订单状态和金额
             sql_update = """
                 UPDATE order_info SET 
@@ -322,39 +344,30 @@ def resume_order(order_id, cashier_id, pay_method):
             """
             db.execute(sql_payment, (order_id, payment_type, amounts["actual_amount"]))
             
-            # 扣减库存
-            try:
-                from logic.inventory_logic import InventoryLogic
-                inv_logic = InventoryLogic()
-                for item in items:
-                    inv_logic.reduce_stock(item["goods_id"], item["quantity"])
-            except (ImportError, Exception):
-                sql_stock = """
-                    UPDATE inventory SET on_shelf_num = on_shelf_num - %s 
-                    WHERE goods_id = %s
-                """
-                for item in items:
-                    db.execute(sql_stock, (item["quantity"], item["goods_id"]))
+            # 扣减在架库存
+            _reduce_shelf_stock(db, items, order["order_no"])
             
             # 累加会员积分
             if member_id and points_earned > 0:
-                try:
-                    from logic.member_rule_logic import add_member_points
-                    add_member_points(member_id, amounts["actual_amount"])
-                except ImportError:
-                    sql_points = """
-                        UPDATE member SET total_points = total_points + %s,
-                        total_consume = total_consume + %s WHERE member_id = %s
-                    """
-                    db.execute(sql_points, (points_earned, amounts["actual_amount"], member_id))
+                sql_points = """
+                    UPDATE member SET total_points = total_points + %s,
+                    total_consume = total_consume + %s WHERE member_id = %s
+                """
+                db.execute(sql_points, (points_earned, amounts["actual_amount"], member_id))
+                member_level_engine.evaluate_member(db, member_id, "消费累计", operator_id=cashier_id)
+            
+            # 累加销售汇总表
+            stat_rollup_logic.apply_order(db, order_id)
             
             db.commit()
+            if member_id:
+                invalidate_member_cache(member_id)
             
             return {
                 "success": True,
                 "data": {
                     "order_id": order_id,
-                    "order_no": order_data["order_no"],
+                    "order_no": order["order_no"],
                     "total_amount": amounts["total_amount"],
                     "discount_amount": amounts["discount_amount"],
                     "actual_amount": amounts["actual_amount"],
@@ -372,5 +385,4 @@ def resume_order(order_id, cashier_id, pay_method):
     except Exception as e:
         return {"success": False, "data": None, "message": f"结算失败: {str(e)}"}
     finally:
-        if db:
-            db.close()
+        db.close()
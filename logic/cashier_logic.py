@@ -3,18 +3,58 @@
 收银结算逻辑 - 组员1负责
 """
 
-import random
 from datetime import datetime
 from decimal import Decimal
 from db.db_conn import DBConnection
+from config import SYSTEM_CONFIG
+from utils.cache_utils import TTLCache
+from logic.sequence_logic import SequenceAllocator
+from logic import stat_rollup_logic
+from logic import member_level_rules
+from logic import member_level_engine
+from logic.goods_search_logic import invalidate_search_index
+from logic.member_manage_logic import invalidate_member_cache
+
+
+# 收银台本地条码缓存：barcode -> 可售商品信息（库存在结账时再次校验）
+_goods_cache = TTLCache(
+    maxsize=SYSTEM_CONFIG.get('barcode_cache_size', 5000),
+    ttl=SYSTEM_CONFIG.get('barcode_cache_ttl', 300)
+)
+
+
+def invalidate_goods_cache(goods_id=None, barcode=None):
+    """
+    使条码缓存失效（商品调价/折扣/上下架后调用）
+    :param goods_id: 商品ID
+    :param barcode: 商品条码
+    两者都为空时清空整个缓存
+    """
+    if barcode:
+        _goods_cache.pop(barcode)
+    if goods_id is not None:
+        _goods_cache.pop_if(lambda key, goods: goods["goods_id"] == goods_id)
+    if not barcode and goods_id is None:
+        _goods_cache.clear()
+    # 上下架状态会影响收银联想结果
+    invalidate_search_index()
+
+
+def get_goods_cache_stats():
+    """获取条码缓存命中统计"""
+    return {"success": True, "data": _goods_cache.get_stats(), "message": "获取成功"}
 
 
 def get_goods_by_barcode(barcode):
     """
-    根据条码查询商品信息
+    根据条码查询商品信息（优先读取本地缓存）
     :param barcode: 商品条码
     :return: {"success": bool, "data": dict, "message": str}
     """
+    cached = _goods_cache.get(barcode)
+    if cached:
+        return {"success": True, "data": dict(cached), "message": "查询成功"}
+    
     try:
         with DBConnection() as db:
             sql = """
@@ -36,20 +76,20 @@ def get_goods_by_barcode(barcode):
             if not goods["on_shelf_num"] or goods["on_shelf_num"] <= 0:
                 return {"success": False, "data": None, "message": "商品库存不足"}
             
-            return {
-                "success": True,
-                "data": {
-                    "goods_id": goods["goods_id"],
-                    "barcode": goods["barcode"],
-                    "goods_name": goods["goods_name"],
-                    "price": float(goods["price"]),
-                    "discount": float(goods["discount"]) if goods["discount"] else 1.0,
-                    "unit": goods["unit"],
-                    "is_weighted": goods["is_weighted"],
-                    "stock": goods["on_shelf_num"]
-                },
-                "message": "查询成功"
+            data = {
+                "goods_id": goods["goods_id"],
+                "barcode": goods["barcode"],
+                "goods_name": goods["goods_name"],
+                "price": float(goods["price"]),
+                "discount": float(goods["discount"]) if goods["discount"] else 1.0,
+                "unit": goods["unit"],
+                "is_weighted": goods["is_weighted"],
+                "shelf_status": goods["shelf_status"],
+                "stock": goods["on_shelf_num"]
             }
+            _goods_cache.set(barcode, data)
+            
+            return {"success": True, "data": dict(data), "message": "查询成功"}
     except Exception as e:
         return {"success": False, "data": None, "message": f"查询失败: {str(e)}"}
 
@@ -95,11 +135,19 @@ def calculate_bulk_price(barcode, weight):
         return {"success": False, "data": None, "message": f"计算失败: {str(e)}"}
 
 
+# 订单号序列：按天计数，号段预留在进程内，多个收银台/进程之间号段互不重叠
+_order_seq = SequenceAllocator(block_size=SYSTEM_CONFIG.get('order_no_block_size', 50))
+
+
 def generate_order_no():
-    """生成订单号: ORD + 年月日时分秒 + 4位随机数"""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    random_num = str(random.randint(1000, 9999))
-    return f"ORD{timestamp}{random_num}"
+    """
+    生成订单号: ORD + 年月日时分秒 + 2位收银台号 + 当日序号(至少5位)
+    序号来自 sys_sequence 预留的号段，同一收银台内单调递增，跨收银台、跨进程不重复
+    """
+    now = datetime.now()
+    seq = _order_seq.next_value(f"order_no:{now.strftime('%Y%m%d')}")
+    lane_id = int(SYSTEM_CONFIG.get('lane_id', 1)) % 100
+    return f"ORD{now.strftime('%Y%m%d%H%M%S')}{lane_id:02d}{seq:05d}"
 
 
 def calculate_order_total(items, discount_rate=1.0):
@@ -121,6 +169,95 @@ def calculate_order_total(items, discount_rate=1.0):
     }
 
 
+def _aggregate_quantities(items):
+    """按商品ID汇总购物清单数量（散装商品可能多次出现）"""
+    quantities = {}
+    for item in items:
+        goods_id = item["goods_id"]
+        quantities[goods_id] = quantities.get(goods_id, Decimal("0")) + Decimal(str(item["quantity"]))
+    return quantities
+
+
+def _validate_items(items):
+    """
+    校验购物清单
+    :return: 错误信息，校验通过返回None
+    """
+    if not items:
+        return "购物清单为空"
+    for item in items:
+        for field in ("goods_id", "goods_name", "barcode", "unit_price", "quantity", "discount", "subtotal"):
+            if item.get(field) is None:
+                return f"商品数据缺少字段: {field}"
+        if Decimal(str(item["quantity"])) <= 0:
+            return f"商品 {item['goods_name']} 数量必须大于0"
+    return None
+
+
+def _lock_and_check_stock(db, items):
+    """
+    一次性锁定购物清单中所有商品的库存行并校验（SELECT ... FOR UPDATE）
+    :param db: 当前事务所在的连接
+    :param items: 商品列表
+    :return: 错误信息，校验通过返回None
+    """
+    quantities = _aggregate_quantities(items)
+    goods_ids = sorted(quantities)
+    placeholders = ','.join(['%s'] * len(goods_ids))
+    sql = f"""
+        SELECT g.goods_id, g.goods_name, g.shelf_status, i.on_shelf_num
+        FROM goods g
+        LEFT JOIN inventory i ON g.goods_id = i.goods_id
+        WHERE g.goods_id IN ({placeholders})
+        ORDER BY g.goods_id
+        FOR UPDATE
+    """
+    db.execute(sql, goods_ids)
+    rows = {row["goods_id"]: row for row in db.fetchall()}
+
+    names = {item["goods_id"]: item["goods_name"] for item in items}
+    for goods_id in goods_ids:
+        row = rows.get(goods_id)
+        if not row:
+            return f"商品 {names[goods_id]} 不存在"
+        if row["shelf_status"] != "on_shelf":
+            # 缓存中的上架状态已过期，下次扫码重新查询
+            invalidate_goods_cache(goods_id=goods_id)
+            return f"商品 {names[goods_id]} 未上架"
+        if row["on_shelf_num"] is None:
+            # 库存记录不存在，跳过检查（允许结账）
+            continue
+        if row["on_shelf_num"] < quantities[goods_id]:
+            return f"商品 {names[goods_id]} 库存不足（当前库存: {row['on_shelf_num']}）"
+    return None
+
+
+def _reduce_shelf_stock(db, items, order_no=None):
+    """
+    在当前事务中批量扣减在架库存（语句数与商品种数无关）
+    :param db: 当前事务所在的连接（库存行须已被 _lock_and_check_stock 锁定）
+    :param items: 商品列表
+    :param order_no: 订单号（记入库存流水）
+    """
+    from logic.inventory_logic import InventoryLogic
+    
+    result = InventoryLogic().reduce_stock_batch(
+        [(item["goods_id"], item["quantity"]) for item in items],
+        column="on_shelf_num", db=db, allow_missing=True, ref_no=order_no
+    )
+    if not result["success"]:
+        raise Exception(result["message"])
+
+
+def _get_discount_rate(db, member_id):
+    """获取会员折扣率（非会员或会员不可用时为1.0）"""
+    if not member_id:
+        return 1.0
+    db.execute("SELECT level_code FROM member WHERE member_id = %s AND status = 'active'", (member_id,))
+    result = db.fetchone()
+    return member_level_rules.resolve_discount(result['level_code']) if result else 1.0
+
+
 def check_stock(items):
     """
     检查库存是否充足
@@ -128,23 +265,27 @@ def check_stock(items):
     :return: {"success": bool, "message": str}
     """
     try:
-        with DBConnection() as db:
-            for item in items:
-                sql = "SELECT on_shelf_num, stock_num FROM inventory WHERE goods_id = %s"
-                db.execute(sql, (item["goods_id"],))
-                result = db.fetchone()
-                
-                if not result:
-                    # 库存记录不存在，跳过检查（允许结账）
-                    continue
-                
-                on_shelf = result["on_shelf_num"] or 0
-                if on_shelf < item["quantity"]:
-                    return {
-                        "success": False,
-                        "message": f"商品 {item['goods_name']} 库存不足（当前库存: {on_shelf}）"
-                    }
+        quantities = _aggregate_quantities(items)
+        if not quantities:
             return {"success": True, "message": "库存充足"}
+        goods_ids = sorted(quantities)
+        placeholders = ','.join(['%s'] * len(goods_ids))
+        with DBConnection() as db:
+            sql = f"SELECT goods_id, on_shelf_num FROM inventory WHERE goods_id IN ({placeholders})"
+            db.execute(sql, goods_ids)
+            stock = {row["goods_id"]: row["on_shelf_num"] or 0 for row in db.fetchall()}
+        
+        names = {item["goods_id"]: item["goods_name"] for item in items}
+        for goods_id in goods_ids:
+            if goods_id not in stock:
+                # 库存记录不存在，跳过检查（允许结账）
+                continue
+            if stock[goods_id] < quantities[goods_id]:
+                return {
+                    "success": False,
+                    "message": f"商品 {names[goods_id]} 库存不足（当前库存: {stock[goods_id]}）"
+                }
+        return {"success": True, "message": "库存充足"}
     except Exception as e:
         return {"success": False, "message": f"库存检查失败: {str(e)}"}
 
@@ -152,6 +293,8 @@ def check_stock(items):
 def create_order(cashier_id, member_id, items, pay_method):
     """
     创建订单并完成结算
+    校验、锁库存、写订单/明细/支付、扣库存、累积分在同一连接的同一事务中完成，
+    数据库往返次数固定，与购物清单长度无关
     :param cashier_id: 收银员ID
     :param member_id: 会员ID (可为None)
     :param items: 商品列表 [{goods_id, goods_name, barcode, unit_price, quantity, discount, subtotal}, ...]
@@ -167,46 +310,30 @@ def create_order(cashier_id, member_id, items, pay_method):
     }
     payment_type = pay_method_map.get(pay_method, "cash")
     
-    db = None
+    error = _validate_items(items)
+    if error:
+        return {"success": False, "data": None, "message": error}
+    
+    db = DBConnection()
     try:
-        # 检查库存
-        stock_check = check_stock(items)
-        if not stock_check["success"]:
-            return stock_check
-        
-        # 获取会员折扣
-        discount_rate = 1.0
-        points_earned = 0
-        
-        if member_id:
-            try:
-                with DBConnection() as db_temp:
-                    sql = """
-                        SELECT mlr.discount_rate
-                        FROM member m
-                        JOIN member_level_rule mlr ON m.level_code = mlr.level_code
-                        WHERE m.member_id = %s AND m.status = 'active'
-                    """
-                    db_temp.execute(sql, (member_id,))
-                    result = db_temp.fetchone()
-                    if result:
-                        discount_rate = float(result['discount_rate'])
-            except Exception:
-                pass  # 获取折扣失败时使用默认值1.0
-        
-        # 计算金额
-        amounts = calculate_order_total(items, discount_rate)
-        order_no = generate_order_no()
-        
-        # 计算积分
-        if member_id:
-            points_earned = int(amounts["actual_amount"])
-        
-        db = DBConnection()
         db.connect()
         
         try:
-            # 1. 写入订单表
+            # 1. 锁定并校验库存（一次查询锁定所有商品，关闭检查与扣减之间的超卖窗口）
+            error = _lock_and_check_stock(db, items)
+            if error:
+                db.rollback()
+                return {"success": False, "data": None, "message": error}
+            
+            # 2. 获取会员折扣
+            discount_rate = _get_discount_rate(db, member_id)
+            
+            # 计算金额
+            amounts = calculate_order_total(items, discount_rate)
+            order_no = generate_order_no()
+            points_earned = int(amounts["actual_amount"]) if member_id else 0
+            
+            # 3. 写入订单表
             sql_order = """
                 INSERT INTO order_info 
                 (order_no, member_id, cashier_id, total_amount, discount_amount, 
@@ -220,19 +347,19 @@ def create_order(cashier_id, member_id, items, pay_method):
             ))
             order_id = db.cursor.lastrowid
             
-            # 2. 写入订单明细表
+            # 4. 写入订单明细表（executemany 合并为一条多行INSERT）
             sql_detail = """
                 INSERT INTO order_detail 
                 (order_id, goods_id, goods_name, barcode, unit_price, quantity, discount, subtotal)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """
-            for item in items:
-                db.execute(sql_detail, (
-                    order_id, item["goods_id"], item["goods_name"], item["barcode"],
-                    item["unit_price"], item["quantity"], item["discount"], item["subtotal"]
-                ))
+            db.executemany(sql_detail, [
+                (order_id, item["goods_id"], item["goods_name"], item["barcode"],
+                 item["unit_price"], item["quantity"], item["discount"], item["subtotal"])
+                for item in items
+            ])
             
-            # 3. 写入支付记录表
+            # 5. 写入支付记录表
             sql_payment = """
                 INSERT INTO payment_record 
                 (order_id, payment_type, amount, transaction_type, payment_time)
@@ -240,30 +367,24 @@ def create_order(cashier_id, member_id, items, pay_method):
             """
             db.execute(sql_payment, (order_id, payment_type, amounts["actual_amount"]))
             
-            # 4. 扣减库存
-            try:
-                from logic.inventory_logic import InventoryLogic
-                inv_logic = InventoryLogic()
-                for item in items:
-                    inv_logic.reduce_stock(item["goods_id"], item["quantity"])
-            except (ImportError, Exception):
-                # 组员2的模块未完成时，直接更新库存
-                sql_stock = """
-                    UPDATE inventory SET on_shelf_num = on_shelf_num - %s 
-                    WHERE goods_id = %s AND on_shelf_num >= %s
-                """
-                for item in items:
-                    db.execute(sql_stock, (item["quantity"], item["goods_id"], item["quantity"]))
+            # 6. 扣减在架库存（批量UPDATE）
+            _reduce_shelf_stock(db, items, order_no)
             
-            # 5. 累加会员积分（直接在当前事务中更新，避免嵌套事务死锁）
+            # 7. 累加会员积分
             if member_id and points_earned > 0:
                 sql_points = """
                     UPDATE member SET total_points = total_points + %s,
                     total_consume = total_consume + %s WHERE member_id = %s
                 """
                 db.execute(sql_points, (points_earned, amounts["actual_amount"], member_id))
+                member_level_engine.evaluate_member(db, member_id, "消费累计", operator_id=cashier_id)
+            
+            # 8. 累加销售汇总表
+            stat_rollup_logic.apply_order(db, order_id)
             
             db.commit()
+            if member_id:
+                invalidate_member_cache(member_id)
             
             return {
                 "success": True,
@@ -287,5 +408,4 @@ def create_order(cashier_id, member_id, items, pay_method):
     except Exception as e:
         return {"success": False, "data": None, "message": f"结算失败: {str(e)}"}
     finally:
-        if db:
-            db.close()
+        db.close()
@@ -1,24 +1,154 @@
 # -*- coding: utf-8 -*-
-"""商品分类逻辑"""
+"""
+商品分类逻辑
+    python -m logic.goods_category_logic rebuild
+"""
 
+import sys
+import time
+import threading
 from db.db_conn import DBConnection
+from config import SYSTEM_CONFIG
+from utils.cache_utils import TTLCache
+
+# 分类列表缓存（分类变动很少，本机增删改后立即失效，其他终端的修改在TTL后生效）
+_category_cache = TTLCache(maxsize=16, ttl=SYSTEM_CONFIG.get('category_cache_ttl', 300))
+
+
+def invalidate_category_cache():
+    """清空分类缓存"""
+    _category_cache.clear()
+
+
+# MySQL 权限不足的错误码: 1142-表权限, 1143-列权限, 1227-操作权限
+_PERMISSION_ERRORS = (1142, 1143, 1227)
+
+_closure_lock = threading.Lock()
+_closure_ready = None       # None-未检查或上次失败，True-可用，False-无权限（本进程内不再检查）
+_closure_failed_at = None   # 上次检查/重建失败（非权限不足）的时间，间隔 closure_retry_interval 后重试
+
+
+def ensure_closure():
+    """
+    检查分类闭包表是否与分类表一致（每个分类都有自身一行），不一致时重建；
+    升级前已有分类、或直接向分类表导入数据后闭包表为空或不全，子分类筛选会查不到商品。
+    成功或权限不足时每个进程只检查一次，其他失败（如数据库暂时不可用）隔一段时间后重试
+    :return: bool 闭包表是否可用
+    """
+    global _closure_ready, _closure_failed_at
+    if _closure_ready is not None:
+        return _closure_ready
+    retry_interval = SYSTEM_CONFIG.get('closure_retry_interval', 300)
+    with _closure_lock:
+        if _closure_ready is not None:
+            return _closure_ready
+        if _closure_failed_at is not None and time.monotonic() - _closure_failed_at < retry_interval:
+            return False
+        try:
+            with DBConnection() as db:
+                db.execute("""
+                    SELECT (SELECT COUNT(*) FROM goods_category) AS categories,
+                           (SELECT COUNT(*) FROM goods_category_closure WHERE depth = 0) AS closed
+                """)
+                row = db.fetchone()
+                if row['categories'] != row['closed']:
+                    _rebuild_closure(db)
+            _closure_ready = True
+        except Exception as e:
+            if e.args and e.args[0] in _PERMISSION_ERRORS:
+                _closure_ready = False
+            else:
+                _closure_failed_at = time.monotonic()
+            return False
+    return True
+
+
+def _rebuild_closure(db):
+    """
+    在给定连接上按 parent_id 重建闭包表并提交，出错时回滚并抛出异常
+    :return: int 闭包表行数
+    """
+    try:
+        db.execute("SELECT category_id, parent_id FROM goods_category")
+        parents = {row['category_id']: row['parent_id'] for row in db.fetchall()}
+        
+        rows = []
+        for category_id in parents:
+            ancestor, depth = category_id, 0
+            while ancestor is not None and depth <= len(parents):
+                rows.append((ancestor, category_id, depth))
+                ancestor = parents.get(ancestor)
+                depth += 1
+        
+        db.execute("DELETE FROM goods_category_closure")
+        if rows:
+            db.executemany("""
+                INSERT INTO goods_category_closure (ancestor_id, descendant_id, depth)
+                VALUES (%s, %s, %s)
+            """, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_category_cache()
+    return len(rows)
+
+
+def get_category_ids_by_names(names):
+    """
+    按名称取分类及其全部子孙分类的ID（读缓存，随分类缓存一起失效）
+    :param names: 分类名称列表
+    :return: frozenset(category_id)
+    """
+    key = ('ids_by_names', tuple(sorted(names)))
+    ids = _category_cache.get(key)
+    if ids is None:
+        ids = frozenset()
+        if names:
+            ensure_closure()
+            with DBConnection() as db:
+                db.execute(f"""
+                    SELECT DISTINCT cc.descendant_id
+                    FROM goods_category c
+                    JOIN goods_category_closure cc ON cc.ancestor_id = c.category_id
+                    WHERE c.category_name IN ({', '.join(['%s'] * len(names))})
+                """, list(names))
+                ids = frozenset(row['descendant_id'] for row in db.fetchall())
+        _category_cache.set(key, ids)
+    return ids
 
 
 class GoodsCategoryLogic:
     """商品分类业务逻辑"""
     
     def get_all_categories(self):
-        """获取所有分类"""
-        with DBConnection() as db:
-            sql = """
-                SELECT c.*, p.category_name as parent_name
-                FROM goods_category c
-                LEFT JOIN goods_category p ON c.parent_id = p.category_id
-                WHERE c.delete_flag = 0 OR c.delete_flag IS NULL
-                ORDER BY c.level, c.sort_order, c.category_id
-            """
-            db.execute(sql)
-            return db.fetchall()
+        """获取所有分类（读缓存，返回副本供调用方修改）"""
+        categories = _category_cache.get('all')
+        if categories is None:
+            with DBConnection() as db:
+                sql = """
+                    SELECT c.*, p.category_name as parent_name
+                    FROM goods_category c
+                    LEFT JOIN goods_category p ON c.parent_id = p.category_id
+                    WHERE c.delete_flag = 0 OR c.delete_flag IS NULL
+                    ORDER BY c.level, c.sort_order, c.category_id
+                """
+                db.execute(sql)
+                categories = db.fetchall()
+            _category_cache.set('all', categories)
+        return [dict(c) for c in categories]
+    
+    def rebuild_closure(self):
+        """
+        按 parent_id 重建分类闭包表（升级已有数据库、直接导入分类数据后执行）
+        :return: (bool, str)
+        """
+        try:
+            with DBConnection() as db:
+                count = _rebuild_closure(db)
+            return True, f"分类闭包表重建完成，共{count}条"
+        except Exception as e:
+            return False, f"重建失败: {str(e)}"
     
     def get_categories_by_level(self, level):
         """按级别获取分类"""
@@ -29,6 +159,8 @@ class GoodsCategoryLogic:
     
     def add_category(self, name, parent_id, level, sort_order=1):
         """新增分类"""
+        # 父分类的祖先行从闭包表复制，闭包表不全时先重建
+        ensure_closure()
         with DBConnection() as db:
             try:
                 # 检查名称是否重复
@@ -50,7 +182,19 @@ class GoodsCategoryLogic:
                     VALUES (%s, %s, %s, %s)
                 """
                 db.execute(sql, (name, parent_id, level, sort_order))
+                category_id = db.cursor.lastrowid
+                
+                # 闭包表：自身一行 + 复制父分类的所有祖先
+                sql = """
+                    INSERT INTO goods_category_closure (ancestor_id, descendant_id, depth)
+                    SELECT %s, %s, 0
+                    UNION ALL
+                    SELECT ancestor_id, %s, depth + 1
+                    FROM goods_category_closure WHERE descendant_id = %s
+                """
+                db.execute(sql, (category_id, category_id, category_id, parent_id))
                 db.commit()
+                invalidate_category_cache()
                 return True, "分类添加成功"
             except Exception as e:
                 db.rollback()
@@ -74,6 +218,7 @@ class GoodsCategoryLogic:
                     db.execute(sql, (name, category_id))
                 
                 db.commit()
+                invalidate_category_cache()
                 return True, "分类修改成功"
             except Exception as e:
                 db.rollback()
@@ -93,15 +238,17 @@ class GoodsCategoryLogic:
                 if db.fetchone():
                     return False, "该分类下有商品，无法删除"
                 
+                db.execute("DELETE FROM goods_category_closure WHERE descendant_id = %s", (category_id,))
                 db.execute("DELETE FROM goods_category WHERE category_id = %s", (category_id,))
                 db.commit()
+                invalidate_category_cache()
                 return True, "分类删除成功"
             except Exception as e:
                 db.rollback()
                 return False, f"删除失败: {str(e)}"
     
     def get_category_tree(self):
-        """获取分类树结构"""
+        """获取分类树结构（基于缓存的分类列表在内存中组装）"""
         categories = self.get_all_categories()
         
         # 构建树结构
@@ -118,3 +265,12 @@ class GoodsCategoryLogic:
                     parent['children'].append(cat)
         
         return tree
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "rebuild":
+        print("用法: python -m logic.goods_category_logic rebuild")
+        sys.exit(1)
+    ok, msg = GoodsCategoryLogic().rebuild_closure()
+    print(msg)
+    sys.exit(0 if ok else 1)
@@ -5,6 +5,10 @@
 
 from datetime import datetime
 from db.db_conn import DBConnection
+from logic.cashier_logic import invalidate_goods_cache
+from logic.goods_category_logic import ensure_closure
+from logic.goods_search_logic import invalidate_search_index, keyword_condition, keyword_page_condition
+from logic.inventory_logic import InventoryLogic
 
 
 class GoodsManageLogic:
@@ -82,6 +86,7 @@ class GoodsManageLogic:
             """
             db.execute(inv_sql, (goods_id, stock_warning, shelf_warning))
             db.commit()
+            invalidate_search_index()
             
             return {"success": True, "data": goods_id, "message": "商品添加成功"}
         except Exception as e:
@@ -112,7 +117,7 @@ class GoodsManageLogic:
                 return {"success": False, "data": None, "message": "商品已在售"}
             
             # 检查库存（仓库库存或货架库存有一个大于0即可）
-            db.execute("SELECT stock_num, on_shelf_num FROM inventory WHERE goods_id = %s", (goods_id,))
+            db.execute("SELECT stock_num, on_shelf_num FROM inventory WHERE goods_id = %s FOR UPDATE", (goods_id,))
             inv = db.fetchone()
             if not inv:
                 return {"success": False, "data": None, "message": "库存记录不存在"}
@@ -128,6 +133,7 @@ class GoodsManageLogic:
                     SET stock_num = stock_num - %s, on_shelf_num = on_shelf_num + %s 
                     WHERE goods_id = %s
                 """, (move_num, move_num, goods_id))
+                InventoryLogic.record_transfer(db, goods_id, move_num, inv['stock_num'], inv['on_shelf_num'])
             
             update_fields = ["shelf_status = 'on_shelf'", "update_time = NOW()"]
             params = []
@@ -144,6 +150,7 @@ class GoodsManageLogic:
             sql = f"UPDATE goods SET {', '.join(update_fields)} WHERE goods_id = %s"
             db.execute(sql, params)
             db.commit()
+            invalidate_goods_cache(goods_id=goods_id)
             
             return {"success": True, "data": None, "message": "商品上架成功"}
         except Exception as e:
@@ -175,6 +182,7 @@ class GoodsManageLogic:
             sql = "UPDATE goods SET shelf_status = 'off_shelf', update_time = NOW() WHERE goods_id = %s"
             db.execute(sql, (goods_id,))
             db.commit()
+            invalidate_goods_cache(goods_id=goods_id)
             
             return {"success": True, "data": None, "message": "商品下架成功"}
         except Exception as e:
@@ -206,6 +214,7 @@ class GoodsManageLogic:
                 sql = "UPDATE goods SET price = %s, update_time = NOW() WHERE goods_id = %s"
                 db.execute(sql, (new_price, goods_id))
                 db.commit()
+                invalidate_goods_cache(goods_id=goods_id)
                 
                 return {"success": True, "data": {"old_price": old_price, "new_price": new_price}, 
                         "message": f"价格已从 ¥{old_price} 修改为 ¥{new_price}"}
@@ -238,6 +247,7 @@ class GoodsManageLogic:
                 """
                 db.execute(sql, (discount, start_time, end_time, goods_id))
                 db.commit()
+                invalidate_goods_cache(goods_id=goods_id)
                 
                 return {"success": True, "data": None, "message": f"已设置{int(discount*100)}折优惠"}
             except Exception as e:
@@ -254,59 +264,113 @@ class GoodsManageLogic:
         
         with DBConnection() as db:
             try:
-                sql = """
-                    SELECT g.goods_id, g.barcode, g.goods_name, g.category_id, g.unit,
-                           g.cost_price, g.price as sale_price, g.discount, g.shelf_status,
-                           gc.category_name, i.stock_num
-                    FROM goods g
-                    LEFT JOIN goods_category gc ON g.category_id = gc.category_id
-                    LEFT JOIN inventory i ON g.goods_id = i.goods_id
-                    WHERE 1=1
-                """
-                params = []
-                
-                if filters.get('category_id'):
-                    # 获取该分类及其所有子分类的ID
-                    category_ids = self._get_category_and_children(db, filters['category_id'])
-                    if category_ids:
-                        placeholders = ','.join(['%s'] * len(category_ids))
-                        sql += f" AND g.category_id IN ({placeholders})"
-                        params.extend(category_ids)
-                
-                if filters.get('status'):
-                    status_code = self.STATUS_MAP.get(filters['status'], filters['status'])
-                    sql += " AND g.shelf_status = %s"
-                    params.append(status_code)
-                
-                if filters.get('keyword'):
-                    sql += " AND (g.barcode LIKE %s OR g.goods_name LIKE %s)"
-                    keyword = f"%{filters['keyword']}%"
-                    params.extend([keyword, keyword])
-                
+                sql, params, _ = self._build_goods_query(db, filters)
                 sql += " ORDER BY g.goods_id"
                 db.execute(sql, params)
                 goods_list = db.fetchall()
                 
                 for goods in goods_list:
-                    goods['status_display'] = self.STATUS_DISPLAY.get(goods['shelf_status'], goods['shelf_status'])
-                    goods['sale_price_str'] = f"¥{goods['sale_price']:.2f}"
+                    self._format_goods_row(goods)
                 
                 return {"success": True, "data": goods_list, "message": "获取成功"}
             except Exception as e:
                 return {"success": False, "data": [], "message": f"查询失败: {str(e)}"}
     
-    def _get_category_and_children(self, db, category_id):
-        """获取分类及其所有子分类ID"""
-        result = [category_id]
+    def get_goods_page(self, filters=None, after_id=None, limit=200):
+        """
+        按商品ID分页获取商品列表（keyset分页，翻页代价与页码无关）
+        :param filters: 同 get_goods_list
+        :param after_id: 上一页最后一条的商品ID，首页传None
+        :param limit: 每页条数
+        :return: {"success": bool, "data": {"rows", "next_after", "has_more"}, "message": str}
+        """
+        filters = filters or {}
         
-        # 获取直接子分类
-        db.execute("SELECT category_id FROM goods_category WHERE parent_id = %s", (category_id,))
-        children = db.fetchall()
+        with DBConnection() as db:
+            try:
+                sql, params, chunk_end = self._build_goods_query(db, filters, paged=True, after_id=after_id)
+                if after_id is not None:
+                    sql += " AND g.goods_id > %s"
+                    params.append(after_id)
+                sql += " ORDER BY g.goods_id LIMIT %s"
+                params.append(limit + 1)
+                db.execute(sql, params)
+                rows = db.fetchall()
+                
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                for goods in rows:
+                    self._format_goods_row(goods)
+                
+                next_after = rows[-1]['goods_id'] if rows else after_id
+                if not has_more and chunk_end is not None:
+                    # 关键词匹配的ID分段查询，本段查完后从段尾继续
+                    has_more, next_after = True, chunk_end
+                
+                return {
+                    "success": True,
+                    "data": {
+                        "rows": rows,
+                        "next_after": next_after,
+                        "has_more": has_more
+                    },
+                    "message": "获取成功"
+                }
+            except Exception as e:
+                return {"success": False, "data": None, "message": f"查询失败: {str(e)}"}
+    
+    def _build_goods_query(self, db, filters, paged=False, after_id=None):
+        """
+        构造商品列表查询（不含排序和分页游标条件）
+        :param paged: keyset 分页查询，关键词匹配的商品ID按游标分段携带
+        :return: (sql, 参数列表, 关键词ID本段的最后一个ID或None)
+        """
+        sql = """
+            SELECT g.goods_id, g.barcode, g.goods_name, g.category_id, g.unit,
+                   g.cost_price, g.price as sale_price, g.discount, g.shelf_status,
+                   gc.category_name, i.stock_num
+            FROM goods g
+            LEFT JOIN goods_category gc ON g.category_id = gc.category_id
+            LEFT JOIN inventory i ON g.goods_id = i.goods_id
+            WHERE 1=1
+        """
+        params = []
+        
+        if filters.get('category_id'):
+            if ensure_closure():
+                # 该分类及其所有子分类（闭包表）
+                sql += """ AND g.category_id IN (
+                    SELECT descendant_id FROM goods_category_closure WHERE ancestor_id = %s)"""
+                params.append(filters['category_id'])
+            else:
+                # 闭包表不可用时按 parent_id 展开（课-类-种三级）
+                sql += """ AND g.category_id IN (
+                    SELECT c.category_id FROM goods_category c
+                    LEFT JOIN goods_category p ON c.parent_id = p.category_id
+                    WHERE c.category_id = %s OR c.parent_id = %s OR p.parent_id = %s)"""
+                params.extend([filters['category_id']] * 3)
         
-        for child in children:
-            result.extend(self._get_category_and_children(db, child['category_id']))
+        if filters.get('status'):
+            status_code = self.STATUS_MAP.get(filters['status'], filters['status'])
+            sql += " AND g.shelf_status = %s"
+            params.append(status_code)
         
-        return result
+        chunk_end = None
+        if filters.get('keyword'):
+            if paged:
+                keyword_sql, keyword_params, chunk_end = keyword_page_condition(
+                    "g.goods_id", filters['keyword'], after_id)
+            else:
+                keyword_sql, keyword_params = keyword_condition("g.goods_id", filters['keyword'])
+            sql += keyword_sql
+            params.extend(keyword_params)
+        
+        return sql, params, chunk_end
+    
+    def _format_goods_row(self, goods):
+        """补充列表显示字段"""
+        goods['status_display'] = self.STATUS_DISPLAY.get(goods['shelf_status'], goods['shelf_status'])
+        goods['sale_price_str'] = f"¥{goods['sale_price']:.2f}"
     
     def get_goods_by_barcode(self, barcode):
         """根据条码获取商品"""
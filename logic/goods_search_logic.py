@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+商品搜索索引
+商品名称、条码、拼音首字母建立进程内二元组(bigram)倒排索引，
+关键词先按倒排表求交集得到候选，再逐个校验子串并排序，单次查询不访问数据库；
+索引按 goods 表的行数和最大 update_time 判断是否过期，过期后整体重建
+"""
+
+import bisect
+import threading
+import time
+from db.db_conn import DBConnection
+from config import SYSTEM_CONFIG
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    # 未安装 pypinyin 时只支持名称/条码搜索
+    lazy_pinyin = None
+
+# 匹配方式及排序优先级（越小越靠前）
+RANK_BARCODE_EXACT = 0
+RANK_BARCODE_PREFIX = 1
+RANK_NAME_PREFIX = 2
+RANK_INITIALS_PREFIX = 3
+RANK_NAME_CONTAINS = 4
+RANK_INITIALS_CONTAINS = 5
+RANK_BARCODE_CONTAINS = 6
+
+
+def _name_initials(name):
+    """商品名称的拼音首字母（小写），非汉字原样保留"""
+    if lazy_pinyin is None or not name:
+        return ""
+    return "".join(lazy_pinyin(name, style=Style.FIRST_LETTER, errors=lambda s: list(s))).lower()
+
+
+def _grams(text):
+    """文本的一元组和二元组"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class _IndexSnapshot:
+    """一次构建的索引数据（构建后只读，可在多线程间共享）"""
+
+    __slots__ = ('entries', 'postings', 'watermark')
+
+    def __init__(self, rows, watermark):
+        self.entries = {}     # goods_id -> (row, name, barcode, initials)
+        self.postings = {}    # gram -> set(goods_id)
+        self.watermark = watermark
+        for row in rows:
+            goods_id = row['goods_id']
+            name = (row['goods_name'] or "").lower()
+            barcode = (row['barcode'] or "").lower()
+            initials = _name_initials(row['goods_name'])
+            self.entries[goods_id] = (row, name, barcode, initials)
+            for gram in _grams(name) | _grams(barcode) | _grams(initials):
+                self.postings.setdefault(gram, set()).add(goods_id)
+
+    def candidates(self, keyword):
+        """倒排表求交集得到候选商品ID"""
+        keys = [keyword] if len(keyword) == 1 else [keyword[i:i + 2] for i in range(len(keyword) - 1)]
+        sets = []
+        for key in set(keys):
+            posting = self.postings.get(key)
+            if not posting:
+                return set()
+            sets.append(posting)
+        sets.sort(key=len)
+        return set.intersection(*sets)
+
+    def rank(self, goods_id, keyword):
+        """校验并计算匹配等级，不匹配返回None"""
+        _, name, barcode, initials = self.entries[goods_id]
+        if barcode == keyword:
+            return RANK_BARCODE_EXACT
+        if barcode.startswith(keyword):
+            return RANK_BARCODE_PREFIX
+        if name.startswith(keyword):
+            return RANK_NAME_PREFIX
+        if initials and initials.startswith(keyword):
+            return RANK_INITIALS_PREFIX
+        if keyword in name:
+            return RANK_NAME_CONTAINS
+        if initials and keyword in initials:
+            return RANK_INITIALS_CONTAINS
+        if keyword in barcode:
+            return RANK_BARCODE_CONTAINS
+        return None
+
+
+class GoodsSearchIndex:
+    """商品搜索索引（进程内共享）"""
+
+    def __init__(self, refresh_interval=30):
+        """
+        :param refresh_interval: 两次检查 goods 表是否变化的最小间隔（秒）
+        """
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_watermark(db):
+        db.execute("SELECT COUNT(*) AS cnt, MAX(update_time) AS last_update FROM goods")
+        row = db.fetchone()
+        return int(row['cnt'] or 0), row['last_update']
+
+    def _ensure_fresh(self):
+        """按需检查并重建索引，返回当前快照"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return snapshot
+            with DBConnection() as db:
+                watermark = self._load_watermark(db)
+                if snapshot is None or snapshot.watermark != watermark:
+                    db.execute("""
+                        SELECT goods_id, barcode, goods_name, price, unit,
+                               is_weighted, shelf_status
+                        FROM goods
+                    """)
+                    snapshot = _IndexSnapshot(db.fetchall(), watermark)
+                    self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        """下次查询时立即检查 goods 表是否变化（本机新增/修改商品后调用）"""
+        self._checked_at = 0.0
+
+    def search(self, keyword, limit=10, on_shelf_only=False):
+        """
+        按关键词搜索商品，结果按匹配等级排序
+        :param keyword: 名称/条码/拼音首字母片段
+        :param limit: 最多返回条数，None表示不限
+        :param on_shelf_only: 只返回在架商品
+        :return: list of (goods_row, rank)
+        """
+        keyword = (keyword or "").strip().lower()
+        if not keyword:
+            return []
+        snapshot = self._ensure_fresh()
+
+        matches = []
+        for goods_id in snapshot.candidates(keyword):
+            row = snapshot.entries[goods_id][0]
+            if on_shelf_only and row['shelf_status'] != 'on_shelf':
+                continue
+            rank = snapshot.rank(goods_id, keyword)
+            if rank is not None:
+                matches.append((rank, len(row['goods_name']), goods_id, row))
+        matches.sort(key=lambda m: m[:3])
+        if limit is not None:
+            matches = matches[:limit]
+        return [(row, rank) for rank, _, _, row in matches]
+
+    def match_ids(self, keyword):
+        """关键词匹配的全部商品ID，按ID升序（供列表查询拼接 IN 条件）"""
+        return sorted(row['goods_id'] for row, _ in self.search(keyword, limit=None))
+
+
+goods_search_index = GoodsSearchIndex(refresh_interval=SYSTEM_CONFIG.get('search_index_refresh', 30))
+
+
+def invalidate_search_index():
+    """商品信息变化后调用"""
+    goods_search_index.invalidate()
+
+
+# IN 条件最多携带的商品ID数（短关键词可能匹配上万个商品）
+IN_LIST_MAX = max(1, int(SYSTEM_CONFIG.get('search_in_list_max', 500)))
+
+
+def _in_condition(column, ids):
+    return f" AND {column} IN ({', '.join(['%s'] * len(ids))})", list(ids)
+
+
+def keyword_condition(column, keyword, name_column="g.goods_name", barcode_column="g.barcode"):
+    """
+    列表查询的关键词条件：用索引匹配到的商品ID代替 LIKE '%kw%' 全表扫描；
+    匹配数超过 IN_LIST_MAX 时退回 LIKE（只匹配名称/条码，不含拼音首字母）
+    :param column: 商品ID列名（如 g.goods_id）
+    :param name_column: 商品名称列名（LIKE 时使用）
+    :param barcode_column: 条码列名（LIKE 时使用）
+    :return: (sql片段, 参数列表)
+    """
+    ids = goods_search_index.match_ids(keyword)
+    if not ids:
+        return " AND 1 = 0", []
+    if len(ids) > IN_LIST_MAX:
+        pattern = f"%{keyword.strip()}%"
+        return f" AND ({name_column} LIKE %s OR {barcode_column} LIKE %s)", [pattern, pattern]
+    return _in_condition(column, ids)
+
+
+def keyword_page_condition(column, keyword, after_id=None):
+    """
+    keyset 分页查询的关键词条件：只取游标之后的至多 IN_LIST_MAX 个匹配ID，参数个数与匹配总数无关
+    :param column: 商品ID列名（如 g.goods_id）
+    :param after_id: 上一页最后一条的商品ID
+    :return: (sql片段, 参数列表, 本段最后一个ID)，本段之后没有更多匹配时最后一项为None；
+             查询结果不足一页而最后一项不为None时，以它作为下一页的游标
+    """
+    ids = goods_search_index.match_ids(keyword)
+    start = bisect.bisect_right(ids, after_id) if after_id is not None else 0
+    chunk = ids[start:start + IN_LIST_MAX]
+    if not chunk:
+        return " AND 1 = 0", [], None
+    chunk_end = chunk[-1] if start + IN_LIST_MAX < len(ids) else None
+    sql, params = _in_condition(column, chunk)
+    return sql, params, chunk_end
+
+
+def suggest_goods(keyword, limit=10, on_shelf_only=True):
+    """
+    输入联想：每次按键调用，返回最匹配的商品
+    :return: {"success": bool, "data": list, "message": str}
+    """
+    try:
+        rows = [dict(row, match_rank=rank)
+                for row, rank in goods_search_index.search(keyword, limit, on_shelf_only)]
+        return {"success": True, "data": rows, "message": "查询成功"}
+    except Exception as e:
+        return {"success": False, "data": [], "message": f"查询失败: {str(e)}"}
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+库存流水与快照逻辑
+所有库存变更在同一事务中追加 inventory_movement 流水；定期把 inventory 整表写入 inventory_snapshot，
+时点库存 = 该时点前最近的快照 + 快照之后到该时点的流水，不需要从头回放历史。
+流水的 create_time 是写入时间而不是提交时间，快照与流水的分界按流水ID：快照时锁住整张库存表，
+等进行中的库存事务提交后再读取，记下此时的最大流水ID，之后的流水ID都大于它。
+快照与对账建议在非营业时间执行（可加入计划任务）：
+    python -m logic.inventory_ledger_logic snapshot
+    python -m logic.inventory_ledger_logic drift
+"""
+
+import sys
+import time
+from datetime import timedelta
+from db.db_conn import DBConnection
+from config import SYSTEM_CONFIG
+
+# inventory 字段 -> 流水库位
+COLUMN_LOCATIONS = {"stock_num": "stock", "on_shelf_num": "shelf"}
+
+MOVEMENT_TYPES = {
+    "sale": "销售",
+    "return": "退货",
+    "stock_in": "入库",
+    "transfer": "移库上架",
+    "adjust": "调整",
+}
+
+
+def record_movements(db, movements):
+    """
+    追加库存流水（在库存变更事务中调用）
+    :param db: 库存变更事务所在的连接
+    :param movements: [(goods_id, location, change_qty, balance_after, movement_type, ref_no), ...]
+    """
+    if not movements:
+        return
+    db.executemany("""
+        INSERT INTO inventory_movement
+        (goods_id, location, change_qty, balance_after, movement_type, ref_no)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, movements)
+
+
+# 快照与库存事务死锁时的重试次数（快照事务尚未写入，通常被选为回滚方）
+SNAPSHOT_RETRIES = 3
+
+
+def _write_snapshot(db):
+    """
+    在一个事务中写入整表快照（调用方提交）
+    :return: (snapshot_time, last_movement_id, goods_count)
+    """
+    # 共享锁锁住全部库存行：进行中的库存事务（先锁库存行再写流水）提交后才能拿到，
+    # 快照提交前新的库存事务等待，因此此刻已写入的流水都已提交并反映在库存中
+    db.execute("SELECT COUNT(*) AS cnt FROM inventory FORCE INDEX (PRIMARY) LOCK IN SHARE MODE")
+    db.execute("""
+        SELECT NOW(6) AS now_time,
+               (SELECT COALESCE(MAX(movement_id), 0) FROM inventory_movement) AS last_movement_id
+    """)
+    row = db.fetchone()
+    snapshot_time, last_movement_id = row['now_time'], row['last_movement_id']
+    db.execute("""
+        INSERT INTO inventory_snapshot (snapshot_time, goods_id, stock_num, on_shelf_num, last_movement_id)
+        SELECT %s, goods_id, stock_num, on_shelf_num, %s FROM inventory
+    """, (snapshot_time, last_movement_id))
+    return snapshot_time, last_movement_id, db.cursor.rowcount
+
+
+def take_snapshot(keep_days=None):
+    """
+    写入一次整表库存快照，并清理超过保留天数的旧快照（流水不清理）
+    快照期间库存变更会短暂等待，建议在非营业时间执行
+    :param keep_days: 快照保留天数，默认取配置 inventory_snapshot_keep_days
+    :return: {"success": bool, "data": {"snapshot_time", "last_movement_id", "goods_count", "purged"}, "message": str}
+    """
+    keep_days = keep_days if keep_days is not None else SYSTEM_CONFIG.get('inventory_snapshot_keep_days', 90)
+    try:
+        with DBConnection() as db:
+            for attempt in range(SNAPSHOT_RETRIES):
+                try:
+                    snapshot_time, last_movement_id, goods_count = _write_snapshot(db)
+                    purged = 0
+                    if keep_days:
+                        db.execute("DELETE FROM inventory_snapshot WHERE snapshot_time < %s",
+                                   (snapshot_time - timedelta(days=keep_days),))
+                        purged = db.cursor.rowcount
+                    db.commit()
+                    break
+                except Exception as e:
+                    db.rollback()
+                    # 1213: 死锁，稍后重试
+                    if e.args and e.args[0] == 1213 and attempt < SNAPSHOT_RETRIES - 1:
+                        time.sleep(0.5)
+                        continue
+                    raise
+        return {
+            "success": True,
+            "data": {"snapshot_time": snapshot_time, "last_movement_id": last_movement_id,
+                     "goods_count": goods_count, "purged": purged},
+            "message": f"库存快照完成，共{goods_count}个商品"
+        }
+    except Exception as e:
+        return {"success": False, "data": None, "message": f"库存快照失败: {str(e)}"}
+
+
+def _movement_delta(db, goods_id, after_movement_id=None, after_time=None, until_time=None):
+    """
+    某商品快照之后（流水ID大于 after_movement_id）或某时点之后（create_time 大于 after_time）、
+    截至 until_time 的各库位流水合计
+    """
+    sql = """
+        SELECT location, COALESCE(SUM(change_qty), 0) AS qty
+        FROM inventory_movement
+        WHERE goods_id = %s
+    """
+    params = [goods_id]
+    if after_movement_id is not None:
+        sql += " AND movement_id > %s"
+        params.append(after_movement_id)
+    if after_time is not None:
+        sql += " AND create_time > %s"
+        params.append(after_time)
+    if until_time is not None:
+        sql += " AND create_time <= %s"
+        params.append(until_time)
+    db.execute(sql + " GROUP BY location", params)
+    delta = {"stock": 0, "shelf": 0}
+    for row in db.fetchall():
+        delta[row['location']] = row['qty']
+    return delta
+
+
+def get_stock_at(goods_id, at_time):
+    """
+    查询某商品在指定时点的仓库/在架数量
+    有该时点之前的快照时取 快照 + 之后的流水；否则取 当前库存 - 该时点之后的流水
+    :param goods_id: 商品ID
+    :param at_time: 时点（datetime 或 'YYYY-MM-DD HH:MM:SS'）
+    :return: {"success": bool, "data": {"goods_id", "at_time", "stock_num", "on_shelf_num", "base", "base_time"}, "message": str}
+    """
+    try:
+        with DBConnection() as db:
+            db.execute("""
+                SELECT snapshot_time, stock_num, on_shelf_num, last_movement_id
+                FROM inventory_snapshot
+                WHERE goods_id = %s AND snapshot_time <= %s
+                ORDER BY snapshot_time DESC
+                LIMIT 1
+            """, (goods_id, at_time))
+            snapshot = db.fetchone()
+
+            if snapshot:
+                delta = _movement_delta(db, goods_id, after_movement_id=snapshot['last_movement_id'],
+                                        until_time=at_time)
+                stock_num = snapshot['stock_num'] + delta['stock']
+                on_shelf_num = snapshot['on_shelf_num'] + delta['shelf']
+                base, base_time = "snapshot", snapshot['snapshot_time']
+            else:
+                db.execute("SELECT stock_num, on_shelf_num FROM inventory WHERE goods_id = %s", (goods_id,))
+                current = db.fetchone()
+                if not current:
+                    return {"success": False, "data": None, "message": "库存记录不存在"}
+                delta = _movement_delta(db, goods_id, after_time=at_time)
+                stock_num = current['stock_num'] - delta['stock']
+                on_shelf_num = current['on_shelf_num'] - delta['shelf']
+                base, base_time = "current", None
+
+        return {
+            "success": True,
+            "data": {
+                "goods_id": goods_id,
+                "at_time": at_time,
+                "stock_num": stock_num,
+                "on_shelf_num": on_shelf_num,
+                "base": base,
+                "base_time": base_time
+            },
+            "message": "查询成功"
+        }
+    except Exception as e:
+        return {"success": False, "data": None, "message": f"查询失败: {str(e)}"}
+
+
+def get_movements(goods_id, start_time=None, end_time=None, limit=200):
+    """
+    查询某商品的库存流水（按时间倒序）
+    :return: {"success": bool, "data": list, "message": str}
+    """
+    sql = """
+        SELECT movement_id, goods_id, location, change_qty, balance_after,
+               movement_type, ref_no, create_time
+        FROM inventory_movement
+        WHERE goods_id = %s
+    """
+    params = [goods_id]
+    if start_time:
+        sql += " AND create_time >= %s"
+        params.append(start_time)
+    if end_time:
+        sql += " AND create_time <= %s"
+        params.append(end_time)
+    sql += " ORDER BY create_time DESC, movement_id DESC LIMIT %s"
+    params.append(limit)
+    try:
+        with DBConnection() as db:
+            db.execute(sql, params)
+            rows = db.fetchall()
+        for row in rows:
+            row['type_display'] = MOVEMENT_TYPES.get(row['movement_type'], row['movement_type'])
+        return {"success": True, "data": rows, "message": f"查询到{len(rows)}条流水"}
+    except Exception as e:
+        return {"success": False, "data": [], "message": f"查询失败: {str(e)}"}
+
+
+def check_drift():
+    """
+    对账：最近一次快照 + 之后的流水 与当前库存不一致的商品（库存被绕过流水直接修改时出现）
+    :return: {"success": bool, "data": list, "message": str}
+    """
+    try:
+        with DBConnection() as db:
+            db.execute("""
+                SELECT snapshot_time, MAX(last_movement_id) AS last_movement_id
+                FROM inventory_snapshot
+                WHERE snapshot_time = (SELECT MAX(snapshot_time) FROM inventory_snapshot)
+                GROUP BY snapshot_time
+            """)
+            latest = db.fetchone()
+            if latest is None:
+                return {"success": False, "data": [], "message": "尚无库存快照，请先执行快照"}
+            snapshot_time = latest['snapshot_time']
+            db.execute("""
+                SELECT i.goods_id, g.goods_name, i.stock_num, i.on_shelf_num,
+                       s.stock_num + COALESCE(d.stock_delta, 0) AS expected_stock,
+                       s.on_shelf_num + COALESCE(d.shelf_delta, 0) AS expected_shelf
+                FROM inventory i
+                JOIN goods g ON g.goods_id = i.goods_id
+                JOIN inventory_snapshot s ON s.goods_id = i.goods_id AND s.snapshot_time = %s
+                LEFT JOIN (
+                    SELECT goods_id,
+                           SUM(CASE WHEN location = 'stock' THEN change_qty ELSE 0 END) AS stock_delta,
+                           SUM(CASE WHEN location = 'shelf' THEN change_qty ELSE 0 END) AS shelf_delta
+                    FROM inventory_movement
+                    WHERE movement_id > %s
+                    GROUP BY goods_id
+                ) d ON d.goods_id = i.goods_id
+                WHERE i.stock_num <> s.stock_num + COALESCE(d.stock_delta, 0)
+                   OR i.on_shelf_num <> s.on_shelf_num + COALESCE(d.shelf_delta, 0)
+                ORDER BY i.goods_id
+            """, (snapshot_time, latest['last_movement_id']))
+            rows = db.fetchall()
+        return {"success": True, "data": rows,
+                "message": f"对账完成（基准快照 {snapshot_time}），{len(rows)}个商品不一致"}
+    except Exception as e:
+        return {"success": False, "data": [], "message": f"对账失败: {str(e)}"}
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "snapshot":
+        result = take_snapshot()
+    elif command == "drift":
+        result = check_drift()
+        for row in result['data']:
+            print(f"{row['goods_id']} {row['goods_name']}: 仓库 {row['stock_num']}(应为{row['expected_stock']}) "
+                  f"货架 {row['on_shelf_num']}(应为{row['expected_shelf']})")
+    else:
+        print("用法: python -m logic.inventory_ledger_logic snapshot|drift")
+        sys.exit(1)
+    print(result['message'])
+    sys.exit(0 if result['success'] else 1)
@@ -4,7 +4,10 @@
 """
 
 from datetime import datetime
+from decimal import Decimal
 from db.db_conn import DBConnection
+from logic.inventory_ledger_logic import record_movements, COLUMN_LOCATIONS
+from logic.goods_search_logic import keyword_condition, keyword_page_condition
 
 
 class InventoryLogic:
@@ -18,6 +21,16 @@ class InventoryLogic:
     
     STATUS_DISPLAY = {v: k for k, v in STATUS_MAP.items()}
     
+    # 批量接口可操作的库存字段
+    STOCK_COLUMNS = ("stock_num", "on_shelf_num")
+    
+    # 按更新后的数量重新计算库存状态（UPDATE 中赋值自左向右求值，引用的是新值）
+    STOCK_STATUS_SQL = """
+        CASE WHEN stock_num <= stock_warning THEN 'stock_shortage'
+             WHEN on_shelf_num <= shelf_warning THEN 'shelf_shortage'
+             ELSE 'sufficient' END
+    """
+    
     def get_stock(self, goods_id):
         """
         查询库存
@@ -48,45 +61,7 @@ class InventoryLogic:
         """
         if num <= 0:
             return {"success": False, "data": None, "message": "扣减数量必须大于0"}
-        
-        with DBConnection() as db:
-            try:
-                db.execute("SELECT stock_num, stock_warning FROM inventory WHERE goods_id = %s FOR UPDATE", 
-                          (goods_id,))
-                inv = db.fetchone()
-                
-                if not inv:
-                    return {"success": False, "data": None, "message": "库存记录不存在"}
-                
-                if inv['stock_num'] < num:
-                    return {"success": False, "data": None, "message": f"库存不足，当前库存: {inv['stock_num']}"}
-                
-                new_stock = inv['stock_num'] - num
-                
-                # 更新库存状态
-                if new_stock <= 0:
-                    new_status = 'shortage'
-                elif new_stock <= inv['stock_warning']:
-                    new_status = 'warning'
-                else:
-                    new_status = 'sufficient'
-                
-                sql = """
-                    UPDATE inventory 
-                    SET stock_num = %s, stock_status = %s, update_time = NOW()
-                    WHERE goods_id = %s
-                """
-                db.execute(sql, (new_stock, new_status, goods_id))
-                db.commit()
-                
-                return {
-                    "success": True, 
-                    "data": {"old_stock": inv['stock_num'], "new_stock": new_stock, "status": new_status},
-                    "message": f"库存已扣减，剩余: {new_stock}"
-                }
-            except Exception as e:
-                db.rollback()
-                return {"success": False, "data": None, "message": f"扣减失败: {str(e)}"}
+        return self._single_result(self.reduce_stock_batch([(goods_id, num)]), "库存已扣减，剩余")
 
     def restore_stock(self, goods_id, num):
         """
@@ -97,41 +72,19 @@ class InventoryLogic:
         """
         if num <= 0:
             return {"success": False, "data": None, "message": "恢复数量必须大于0"}
-        
-        with DBConnection() as db:
-            try:
-                db.execute("SELECT stock_num, stock_warning FROM inventory WHERE goods_id = %s", (goods_id,))
-                inv = db.fetchone()
-                
-                if not inv:
-                    return {"success": False, "data": None, "message": "库存记录不存在"}
-                
-                new_stock = inv['stock_num'] + num
-                
-                # 更新库存状态
-                if new_stock <= 0:
-                    new_status = 'shortage'
-                elif new_stock <= inv['stock_warning']:
-                    new_status = 'warning'
-                else:
-                    new_status = 'sufficient'
-                
-                sql = """
-                    UPDATE inventory 
-                    SET stock_num = %s, stock_status = %s, update_time = NOW()
-                    WHERE goods_id = %s
-                """
-                db.execute(sql, (new_stock, new_status, goods_id))
-                db.commit()
-                
-                return {
-                    "success": True, 
-                    "data": {"old_stock": inv['stock_num'], "new_stock": new_stock, "status": new_status},
-                    "message": f"库存已恢复，当前: {new_stock}"
-                }
-            except Exception as e:
-                db.rollback()
-                return {"success": False, "data": None, "message": f"恢复失败: {str(e)}"}
+        return self._single_result(self.restore_stock_batch([(goods_id, num)]), "库存已恢复，当前")
+    
+    @staticmethod
+    def _single_result(result, label):
+        """单商品接口的返回格式"""
+        if not result['success']:
+            return {"success": False, "data": None, "message": result['message']}
+        item = result['data']['items'][0]
+        return {
+            "success": True,
+            "data": {"old_stock": item['old_value'], "new_stock": item['new_value'], "status": item['status']},
+            "message": f"{label}: {item['new_value']}"
+        }
     
     def set_warning_value(self, goods_id, stock_warning, shelf_warning=None):
         """
@@ -232,46 +185,149 @@ class InventoryLogic:
         入库（进货时调用）
         :param goods_id: 商品ID
         :param num: 入库数量
-        :param batch_no: 批次号
+        :param batch_no: 批次号（记入库存流水）
         :return: {"success": bool, "data": dict, "message": str}
         """
         if num <= 0:
             return {"success": False, "data": None, "message": "入库数量必须大于0"}
+        return self._single_result(self.add_stock_batch([(goods_id, num)], ref_no=batch_no), "入库成功，当前库存")
+    
+    @staticmethod
+    def _calc_stock_status(stock_num, on_shelf_num, stock_warning, shelf_warning):
+        """与 STOCK_STATUS_SQL 一致的库存状态计算"""
+        if stock_num <= stock_warning:
+            return 'stock_shortage'
+        if on_shelf_num <= shelf_warning:
+            return 'shelf_shortage'
+        return 'sufficient'
+    
+    def _apply_stock_batch(self, db, items, column, sign, allow_missing, movement_type, ref_no=None):
+        """
+        批量变更库存：一条 SELECT ... FOR UPDATE + 一条 CASE UPDATE + 一次批量写流水
+        :param db: 当前事务所在的连接
+        :param items: [(goods_id, qty), ...]，同一商品多次出现时数量累加
+        :param column: stock_num / on_shelf_num
+        :param sign: 1 增加，-1 扣减
+        :param allow_missing: 为True时跳过无库存记录的商品，否则整体失败
+        :param movement_type: 流水类型（sale/return/stock_in）
+        :param ref_no: 关联单号
+        :return: {"success": bool, "data": {"items": list, "missing": list}, "message": str}
+        """
+        if column not in self.STOCK_COLUMNS:
+            return {"success": False, "data": None, "message": f"不支持的库存字段: {column}"}
         
-        with DBConnection() as db:
+        quantities = {}
+        for goods_id, qty in items:
+            qty = Decimal(str(qty))
+            if qty <= 0:
+                return {"success": False, "data": None, "message": f"商品ID {goods_id} 数量必须大于0"}
+            quantities[goods_id] = quantities.get(goods_id, Decimal("0")) + qty
+        if not quantities:
+            return {"success": False, "data": None, "message": "没有需要变更的库存"}
+        
+        goods_ids = sorted(quantities)
+        placeholders = ','.join(['%s'] * len(goods_ids))
+        db.execute(f"""
+            SELECT goods_id, stock_num, on_shelf_num, stock_warning, shelf_warning
+            FROM inventory WHERE goods_id IN ({placeholders})
+            ORDER BY goods_id
+            FOR UPDATE
+        """, goods_ids)
+        rows = {row['goods_id']: row for row in db.fetchall()}
+        
+        missing = [goods_id for goods_id in goods_ids if goods_id not in rows]
+        if missing and not allow_missing:
+            return {"success": False, "data": {"items": [], "missing": missing},
+                    "message": f"库存记录不存在: {', '.join(str(g) for g in missing)}"}
+        
+        results = []
+        for goods_id in goods_ids:
+            inv = rows.get(goods_id)
+            if not inv:
+                continue
+            old_value = inv[column]
+            new_value = old_value + sign * quantities[goods_id]
+            if new_value < 0:
+                return {"success": False, "data": {"items": [], "missing": missing},
+                        "message": f"商品ID {goods_id} 库存不足，当前: {old_value}"}
+            values = {"stock_num": inv['stock_num'], "on_shelf_num": inv['on_shelf_num']}
+            values[column] = new_value
+            results.append({
+                "goods_id": goods_id,
+                "quantity": quantities[goods_id],
+                "old_value": old_value,
+                "new_value": new_value,
+                "status": self._calc_stock_status(values["stock_num"], values["on_shelf_num"],
+                                                  inv['stock_warning'], inv['shelf_warning'])
+            })
+        
+        if results:
+            cases = ' '.join(['WHEN %s THEN %s'] * len(results))
+            update_ids = [r['goods_id'] for r in results]
+            params = []
+            for r in results:
+                params.extend([r['goods_id'], r['quantity']])
+            params.extend(update_ids)
+            op = '+' if sign > 0 else '-'
+            db.execute(f"""
+                UPDATE inventory
+                SET {column} = {column} {op} (CASE goods_id {cases} END),
+                    stock_status = {self.STOCK_STATUS_SQL},
+                    update_time = NOW()
+                WHERE goods_id IN ({','.join(['%s'] * len(update_ids))})
+            """, params)
+            record_movements(db, [
+                (r['goods_id'], COLUMN_LOCATIONS[column], sign * r['quantity'], r['new_value'], movement_type, ref_no)
+                for r in results
+            ])
+        
+        return {"success": True, "data": {"items": results, "missing": missing},
+                "message": f"已更新{len(results)}个商品库存"}
+    
+    def _run_stock_batch(self, items, column, sign, allow_missing, db, action, movement_type, ref_no):
+        """批量接口入口：传入db时加入调用方事务，否则自行开启并提交事务"""
+        if db is not None:
+            return self._apply_stock_batch(db, items, column, sign, allow_missing, movement_type, ref_no)
+        
+        with DBConnection() as own_db:
             try:
-                db.execute("SELECT stock_num, stock_warning FROM inventory WHERE goods_id = %s", (goods_id,))
-                inv = db.fetchone()
-                
-                if not inv:
-                    return {"success": False, "data": None, "message": "库存记录不存在"}
-                
-                new_stock = inv['stock_num'] + num
-                
-                # 更新库存状态
-                if new_stock <= 0:
-                    new_status = 'shortage'
-                elif new_stock <= inv['stock_warning']:
-                    new_status = 'warning'
+                result = self._apply_stock_batch(own_db, items, column, sign, allow_missing, movement_type, ref_no)
+                if result['success']:
+                    own_db.commit()
                 else:
-                    new_status = 'sufficient'
-                
-                sql = """
-                    UPDATE inventory 
-                    SET stock_num = %s, stock_status = %s, update_time = NOW()
-                    WHERE goods_id = %s
-                """
-                db.execute(sql, (new_stock, new_status, goods_id))
-                db.commit()
-                
-                return {
-                    "success": True, 
-                    "data": {"old_stock": inv['stock_num'], "new_stock": new_stock},
-                    "message": f"入库成功，当前库存: {new_stock}"
-                }
+                    own_db.rollback()
+                return result
             except Exception as e:
-                db.rollback()
-                return {"success": False, "data": None, "message": f"入库失败: {str(e)}"}
+                own_db.rollback()
+                return {"success": False, "data": None, "message": f"{action}失败: {str(e)}"}
+    
+    def reduce_stock_batch(self, items, column="stock_num", db=None, allow_missing=False, ref_no=None):
+        """
+        批量扣减库存（结算调用，扣减在架库存时 column 传 on_shelf_num）
+        :param items: [(goods_id, qty), ...]
+        :param column: 扣减的库存字段 stock_num / on_shelf_num
+        :param db: 调用方事务所在的连接（可选）
+        :param allow_missing: 是否跳过无库存记录的商品
+        :param ref_no: 关联单号（记入库存流水）
+        :return: {"success": bool, "data": {"items": [{goods_id, old_value, new_value, status}], "missing": list}, "message": str}
+        """
+        return self._run_stock_batch(items, column, -1, allow_missing, db, "扣减", "sale", ref_no)
+    
+    def restore_stock_batch(self, items, column="stock_num", db=None, allow_missing=False, ref_no=None):
+        """
+        批量恢复库存（整单/部分退货调用）
+        :param items: [(goods_id, qty), ...]
+        :return: 同 reduce_stock_batch
+        """
+        return self._run_stock_batch(items, column, 1, allow_missing, db, "恢复", "return", ref_no)
+    
+    def add_stock_batch(self, items, db=None, ref_no=None):
+        """
+        批量入库（进货补货调用）
+        :param items: [(goods_id, qty), ...]
+        :return: 同 reduce_stock_batch
+        """
+        return self._run_stock_batch(items, "stock_num", 1, False, db, "入库", "stock_in", ref_no)
     
     def get_all_inventory(self):
         """获取所有库存"""
@@ -287,17 +343,106 @@ class InventoryLogic:
     
     def search_inventory(self, keyword):
         """搜索库存"""
+        where, params = self._keyword_filter(keyword)
         with DBConnection() as db:
-            sql = """
+            sql = f"""
                 SELECT i.*, g.goods_name, g.barcode
                 FROM inventory i
                 JOIN goods g ON i.goods_id = g.goods_id
-                WHERE g.goods_name LIKE %s OR g.barcode LIKE %s
+                WHERE 1=1 {where}
                 ORDER BY i.goods_id
             """
-            db.execute(sql, (f"%{keyword}%", f"%{keyword}%"))
+            db.execute(sql, params)
             return db.fetchall()
     
+    @staticmethod
+    def _keyword_filter(keyword):
+        """商品名称/条码/拼音首字母搜索条件（走搜索索引，不做 LIKE 全表扫描）"""
+        if not keyword:
+            return "", []
+        return keyword_condition("i.goods_id", keyword)
+    
+    def get_inventory_page(self, after_id=None, limit=200, keyword=None):
+        """
+        按商品ID分页获取库存（keyset分页，翻页代价与页码无关）
+        :param after_id: 上一页最后一条的商品ID，首页传None
+        :param limit: 每页条数
+        :param keyword: 商品名称/条码关键词
+        :return: {"success": bool, "data": {"rows", "next_after", "has_more"}, "message": str}
+        """
+        try:
+            where, params, chunk_end = "", [], None
+            if keyword:
+                # 关键词匹配的商品ID按游标分段，每页只携带一段
+                where, params, chunk_end = keyword_page_condition("i.goods_id", keyword, after_id)
+            if after_id is not None:
+                where += " AND i.goods_id > %s"
+                params.append(after_id)
+            with DBConnection() as db:
+                sql = f"""
+                    SELECT i.*, g.goods_name, g.barcode
+                    FROM inventory i
+                    JOIN goods g ON i.goods_id = g.goods_id
+                    WHERE 1=1 {where}
+                    ORDER BY i.goods_id
+                    LIMIT %s
+                """
+                db.execute(sql, params + [limit + 1])
+                rows = db.fetchall()
+            
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            next_after = rows[-1]['goods_id'] if rows else after_id
+            if not has_more and chunk_end is not None:
+                has_more, next_after = True, chunk_end
+            return {
+                "success": True,
+                "data": {
+                    "rows": rows,
+                    "next_after": next_after,
+                    "has_more": has_more
+                },
+                "message": "获取成功"
+            }
+        except Exception as e:
+            return {"success": False, "data": None, "message": f"查询失败: {str(e)}"}
+    
+    def get_inventory_summary(self, keyword=None):
+        """
+        库存统计（商品总数、预警数、充足数），分页显示时代替逐行统计
+        :return: {"success": bool, "data": {"total", "warning", "sufficient"}, "message": str}
+        """
+        try:
+            where, params = self._keyword_filter(keyword)
+            with DBConnection() as db:
+                sql = f"""
+                    SELECT COUNT(*) AS total,
+                           COALESCE(SUM(i.stock_num <= i.stock_warning
+                                        OR i.on_shelf_num <= i.shelf_warning), 0) AS warning
+                    FROM inventory i
+                    JOIN goods g ON i.goods_id = g.goods_id
+                    WHERE 1=1 {where}
+                """
+                db.execute(sql, params)
+                row = db.fetchone()
+            total = int(row['total'] or 0)
+            warning = int(row['warning'] or 0)
+            return {
+                "success": True,
+                "data": {"total": total, "warning": warning, "sufficient": total - warning},
+                "message": "获取成功"
+            }
+        except Exception as e:
+            return {"success": False, "data": None, "message": f"查询失败: {str(e)}"}
+    
+    @staticmethod
+    def record_transfer(db, goods_id, num, old_stock, old_shelf):
+        """记录仓库移到货架的两条流水（调用方已按 old_* 完成更新）"""
+        record_movements(db, [
+            (goods_id, "stock", -num, old_stock - num, "transfer", None),
+            (goods_id, "shelf", num, old_shelf + num, "transfer", None),
+        ])
+    
     def move_to_shelf(self, goods_id, num):
         """从仓库移到货架"""
         if num <= 0:
@@ -305,7 +450,8 @@ class InventoryLogic:
         
         with DBConnection() as db:
             try:
-                db.execute("SELECT stock_num, on_shelf_num FROM inventory WHERE goods_id = %s", (goods_id,))
+                db.execute("SELECT stock_num, on_shelf_num FROM inventory WHERE goods_id = %s FOR UPDATE",
+                           (goods_id,))
                 inv = db.fetchone()
                 
                 if not inv:
@@ -314,12 +460,14 @@ class InventoryLogic:
                 if inv['stock_num'] < num:
                     return False, f"仓库库存不足，当前: {inv['stock_num']}"
                 
-                sql = """
+                sql = f"""
                     UPDATE inventory 
-                    SET stock_num = stock_num - %s, on_shelf_num = on_shelf_num + %s, update_time = NOW()
+                    SET stock_num = stock_num - %s, on_shelf_num = on_shelf_num + %s,
+                        stock_status = {self.STOCK_STATUS_SQL}, update_time = NOW()
                     WHERE goods_id = %s
                 """
                 db.execute(sql, (num, num, goods_id))
+                self.record_transfer(db, goods_id, num, inv['stock_num'], inv['on_shelf_num'])
                 db.commit()
                 return True, "上架成功"
             except Exception as e:
@@ -1,105 +1,198 @@
 # -*- coding: utf-8 -*-
-"""库存警戒逻辑"""
+"""
+库存警戒逻辑
+预警集合保存在进程内（goods_id -> 库存数/警戒值），每次检查只扫描 inventory.update_time
+不早于上次水位线的行并更新集合，汇总和预警列表先增量扫描再从集合得出，不再整表关联扫描；
+首次使用及每隔 warning_full_scan_interval 秒做一次全量扫描兜底。
+update_time 取的是 UPDATE 语句执行时刻，事务可能很久之后才提交：水位线取扫描时仍在进行的
+最早事务的开始时间（information_schema.innodb_trx，需 PROCESS 权限），无权限时按 warning_scan_overlap 回退
+"""
 
+import threading
+import time
+from datetime import timedelta
 from db.db_conn import DBConnection
 from logic.notification_logic import NotificationLogic
+from config import SYSTEM_CONFIG
+
+
+class _WarningState:
+    """库存预警集合（进程内共享）"""
+
+    def __init__(self, overlap=60, full_scan_interval=3600, min_interval=1):
+        """
+        :param overlap: 水位线回退秒数，无法查询进行中事务时应覆盖最长的锁等待（innodb_lock_wait_timeout）
+        :param full_scan_interval: 全量扫描间隔（秒）
+        :param min_interval: 列表/汇总查询前增量扫描的最小间隔（秒），同一次操作内的多次查询只扫描一次
+        """
+        self.overlap = overlap
+        self.full_scan_interval = full_scan_interval
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._full_scan_at = 0.0
+        self._refreshed_at = 0.0
+        self._trx_visible = True  # 能否查询 information_schema.innodb_trx
+        self._total = 0
+        self._known = set()       # 已扫描到的全部商品ID
+        self._warnings = {}       # goods_id -> (stock_num, on_shelf_num, stock_warning, shelf_warning)
+
+    @staticmethod
+    def _is_warning(row):
+        return row['stock_num'] <= row['stock_warning'] or row['on_shelf_num'] <= row['shelf_warning']
+
+    def _next_watermark(self, db):
+        """
+        下次增量扫描的起点（在本次扫描之前取）：
+        现在和仍在进行的最早事务开始时间中较早者，未提交事务写入的 update_time 都不早于它
+        """
+        db.execute("SELECT NOW() AS now_time")
+        watermark = db.fetchone()['now_time']
+        if self._trx_visible:
+            try:
+                db.execute("SELECT MIN(trx_started) AS started FROM information_schema.innodb_trx")
+                started = db.fetchone()['started']
+                if started is not None and started < watermark:
+                    watermark = started
+            except Exception:
+                # 没有 PROCESS 权限，只按固定回退
+                self._trx_visible = False
+        return watermark - timedelta(seconds=self.overlap)
+
+    def refresh(self, max_age=None):
+        """
+        扫描水位线之后变化的库存行并更新预警集合
+        :param max_age: 距上次扫描不足该秒数时跳过
+        :return: 本次扫描的行数
+        """
+        with self._lock:
+            if max_age and self._watermark is not None and time.monotonic() - self._refreshed_at < max_age:
+                return 0
+            full = self._watermark is None or time.monotonic() - self._full_scan_at >= self.full_scan_interval
+            with DBConnection() as db:
+                watermark = self._next_watermark(db)
+                sql = "SELECT goods_id, stock_num, on_shelf_num, stock_warning, shelf_warning FROM inventory"
+                params = ()
+                if not full:
+                    sql += " WHERE update_time >= %s"
+                    params = (self._watermark,)
+                db.execute(sql, params)
+                rows = db.fetchall()
+
+            if full:
+                self._known = set()
+                self._warnings = {}
+                self._full_scan_at = time.monotonic()
+            for row in rows:
+                goods_id = row['goods_id']
+                self._known.add(goods_id)
+                if self._is_warning(row):
+                    self._warnings[goods_id] = (row['stock_num'], row['on_shelf_num'],
+                                                row['stock_warning'], row['shelf_warning'])
+                else:
+                    self._warnings.pop(goods_id, None)
+            self._total = len(self._known)
+            self._watermark = watermark
+            self._refreshed_at = time.monotonic()
+            return len(rows)
+
+    def invalidate(self):
+        """下次检查时做全量扫描"""
+        with self._lock:
+            self._watermark = None
+
+    def ids(self, predicate):
+        """预警集合中满足条件的商品ID（先增量扫描），predicate(stock_num, on_shelf_num, stock_warning, shelf_warning)"""
+        self.refresh(max_age=self.min_interval)
+        with self._lock:
+            return [goods_id for goods_id, item in self._warnings.items() if predicate(*item)]
+
+    def summary(self):
+        """预警汇总（增量扫描后从集合得出）"""
+        self.refresh(max_age=self.min_interval)
+        with self._lock:
+            items = list(self._warnings.values())
+            total = self._total
+        return {
+            "total": total,
+            "shortage_count": sum(1 for stock, _, _, _ in items if stock <= 0),
+            "stock_warning_count": sum(1 for stock, _, warning, _ in items if 0 < stock <= warning),
+            "shelf_warning_count": sum(1 for _, shelf, _, warning in items if shelf <= warning),
+        }
+
+
+warning_state = _WarningState(
+    overlap=SYSTEM_CONFIG.get('warning_scan_overlap', 60),
+    full_scan_interval=SYSTEM_CONFIG.get('warning_full_scan_interval', 3600)
+)
 
 
 class InventoryWarning:
     """库存警戒业务逻辑"""
     
-    def get_stock_warning_list(self):
-        """获取库存预警列表"""
+    @staticmethod
+    def _fetch_goods(goods_ids, condition, order_by):
+        """按预警集合中的商品ID取明细（主键查询，并按当前数据复核条件）"""
+        if not goods_ids:
+            return []
         with DBConnection() as db:
-            sql = """
+            sql = f"""
                 SELECT i.*, g.goods_name, g.barcode
                 FROM inventory i
                 JOIN goods g ON i.goods_id = g.goods_id
-                WHERE i.stock_num <= i.stock_warning
-                ORDER BY i.stock_num ASC
+                WHERE i.goods_id IN ({', '.join(['%s'] * len(goods_ids))}) AND {condition}
+                ORDER BY {order_by}
             """
-            db.execute(sql)
+            db.execute(sql, goods_ids)
             return db.fetchall()
     
+    def get_stock_warning_list(self):
+        """获取库存预警列表"""
+        goods_ids = warning_state.ids(lambda stock, shelf, stock_warning, shelf_warning: stock <= stock_warning)
+        return self._fetch_goods(goods_ids, "i.stock_num <= i.stock_warning", "i.stock_num ASC")
+    
     def get_shelf_warning_list(self):
         """获取货架预警列表"""
-        with DBConnection() as db:
-            sql = """
-                SELECT i.*, g.goods_name, g.barcode
-                FROM inventory i
-                JOIN goods g ON i.goods_id = g.goods_id
-                WHERE i.on_shelf_num <= i.shelf_warning
-                ORDER BY i.on_shelf_num ASC
-            """
-            db.execute(sql)
-            return db.fetchall()
+        goods_ids = warning_state.ids(lambda stock, shelf, stock_warning, shelf_warning: shelf <= shelf_warning)
+        return self._fetch_goods(goods_ids, "i.on_shelf_num <= i.shelf_warning", "i.on_shelf_num ASC")
     
     def check_all_inventory(self):
-        """检查所有库存状态并更新"""
+        """检查库存状态并更新（只扫描上次检查后变化的库存行）"""
         # 直接创建库存预警通知，不更新状态字段（避免ENUM值不匹配）
         try:
+            warning_state.refresh()
             self._create_warning_notifications()
             return True, "库存检查完成"
         except Exception as e:
             return False, str(e)
     
     def _create_warning_notifications(self):
-        """创建库存预警通知"""
+        """创建库存预警通知（按预警商品集合去重，只有新进入预警的商品才会通知）"""
         notification_logic = NotificationLogic()
         
-        # 获取缺货商品
+        # 缺货商品
         shortage_list = self.get_shortage_goods()
-        if shortage_list:
-            goods_names = [item['goods_name'] for item in shortage_list[:5]]
-            content = f"The following items are out of stock: {', '.join(goods_names)}"
-            if len(shortage_list) > 5:
-                content += f" and {len(shortage_list) - 5} more"
-            notification_logic.create_notification(
-                target_user_id=None, target_role="admin",
-                notification_type="stock_warning",
-                title="Stock Out Warning",
-                content=content
-            )
+        result = notification_logic.notify_set(
+            "stock_warning:shortage", "admin", "stock_warning", "缺货预警",
+            [(item['goods_id'], item['goods_name']) for item in shortage_list]
+        )
+        if not result['success']:
+            raise RuntimeError(result['message'])
         
-        # 获取库存预警商品
-        stock_warning_list = self.get_stock_warning_list()
-        if stock_warning_list:
-            warning_only = [item for item in stock_warning_list if item['stock_num'] > 0]
-            if warning_only:
-                goods_names = [item['goods_name'] for item in warning_only[:5]]
-                content = f"Low stock items: {', '.join(goods_names)}"
-                if len(warning_only) > 5:
-                    content += f" and {len(warning_only) - 5} more"
-                notification_logic.create_notification(
-                    target_user_id=None, target_role="admin",
-                    notification_type="stock_warning",
-                    title="Low Stock Warning",
-                    content=content
-                )
+        # 库存预警商品（不含缺货）
+        warning_only = [item for item in self.get_stock_warning_list() if item['stock_num'] > 0]
+        result = notification_logic.notify_set(
+            "stock_warning:low_stock", "admin", "stock_warning", "库存不足预警",
+            [(item['goods_id'], item['goods_name']) for item in warning_only]
+        )
+        if not result['success']:
+            raise RuntimeError(result['message'])
     
     def get_shortage_goods(self):
         """获取缺货商品列表"""
-        with DBConnection() as db:
-            sql = """
-                SELECT i.*, g.goods_name, g.barcode
-                FROM inventory i
-                JOIN goods g ON i.goods_id = g.goods_id
-                WHERE i.stock_num <= 0
-                ORDER BY g.goods_name
-            """
-            db.execute(sql)
-            return db.fetchall()
+        goods_ids = warning_state.ids(lambda stock, shelf, stock_warning, shelf_warning: stock <= 0)
+        return self._fetch_goods(goods_ids, "i.stock_num <= 0", "g.goods_name")
     
     def get_warning_summary(self):
-        """获取预警汇总"""
-        with DBConnection() as db:
-            sql = """
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN stock_num <= 0 THEN 1 ELSE 0 END) as shortage_count,
-                    SUM(CASE WHEN stock_num > 0 AND stock_num <= stock_warning THEN 1 ELSE 0 END) as stock_warning_count,
-                    SUM(CASE WHEN on_shelf_num <= shelf_warning THEN 1 ELSE 0 END) as shelf_warning_count
-                FROM inventory
-            """
-            db.execute(sql)
-            return db.fetchone()
+        """获取预警汇总（增量扫描后来自预警集合，不整表扫描库存表）"""
+        return warning_state.summary()
@@ -4,6 +4,8 @@
 """
 
 from db.db_conn import DBConnection
+from logic.member_manage_logic import invalidate_member_cache
+from logic import member_level_engine
 
 
 class MemberConsumeLogic:
@@ -61,7 +63,9 @@ class MemberConsumeLogic:
                 
                 db.execute("UPDATE member SET total_points = %s WHERE member_id = %s", 
                           (new_points, member_id))
+                member_level_engine.evaluate_member(db, member_id, reason)
                 db.commit()
+                invalidate_member_cache(member_id)
                 
                 return {
                     "success": True, 
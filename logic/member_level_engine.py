@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+会员等级升降级引擎
+结账、退货等修改累计消费/积分的事务在提交前调用 evaluate_member，只重算该会员的等级；
+夜间批量重算所有会员（集合SQL一次完成，变更记录和通知各一条批量插入）：
+    python -m logic.member_level_engine
+"""
+
+import sys
+from db.db_conn import DBConnection
+from logic import member_level_rules
+from logic.member_manage_logic import invalidate_member_cache
+from logic.notification_logic import insert_notification, bump_unread
+from utils.notify_bus import notification_bus, EVENT_REFRESH
+
+# 等级变动通知发送的角色
+NOTIFY_ROLE = 'admin'
+
+
+def target_level(total_consume, total_points):
+    """按累计消费和积分确定应属等级（满足门槛的最高等级）"""
+    level = 'normal'
+    for rule in member_level_rules.rules_by_threshold():
+        if float(total_consume) >= float(rule['min_consume']) and total_points >= rule['min_points']:
+            level = rule['level_code']
+    return level
+
+
+def level_ranks():
+    """等级代码 -> 高低次序（按升级门槛从低到高，来自会员等级规则）"""
+    ranks = {'normal': 0}
+    for rank, rule in enumerate(member_level_rules.rules_by_threshold(), 1):
+        ranks[rule['level_code']] = rank
+    return ranks
+
+
+def _level_name(level_code):
+    rule = member_level_rules.get_rule(level_code)
+    return rule['level_name'] if rule else level_code
+
+
+def evaluate_member(db, member_id, reason, operator_id=None, allow_upgrade=True, allow_downgrade=True):
+    """
+    重算单个会员的等级（在修改累计消费/积分的事务中调用，随该事务提交或回滚）
+    :param db: 调用方事务所在的连接
+    :param member_id: 会员ID
+    :param reason: 变更原因（写入变更记录）
+    :param operator_id: 操作人ID
+    :param allow_upgrade: 是否允许升级
+    :param allow_downgrade: 是否允许降级
+    :return: 等级有变化时返回 {"member_id", "old_level", "new_level", "change_type"}，否则None
+    """
+    db.execute("""
+        SELECT member_id, card_no, name, level_code, total_consume, total_points
+        FROM member WHERE member_id = %s AND status = 'active'
+    """, (member_id,))
+    member = db.fetchone()
+    if not member:
+        return None
+
+    old_level = member['level_code']
+    new_level = target_level(member['total_consume'], member['total_points'])
+    ranks = level_ranks()
+    # 规则中没有的等级不重算（不能因此中断结账/退货事务）
+    if old_level not in ranks or new_level not in ranks:
+        return None
+    old_rank, new_rank = ranks[old_level], ranks[new_level]
+    if new_rank == old_rank or (new_rank > old_rank and not allow_upgrade) \
+            or (new_rank < old_rank and not allow_downgrade):
+        return None
+
+    upgrade = new_rank > old_rank
+    change_type = 'level_up' if upgrade else 'level_down'
+    # update_time 由 ON UPDATE 自动更新（收银/售后角色只有 level_code 等列的更新权限）
+    db.execute("UPDATE member SET level_code = %s WHERE member_id = %s", (new_level, member_id))
+    db.execute("""
+        INSERT INTO member_change_log
+        (member_id, change_type, old_value, new_value, change_reason, operator_id)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (member_id, change_type, old_level, new_level, reason, operator_id))
+    insert_notification(
+        db, None, NOTIFY_ROLE,
+        'member_upgrade' if upgrade else 'member_downgrade',
+        '会员升级' if upgrade else '会员降级',
+        f"会员 {member['name']}({member['card_no']}) 由{_level_name(old_level)}"
+        f"{'升级' if upgrade else '降级'}为{_level_name(new_level)}（{reason}）",
+        member_id
+    )
+    return {"member_id": member_id, "old_level": old_level, "new_level": new_level, "change_type": change_type}
+
+
+def _target_level_sql():
+    """应属等级的 CASE 表达式（门槛从高到低，取第一个满足的）"""
+    rules = member_level_rules.rules_by_threshold()
+    sql, params = "CASE", []
+    for rule in reversed(rules):
+        sql += " WHEN m.total_consume >= %s AND m.total_points >= %s THEN %s"
+        params.extend([rule['min_consume'], rule['min_points'], rule['level_code']])
+    sql += " ELSE 'normal' END"
+    return sql, params
+
+
+def recompute_all(operator_id=None, reason="夜间等级重算"):
+    """
+    批量重算所有正常状态会员的等级
+    变化名单先写入临时表，再用三条集合语句写变更记录、通知并更新会员表，整体一个事务
+    :return: {"success": bool, "data": {"upgraded", "downgraded"}, "message": str}
+    """
+    ranks = level_ranks()
+    level_order = sorted(ranks, key=ranks.get)
+    level_list = ", ".join(["%s"] * len(level_order))
+    try:
+        with DBConnection() as db:
+            try:
+                case_sql, case_params = _target_level_sql()
+                db.execute("DROP TEMPORARY TABLE IF EXISTS tmp_member_level_change")
+                db.execute(f"""
+                    CREATE TEMPORARY TABLE tmp_member_level_change (
+                        member_id INT PRIMARY KEY,
+                        old_level VARCHAR(20),
+                        new_level VARCHAR(20),
+                        is_upgrade TINYINT
+                    )
+                    SELECT member_id, old_level, new_level,
+                           FIELD(new_level, {level_list}) > FIELD(old_level, {level_list}) AS is_upgrade
+                    FROM (
+                        SELECT m.member_id, m.level_code AS old_level, {case_sql} AS new_level
+                        FROM member m
+                        WHERE m.status = 'active' AND m.level_code IN ({level_list})
+                    ) t
+                    WHERE old_level <> new_level
+                """, level_order + level_order + case_params + level_order)
+
+                db.execute("""
+                    INSERT INTO member_change_log
+                    (member_id, change_type, old_value, new_value, change_reason, operator_id)
+                    SELECT member_id, IF(is_upgrade, 'level_up', 'level_down'),
+                           old_level, new_level, %s, %s
+                    FROM tmp_member_level_change
+                """, (reason, operator_id))
+
+                db.execute("""
+                    INSERT INTO sys_notification
+                    (target_role, notification_type, title, content, related_id, is_read, create_time)
+                    SELECT %s, IF(c.is_upgrade, 'member_upgrade', 'member_downgrade'),
+                           IF(c.is_upgrade, '会员升级', '会员降级'),
+                           CONCAT('会员 ', m.name, '(', m.card_no, ') 由', COALESCE(ro.level_name, c.old_level),
+                                  IF(c.is_upgrade, '升级', '降级'), '为', COALESCE(rn.level_name, c.new_level),
+                                  '（', %s, '）'),
+                           c.member_id, 0, NOW()
+                    FROM tmp_member_level_change c
+                    JOIN member m ON m.member_id = c.member_id
+                    LEFT JOIN member_level_rule ro ON ro.level_code = c.old_level
+                    LEFT JOIN member_level_rule rn ON rn.level_code = c.new_level
+                """, (NOTIFY_ROLE, reason))
+                bump_unread(db, None, NOTIFY_ROLE, db.cursor.rowcount)
+
+                db.execute("""
+                    UPDATE member m
+                    JOIN tmp_member_level_change c ON m.member_id = c.member_id
+                    SET m.level_code = c.new_level
+                """)
+
+                db.execute("""
+                    SELECT COALESCE(SUM(is_upgrade), 0) AS upgraded, COUNT(*) - COALESCE(SUM(is_upgrade), 0) AS downgraded
+                    FROM tmp_member_level_change
+                """)
+                counts = db.fetchone()
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.execute("DROP TEMPORARY TABLE IF EXISTS tmp_member_level_change")
+
+        invalidate_member_cache()
+        upgraded, downgraded = int(counts['upgraded']), int(counts['downgraded'])
+        if upgraded or downgraded:
+            notification_bus.publish(EVENT_REFRESH, target_user_id=None, target_role=NOTIFY_ROLE)
+        return {
+            "success": True,
+            "data": {"upgraded": upgraded, "downgraded": downgraded},
+            "message": f"会员等级重算完成：升级{upgraded}人，降级{downgraded}人"
+        }
+    except Exception as e:
+        return {"success": False, "data": None, "message": f"会员等级重算失败: {str(e)}"}
+
+
+if __name__ == "__main__":
+    result = recompute_all()
+    print(result['message'])
+    sys.exit(0 if result['success'] else 1)
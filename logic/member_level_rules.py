@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+会员等级规则缓存
+member_level_rule 只有几行且只通过 MemberRuleLogic.save_all_rules 修改，
+进程内缓存整张表，折扣率/积分比例只需会员的 level_code 即可确定，结账等高频路径不再关联规则表；
+save_all_rules 在同一事务中递增 sys_sequence 里的版本号，
+各进程最多每 rule_cache_check_interval 秒比对一次版本号，版本变化时重新加载
+"""
+
+import threading
+import time
+from db.db_conn import DBConnection
+from config import SYSTEM_CONFIG
+
+VERSION_KEY = 'member_level_rule:version'
+
+_lock = threading.Lock()
+_rules = None           # level_code -> 规则
+_version = None
+_checked_at = 0.0
+_check_interval = SYSTEM_CONFIG.get('rule_cache_check_interval', 30)
+
+
+def _read_version(db):
+    db.execute("SELECT current_value FROM sys_sequence WHERE seq_name = %s", (VERSION_KEY,))
+    row = db.fetchone()
+    return int(row['current_value']) if row else 0
+
+
+def bump_version(db):
+    """递增规则版本号（在修改规则的事务中调用）"""
+    db.execute("""
+        INSERT INTO sys_sequence (seq_name, current_value) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE current_value = current_value + 1
+    """, (VERSION_KEY,))
+
+
+def invalidate():
+    """本进程下次读取时重新加载规则（本机保存规则后调用）"""
+    global _version
+    with _lock:
+        _version = None
+
+
+def get_rules():
+    """
+    获取全部等级规则
+    :return: dict level_code -> {level_name, min_consume, min_points, discount_rate, points_rate}（只读）
+    """
+    global _rules, _version, _checked_at
+    rules = _rules
+    if rules is not None and _version is not None and time.monotonic() - _checked_at < _check_interval:
+        return rules
+
+    with _lock:
+        if _rules is not None and _version is not None and time.monotonic() - _checked_at < _check_interval:
+            return _rules
+        with DBConnection() as db:
+            version = _read_version(db)
+            if _rules is None or version != _version:
+                db.execute("""
+                    SELECT level_code, level_name, min_consume, min_points, discount_rate, points_rate
+                    FROM member_level_rule
+                """)
+                _rules = {row['level_code']: row for row in db.fetchall()}
+                _version = version
+        _checked_at = time.monotonic()
+        return _rules
+
+
+def get_rule(level_code):
+    """获取某一等级的规则（副本），不存在时返回None"""
+    rule = get_rules().get(level_code)
+    return dict(rule) if rule else None
+
+
+def rules_by_threshold():
+    """按升级门槛从低到高排列的规则列表"""
+    return sorted((dict(rule) for rule in get_rules().values()),
+                  key=lambda rule: (rule['min_consume'], rule['min_points']))
+
+
+def resolve_discount(level_code):
+    """等级对应的折扣率（未知等级不打折）"""
+    rule = get_rules().get(level_code)
+    return float(rule['discount_rate']) if rule else 1.0
+
+
+def resolve_points_rate(level_code):
+    """等级对应的积分比例（未知等级按1元1积分）"""
+    rule = get_rules().get(level_code)
+    return int(rule['points_rate']) if rule else 1
@@ -6,6 +6,32 @@
 import random
 from datetime import datetime
 from db.db_conn import DBConnection
+from config import SYSTEM_CONFIG
+from utils.cache_utils import TTLCache
+from logic import member_level_rules
+
+
+# 收银台会员精确查询缓存："card:卡号"/"phone:手机号" -> 会员信息（折扣按等级实时从规则缓存取）
+_member_cache = TTLCache(
+    maxsize=SYSTEM_CONFIG.get('member_cache_size', 2000),
+    ttl=SYSTEM_CONFIG.get('member_cache_ttl', 60)
+)
+
+
+def invalidate_member_cache(member_id=None):
+    """
+    使会员查询缓存失效（会员信息、积分、等级变动后调用）
+    :param member_id: 会员ID，为空时清空整个缓存
+    """
+    if member_id is None:
+        _member_cache.clear()
+    else:
+        _member_cache.pop_if(lambda key, member: member['member_id'] == member_id)
+
+
+def _escape_like(text):
+    """转义 LIKE 通配符"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
 
 
 class MemberManageLogic:
@@ -24,6 +50,34 @@ class MemberManageLogic:
         "disabled": "禁用",
     }
     
+    MEMBER_COLUMNS = """
+        member_id, card_no, name, phone, address, level_code,
+        total_consume, total_points, status, create_time
+    """
+    
+    def _format_member(self, member):
+        """补充列表显示字段"""
+        member['level_display'] = self.LEVEL_DISPLAY.get(member['level_code'], member['level_code'])
+        member['status_display'] = self.STATUS_DISPLAY.get(member['status'], member['status'])
+        member['total_consume_str'] = f"¥{member['total_consume']:.2f}"
+        if member.get('create_time'):
+            member['create_time_str'] = member['create_time'].strftime('%Y-%m-%d')
+        return member
+    
+    @staticmethod
+    def _keyword_condition(keyword):
+        """
+        会员关键词条件（均可走索引）：
+        纯数字按手机号尾号（phone_rev 前缀）或卡号数字前缀匹配，其他按卡号/姓名前缀匹配
+        :return: (sql片段, 参数列表)
+        """
+        keyword = keyword.strip()
+        if keyword.isdigit():
+            return (" AND (phone_rev LIKE %s OR card_no LIKE %s)",
+                    [_escape_like(keyword[::-1]) + '%', 'VIP' + _escape_like(keyword) + '%'])
+        prefix = _escape_like(keyword) + '%'
+        return " AND (card_no LIKE %s OR name LIKE %s)", [prefix, prefix]
+    
     def _generate_card_no(self):
         """生成会员卡号: VIP + 8位数字"""
         random_num = ''.join([str(random.randint(0, 9)) for _ in range(8)])
@@ -100,81 +154,156 @@ class MemberManageLogic:
                     level_code, status, member_id
                 ))
                 db.commit()
+                invalidate_member_cache(member_id)
                 return {"success": True, "data": None, "message": "会员信息修改成功"}
             except Exception as e:
                 db.rollback()
                 return {"success": False, "data": None, "message": f"修改失败: {str(e)}"}
 
     def query_member(self, keyword):
-        """按卡号/手机号查询会员"""
+        """按卡号/手机号尾号/姓名查询会员"""
         if not keyword:
             return {"success": False, "data": [], "message": "请输入查询关键字"}
         
         with DBConnection() as db:
             try:
-                sql = """
-                    SELECT member_id, card_no, name, phone, address, level_code, 
-                           total_consume, total_points, status, create_time
+                where, params = self._keyword_condition(keyword)
+                sql = f"""
+                    SELECT {self.MEMBER_COLUMNS}
                     FROM member
-                    WHERE card_no LIKE %s OR phone LIKE %s
-                    ORDER BY create_time DESC
+                    WHERE 1=1 {where}
+                    ORDER BY member_id DESC
                 """
-                like_keyword = f"%{keyword}%"
-                db.execute(sql, (like_keyword, like_keyword))
-                members = db.fetchall()
-                
-                for member in members:
-                    member['level_display'] = self.LEVEL_DISPLAY.get(member['level_code'], member['level_code'])
-                    member['status_display'] = self.STATUS_DISPLAY.get(member['status'], member['status'])
-                    member['total_consume_str'] = f"¥{member['total_consume']:.2f}"
+                db.execute(sql, params)
+                members = [self._format_member(member) for member in db.fetchall()]
                 
                 return {"success": True, "data": members, "message": f"查询到{len(members)}条记录"}
             except Exception as e:
                 return {"success": False, "data": [], "message": f"查询失败: {str(e)}"}
     
+    def _build_member_query(self, filters):
+        """构造会员列表查询条件"""
+        where, params = "", []
+        
+        if filters.get('level'):
+            level_code = self.LEVEL_MAP.get(filters['level'], filters['level'])
+            where += " AND level_code = %s"
+            params.append(level_code)
+        
+        if filters.get('status'):
+            status_code = 'active' if filters['status'] == '正常' else 'disabled'
+            where += " AND status = %s"
+            params.append(status_code)
+        
+        if filters.get('keyword'):
+            keyword_sql, keyword_params = self._keyword_condition(filters['keyword'])
+            where += keyword_sql
+            params.extend(keyword_params)
+        
+        return where, params
+    
     def get_member_list(self, filters=None):
         """获取会员列表"""
         filters = filters or {}
         
         with DBConnection() as db:
             try:
-                sql = """
-                    SELECT member_id, card_no, name, phone, address, level_code, 
-                           total_consume, total_points, status, create_time
-                    FROM member WHERE 1=1
+                where, params = self._build_member_query(filters)
+                sql = f"""
+                    SELECT {self.MEMBER_COLUMNS}
+                    FROM member WHERE 1=1 {where}
+                    ORDER BY member_id DESC
                 """
-                params = []
-                
-                if filters.get('level'):
-                    level_code = self.LEVEL_MAP.get(filters['level'], filters['level'])
-                    sql += " AND level_code = %s"
-                    params.append(level_code)
-                
-                if filters.get('status'):
-                    status_code = 'active' if filters['status'] == '正常' else 'disabled'
-                    sql += " AND status = %s"
-                    params.append(status_code)
-                
-                if filters.get('keyword'):
-                    sql += " AND (card_no LIKE %s OR name LIKE %s OR phone LIKE %s)"
-                    keyword = f"%{filters['keyword']}%"
-                    params.extend([keyword, keyword, keyword])
-                
-                sql += " ORDER BY create_time DESC"
                 db.execute(sql, params)
-                members = db.fetchall()
-                
-                for member in members:
-                    member['level_display'] = self.LEVEL_DISPLAY.get(member['level_code'], member['level_code'])
-                    member['status_display'] = self.STATUS_DISPLAY.get(member['status'], member['status'])
-                    member['total_consume_str'] = f"¥{member['total_consume']:.2f}"
-                    if member['create_time']:
-                        member['create_time_str'] = member['create_time'].strftime('%Y-%m-%d')
+                members = [self._format_member(member) for member in db.fetchall()]
                 
                 return {"success": True, "data": members, "message": "获取成功"}
             except Exception as e:
                 return {"success": False, "data": [], "message": f"查询失败: {str(e)}"}
     
+    def get_member_page(self, filters=None, after_id=None, limit=200):
+        """
+        按会员ID倒序分页获取会员列表（keyset分页，新注册的会员在前）
+        :param filters: 同 get_member_list
+        :param after_id: 上一页最后一条的会员ID，首页传None
+        :param limit: 每页条数
+        :return: {"success": bool, "data": {"rows", "next_after", "has_more"}, "message": str}
+        """
+        filters = filters or {}
+        
+        with DBConnection() as db:
+            try:
+                where, params = self._build_member_query(filters)
+                if after_id is not None:
+                    where += " AND member_id < %s"
+                    params.append(after_id)
+                sql = f"""
+                    SELECT {self.MEMBER_COLUMNS}
+                    FROM member WHERE 1=1 {where}
+                    ORDER BY member_id DESC
+                    LIMIT %s
+                """
+                db.execute(sql, params + [limit + 1])
+                rows = db.fetchall()
+                
+                has_more = len(rows) > limit
+                rows = [self._format_member(member) for member in rows[:limit]]
+                return {
+                    "success": True,
+                    "data": {
+                        "rows": rows,
+                        "next_after": rows[-1]['member_id'] if rows else after_id,
+                        "has_more": has_more
+                    },
+                    "message": "获取成功"
+                }
+            except Exception as e:
+                return {"success": False, "data": None, "message": f"查询失败: {str(e)}"}
+    
+    def lookup_member(self, keyword):
+        """
+        收银台按卡号或完整手机号精确查询会员（带等级折扣，结果缓存）
+        :return: {"success": bool, "data": dict, "message": str}
+        """
+        keyword = (keyword or "").strip()
+        if not keyword:
+            return {"success": False, "data": None, "message": "请输入卡号或手机号"}
+        
+        member = _member_cache.get(f"card:{keyword}") or _member_cache.get(f"phone:{keyword}")
+        if member is None:
+            with DBConnection() as db:
+                sql = """
+                    SELECT member_id, card_no, name, phone, level_code, status, total_points
+                    FROM member WHERE card_no = %s
+                    UNION ALL
+                    SELECT member_id, card_no, name, phone, level_code, status, total_points
+                    FROM member WHERE phone = %s
+                    LIMIT 1
+                """
+                db.execute(sql, (keyword, keyword))
+                member = db.fetchone()
+            if member is None:
+                return {"success": False, "data": None, "message": "会员不存在"}
+            _member_cache.set(f"card:{member['card_no']}", member)
+            if member['phone']:
+                _member_cache.set(f"phone:{member['phone']}", member)
+        
+        if member['status'] == 'disabled':
+            return {"success": False, "data": None, "message": "该会员已被禁用"}
+        
+        return {"success": True, "data": self._with_level_rule(member), "message": "查询成功"}
+    
+    def _with_level_rule(self, member):
+        """补充会员等级对应的折扣率/积分比例（取自等级规则缓存）"""
+        member = dict(member)
+        level_code = member['level_code']
+        rule = member_level_rules.get_rule(level_code) or {}
+        member['discount_rate'] = member_level_rules.resolve_discount(level_code)
+        member['points_rate'] = member_level_rules.resolve_points_rate(level_code)
+        member['level_display'] = self.LEVEL_DISPLAY.get(level_code, level_code)
+        member['level_name'] = rule.get('level_name', member['level_display'])
+        return member
+    
     def get_member_by_id(self, member_id):
         """根据ID获取会员"""
         with DBConnection() as db:
@@ -189,13 +318,7 @@ class MemberManageLogic:
     def get_member_by_card(self, card_no):
         """根据卡号获取会员（收银台调用）"""
         with DBConnection() as db:
-            sql = """
-                SELECT m.*, mlr.discount_rate, mlr.points_rate
-                FROM member m
-                JOIN member_level_rule mlr ON m.level_code = mlr.level_code
-                WHERE m.card_no = %s
-            """
-            db.execute(sql, (card_no,))
+            db.execute("SELECT * FROM member WHERE card_no = %s", (card_no,))
             member = db.fetchone()
             
             if not member:
@@ -204,5 +327,4 @@ class MemberManageLogic:
             if member['status'] == 'disabled':
                 return {"success": False, "data": None, "message": "该会员已被禁用"}
             
-            member['level_display'] = self.LEVEL_DISPLAY.get(member['level_code'], member['level_code'])
-            return {"success": True, "data": member, "message": "查询成功"}
+            return {"success": True, "data": self._with_level_rule(member), "message": "查询成功"}
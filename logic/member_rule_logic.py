@@ -4,6 +4,9 @@
 """
 
 from db.db_conn import DBConnection
+from logic.member_manage_logic import invalidate_member_cache
+from logic import member_level_rules
+from logic import member_level_engine
 
 
 class MemberRuleLogic:
@@ -37,25 +40,22 @@ class MemberRuleLogic:
         """获取会员折扣（收银调用）"""
         with DBConnection() as db:
             try:
-                sql = """
-                    SELECT m.level_code, mlr.discount_rate, mlr.points_rate, mlr.level_name
-                    FROM member m
-                    JOIN member_level_rule mlr ON m.level_code = mlr.level_code
-                    WHERE m.member_id = %s AND m.status = 'active'
-                """
+                sql = "SELECT level_code FROM member WHERE member_id = %s AND status = 'active'"
                 db.execute(sql, (member_id,))
                 result = db.fetchone()
                 
                 if not result:
                     return {"success": False, "data": None, "message": "会员不存在或已禁用"}
                 
+                level_code = result['level_code']
+                rule = member_level_rules.get_rule(level_code) or {}
                 return {
                     "success": True, 
                     "data": {
-                        "discount_rate": float(result['discount_rate']),
-                        "points_rate": result['points_rate'],
-                        "level_code": result['level_code'],
-                        "level_name": result['level_name']
+                        "discount_rate": member_level_rules.resolve_discount(level_code),
+                        "points_rate": member_level_rules.resolve_points_rate(level_code),
+                        "level_code": level_code,
+                        "level_name": rule.get('level_name', self.LEVEL_DISPLAY.get(level_code, level_code))
                     }, 
                     "message": "获取成功"
                 }
@@ -72,10 +72,9 @@ class MemberRuleLogic:
         with DBConnection() as db:
             try:
                 sql = """
-                    SELECT m.total_points, m.total_consume, m.level_code, mlr.points_rate
-                    FROM member m
-                    JOIN member_level_rule mlr ON m.level_code = mlr.level_code
-                    WHERE m.member_id = %s AND m.status = 'active'
+                    SELECT total_points, total_consume, level_code
+                    FROM member
+                    WHERE member_id = %s AND status = 'active'
                 """
                 db.execute(sql, (member_id,))
                 member = db.fetchone()
@@ -83,13 +82,15 @@ class MemberRuleLogic:
                 if not member:
                     return {"success": False, "data": None, "message": "会员不存在或已禁用"}
                 
-                points_earned = int(float(amount) * member['points_rate'])
+                points_earned = int(float(amount) * member_level_rules.resolve_points_rate(member['level_code']))
                 new_points = member['total_points'] + points_earned
                 new_consume = float(member['total_consume']) + float(amount)
                 
                 sql = "UPDATE member SET total_points = %s, total_consume = %s WHERE member_id = %s"
                 db.execute(sql, (new_points, new_consume, member_id))
+                member_level_engine.evaluate_member(db, member_id, "消费累计")
                 db.commit()
+                invalidate_member_cache(member_id)
                 
                 return {
                     "success": True, 
@@ -121,7 +122,9 @@ class MemberRuleLogic:
                         rule.get('points_rate', 1),
                         level_code
                     ))
+                member_level_rules.bump_version(db)
                 db.commit()
+                member_level_rules.invalidate()
                 return {"success": True, "data": None, "message": "所有规则保存成功"}
             except Exception as e:
                 db.rollback()
@@ -1,9 +1,132 @@
 # -*- coding: utf-8 -*-
 """
 系统通知逻辑 - 组员1负责
+通知的目标（角色/用户，空表示不限）归一为受众键 (audience_role, audience_user)，
+一个用户可见的通知只来自最多4个受众键，查询按受众键等值走索引；
+各受众键的未读数物化在 sys_notification_unread 中，与通知的新建/已读在同一事务中维护；
+已读且超过保留天数的通知定期移入归档表（同时按通知表校正未读数）：
+    python -m logic.notification_logic archive [保留天数]
 """
 
+import sys
 from db.db_conn import DBConnection
+from config import SYSTEM_CONFIG
+from utils.notify_bus import notification_bus, EVENT_CREATED, EVENT_READ, EVENT_REFRESH
+
+
+# 不限角色/不限用户的受众键取值（与 sys_notification 生成列一致）
+ANY_ROLE = '*'
+ANY_USER = 0
+
+
+def _audience(target_user_id, target_role):
+    """通知目标 -> 受众键 (audience_role, audience_user)"""
+    return target_role or ANY_ROLE, target_user_id or ANY_USER
+
+
+def _audiences_of(user_id, role):
+    """某用户可见的受众键（去重）"""
+    keys = []
+    for key in ((ANY_ROLE, ANY_USER), (role or ANY_ROLE, ANY_USER),
+                (ANY_ROLE, user_id or ANY_USER), (role or ANY_ROLE, user_id or ANY_USER)):
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def bump_unread(db, target_user_id, target_role, delta):
+    """调整某受众键的未读数（在新建/已读通知的事务中调用）"""
+    db.execute("""
+        INSERT INTO sys_notification_unread (audience_role, audience_user, unread_count)
+        VALUES (%s, %s, GREATEST(%s, 0))
+        ON DUPLICATE KEY UPDATE unread_count = GREATEST(unread_count + %s, 0)
+    """, _audience(target_user_id, target_role) + (delta, delta))
+
+
+def insert_notification(db, target_user_id, target_role, notification_type, title, content, related_id=None):
+    """
+    写入一条未读通知并累加未读数（在调用方事务中执行，提交后由调用方发布推送事件）
+    :return: notification_id
+    """
+    db.execute("""
+        INSERT INTO sys_notification
+        (target_user_id, target_role, notification_type, title, content, related_id, is_read, create_time)
+        VALUES (%s, %s, %s, %s, %s, %s, 0, NOW())
+    """, (target_user_id, target_role, notification_type, title, content, related_id))
+    notification_id = db.cursor.lastrowid
+    bump_unread(db, target_user_id, target_role, 1)
+    return notification_id
+
+
+def rebuild_unread_counters():
+    """按通知表重算全部未读数（归档任务中执行，校正异常中断等原因造成的偏差）"""
+    with DBConnection() as db:
+        try:
+            db.execute("UPDATE sys_notification_unread SET unread_count = 0")
+            db.execute("""
+                INSERT INTO sys_notification_unread (audience_role, audience_user, unread_count)
+                SELECT audience_role, audience_user, COUNT(*)
+                FROM sys_notification
+                WHERE is_read = 0
+                GROUP BY audience_role, audience_user
+                ON DUPLICATE KEY UPDATE unread_count = VALUES(unread_count)
+            """)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+def archive_notifications(keep_days=None, batch_size=1000):
+    """
+    把已读且阅读时间早于保留天数的通知移入 sys_notification_archive（分批提交，避免长时间锁表）
+    :param keep_days: 保留天数，默认取配置 notification_keep_days
+    :return: {"success": bool, "data": 归档条数, "message": str}
+    """
+    keep_days = keep_days if keep_days is not None else SYSTEM_CONFIG.get('notification_keep_days', 30)
+    archived = 0
+    try:
+        with DBConnection() as db:
+            while True:
+                try:
+                    db.execute("""
+                        SELECT notification_id FROM sys_notification
+                        WHERE is_read = 1 AND read_time < NOW() - INTERVAL %s DAY
+                        ORDER BY read_time
+                        LIMIT %s
+                        FOR UPDATE
+                    """, (keep_days, batch_size))
+                    ids = [row['notification_id'] for row in db.fetchall()]
+                    if not ids:
+                        db.commit()
+                        break
+                    placeholders = ", ".join(["%s"] * len(ids))
+                    db.execute(f"""
+                        INSERT INTO sys_notification_archive
+                        (notification_id, target_user_id, target_role, notification_type, title, content,
+                         related_id, is_read, create_time, read_time)
+                        SELECT notification_id, target_user_id, target_role, notification_type, title, content,
+                               related_id, is_read, create_time, read_time
+                        FROM sys_notification WHERE notification_id IN ({placeholders})
+                    """, ids)
+                    db.execute(f"DELETE FROM sys_notification WHERE notification_id IN ({placeholders})", ids)
+                    db.commit()
+                    archived += len(ids)
+                except Exception:
+                    db.rollback()
+                    raise
+        rebuild_unread_counters()
+        return {"success": True, "data": archived, "message": f"通知归档完成，共归档{archived}条"}
+    except Exception as e:
+        return {"success": False, "data": archived, "message": f"通知归档失败: {str(e)}"}
+
+
+def _join_names(names, limit=5):
+    """名称列表摘要：最多列出 limit 个"""
+    text = "、".join(names[:limit])
+    if len(names) > limit:
+        text += f" 等{len(names)}个"
+    return text
 
 
 class NotificationLogic:
@@ -29,14 +152,94 @@ class NotificationLogic:
         """
         try:
             with DBConnection() as db:
-                sql = """
-                    INSERT INTO sys_notification 
-                    (target_user_id, target_role, notification_type, title, content, related_id, is_read, create_time)
-                    VALUES (%s, %s, %s, %s, %s, %s, 0, NOW())
-                """
-                db.execute(sql, (target_user_id, target_role, notification_type, title, content, related_id))
-                db.commit()
-                return {"success": True, "data": None, "message": "通知创建成功"}
+                try:
+                    notification_id = insert_notification(db, target_user_id, target_role, notification_type,
+                                                          title, content, related_id)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+            notification_bus.publish(EVENT_CREATED, notification_id=notification_id,
+                                     target_user_id=target_user_id, target_role=target_role,
+                                     notification_type=notification_type, title=title)
+            return {"success": True, "data": notification_id, "message": "通知创建成功"}
+        except Exception as e:
+            return {"success": False, "data": None, "message": f"创建通知失败: {str(e)}"}
+    
+    def notify_set(self, digest_key, target_role, notification_type, title, items, window=None):
+        """
+        集合型通知（如库存预警）：按 digest_key 与上次检查时的集合比对，只在有新成员进入集合时通知
+        窗口期内上一条通知仍未读则原地更新该通知，否则新建；没有新成员时不通知
+        :param digest_key: 去重键（如 stock_warning:shortage）
+        :param target_role: 目标角色
+        :param notification_type: 通知类型
+        :param title: 通知标题
+        :param items: 当前集合，有序列表 [(related_id, 显示名称), ...]
+        :param window: 原地更新窗口（秒），默认取配置 notification_dedup_window
+        :return: {"success": bool, "data": {"action": created/updated/suppressed, "notification_id", "added"}, "message": str}
+        """
+        window = window if window is not None else SYSTEM_CONFIG.get('notification_dedup_window', 3600)
+        current_ids = [related_id for related_id, _ in items]
+        try:
+            with DBConnection() as db:
+                try:
+                    db.execute("""
+                        INSERT IGNORE INTO sys_notification_digest (digest_key, related_ids) VALUES (%s, '')
+                    """, (digest_key,))
+                    db.execute("""
+                        SELECT notification_id, related_ids,
+                               notify_time > NOW() - INTERVAL %s SECOND AS in_window
+                        FROM sys_notification_digest
+                        WHERE digest_key = %s
+                        FOR UPDATE
+                    """, (window, digest_key))
+                    digest = db.fetchone()
+                    previous = {int(x) for x in (digest['related_ids'] or "").split(",") if x}
+                    added = [(related_id, name) for related_id, name in items if related_id not in previous]
+                    notification_id = digest['notification_id']
+
+                    if not added:
+                        action = "suppressed"
+                    else:
+                        content = f"新增：{_join_names([name for _, name in added])}；" \
+                                  f"当前共{len(items)}个：{_join_names([name for _, name in items])}"
+                        unread = False
+                        if notification_id and digest['in_window']:
+                            db.execute("SELECT is_read FROM sys_notification WHERE notification_id = %s",
+                                       (notification_id,))
+                            row = db.fetchone()
+                            unread = bool(row) and not row['is_read']
+                        if unread:
+                            db.execute("""
+                                UPDATE sys_notification SET title = %s, content = %s, create_time = NOW()
+                                WHERE notification_id = %s
+                            """, (title, content, notification_id))
+                            action = "updated"
+                        else:
+                            notification_id = insert_notification(db, None, target_role, notification_type,
+                                                                  title, content)
+                            db.execute("UPDATE sys_notification_digest SET notify_time = NOW() WHERE digest_key = %s",
+                                       (digest_key,))
+                            action = "created"
+
+                    db.execute("""
+                        UPDATE sys_notification_digest SET notification_id = %s, related_ids = %s
+                        WHERE digest_key = %s
+                    """, (notification_id, ",".join(str(x) for x in sorted(current_ids)), digest_key))
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+            if action == "created":
+                notification_bus.publish(EVENT_CREATED, notification_id=notification_id,
+                                         target_user_id=None, target_role=target_role,
+                                         notification_type=notification_type, title=title)
+            return {
+                "success": True,
+                "data": {"action": action, "notification_id": notification_id,
+                         "added": [related_id for related_id, _ in added]},
+                "message": "通知已更新" if action != "suppressed" else "无新增，未通知"
+            }
         except Exception as e:
             return {"success": False, "data": None, "message": f"创建通知失败: {str(e)}"}
     
@@ -48,16 +251,14 @@ class NotificationLogic:
         """
         try:
             with DBConnection() as db:
-                # 简化查询：获取所有未读通知（target_role匹配或为空，target_user_id匹配或为空）
+                # 读取物化的未读数：该用户可见的受众键（主键等值查询）求和
                 sql = """
-                    SELECT COUNT(*) as count FROM sys_notification 
-                    WHERE is_read = 0 
-                    AND (target_role = %s OR target_role IS NULL OR target_role = '')
-                    AND (target_user_id = %s OR target_user_id IS NULL)
+                    SELECT COALESCE(SUM(unread_count), 0) as count FROM sys_notification_unread
+                    WHERE audience_role IN (%s, %s) AND audience_user IN (%s, %s)
                 """
-                db.execute(sql, (role, user_id))
+                db.execute(sql, (ANY_ROLE, role or ANY_ROLE, ANY_USER, user_id or ANY_USER))
                 result = db.fetchone()
-                return {"success": True, "data": result["count"] if result else 0, "message": "获取成功"}
+                return {"success": True, "data": int(result["count"]) if result else 0, "message": "获取成功"}
         except Exception as e:
             return {"success": False, "data": 0, "message": f"获取失败: {str(e)}"}
     
@@ -70,16 +271,21 @@ class NotificationLogic:
         """
         try:
             with DBConnection() as db:
-                sql = """
-                    SELECT notification_id, notification_type, title, content, 
-                           is_read, create_time, read_time
-                    FROM sys_notification 
-                    WHERE (target_role = %s OR target_role IS NULL OR target_role = '')
-                    AND (target_user_id = %s OR target_user_id IS NULL)
-                    ORDER BY create_time DESC
-                    LIMIT %s
+                # 每个受众键按 (audience_role, audience_user, create_time) 索引各取最新 limit 条，再合并排序
+                branch = """
+                    (SELECT notification_id, notification_type, title, content,
+                            is_read, create_time, read_time
+                     FROM sys_notification
+                     WHERE audience_role = %s AND audience_user = %s
+                     ORDER BY create_time DESC
+                     LIMIT %s)
                 """
-                db.execute(sql, (role, user_id, limit))
+                audiences = _audiences_of(user_id, role)
+                params = []
+                for audience_role, audience_user in audiences:
+                    params.extend([audience_role, audience_user, limit])
+                sql = " UNION ALL ".join([branch] * len(audiences)) + " ORDER BY create_time DESC LIMIT %s"
+                db.execute(sql, params + [limit])
                 notifications = db.fetchall()
                 
                 for n in notifications:
@@ -95,10 +301,23 @@ class NotificationLogic:
         """标记通知为已读"""
         try:
             with DBConnection() as db:
-                sql = "UPDATE sys_notification SET is_read = 1, read_time = NOW() WHERE notification_id = %s"
-                db.execute(sql, (notification_id,))
-                db.commit()
-                return {"success": True, "data": None, "message": "标记成功"}
+                db.execute("SELECT target_user_id, target_role FROM sys_notification WHERE notification_id = %s",
+                           (notification_id,))
+                target = db.fetchone()
+                try:
+                    sql = "UPDATE sys_notification SET is_read = 1, read_time = NOW() WHERE notification_id = %s AND is_read = 0"
+                    db.execute(sql, (notification_id,))
+                    changed = db.cursor.rowcount
+                    if changed and target:
+                        bump_unread(db, target['target_user_id'], target['target_role'], -1)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+            if changed and target:
+                notification_bus.publish(EVENT_READ, notification_id=notification_id,
+                                         target_user_id=target['target_user_id'], target_role=target['target_role'])
+            return {"success": True, "data": None, "message": "标记成功"}
         except Exception as e:
             return {"success": False, "data": None, "message": f"标记失败: {str(e)}"}
     
@@ -106,14 +325,32 @@ class NotificationLogic:
         """标记所有通知为已读"""
         try:
             with DBConnection() as db:
-                sql = """
-                    UPDATE sys_notification SET is_read = 1, read_time = NOW() 
-                    WHERE is_read = 0 
-                    AND (target_role = %s OR target_role IS NULL OR target_role = '')
-                    AND (target_user_id = %s OR target_user_id IS NULL)
-                """
-                db.execute(sql, (role, user_id))
-                db.commit()
-                return {"success": True, "data": None, "message": "全部标记成功"}
+                audience = (ANY_ROLE, role or ANY_ROLE, ANY_USER, user_id or ANY_USER)
+                try:
+                    sql = """
+                        UPDATE sys_notification SET is_read = 1, read_time = NOW() 
+                        WHERE is_read = 0 
+                        AND audience_role IN (%s, %s) AND audience_user IN (%s, %s)
+                    """
+                    db.execute(sql, audience)
+                    db.execute("""
+                        UPDATE sys_notification_unread SET unread_count = 0
+                        WHERE audience_role IN (%s, %s) AND audience_user IN (%s, %s)
+                    """, audience)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+            notification_bus.publish(EVENT_REFRESH, target_user_id=None, target_role=role)
+            return {"success": True, "data": None, "message": "全部标记成功"}
         except Exception as e:
             return {"success": False, "data": None, "message": f"标记失败: {str(e)}"}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "archive":
+        print("用法: python -m logic.notification_logic archive [保留天数]")
+        sys.exit(1)
+    result = archive_notifications(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    print(result['message'])
+    sys.exit(0 if result['success'] else 1)
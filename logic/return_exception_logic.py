@@ -5,7 +5,10 @@
 
 from datetime import datetime
 from db.db_conn import DBConnection
+from logic.member_manage_logic import invalidate_member_cache
+from logic.goods_category_logic import get_category_ids_by_names
 from config import SYSTEM_CONFIG
+from logic import member_level_rules, member_level_engine
 
 
 class ReturnExceptionLogic:
@@ -13,6 +16,10 @@ class ReturnExceptionLogic:
     
     NON_RETURNABLE_CATEGORIES = ['生鲜食品', '熟食', '冷冻食品']
     
+    def non_returnable_category_ids(self):
+        """不可退分类（含子分类）的ID集合，缓存随分类缓存失效"""
+        return get_category_ids_by_names(self.NON_RETURNABLE_CATEGORIES)
+    
     def validate_return(self, order_id, goods_list):
         """校验退货条件，返回校验结果"""
         if not order_id:
@@ -41,11 +48,13 @@ class ReturnExceptionLogic:
                     validation_result['warnings'].append(f"退货期限即将到期，剩余{remaining}天")
             
             if goods_list:
+                # 所有商品一次查询校验
+                goods_checks = self.check_goods_returnable_batch([item.get('goods_id') for item in goods_list])
                 for item in goods_list:
                     goods_id = item.get('goods_id')
                     quantity = item.get('quantity', 0)
                     
-                    goods_check = self.check_goods_returnable(goods_id)
+                    goods_check = goods_checks[goods_id]
                     
                     goods_validation = {
                         "goods_id": goods_id,
@@ -131,44 +140,71 @@ class ReturnExceptionLogic:
         :param goods_id: 商品ID
         :return: {"success": bool, "data": dict, "message": str}
         """
-        if not goods_id:
-            return {"success": False, "data": None, "message": "商品ID不能为空"}
+        return self.check_goods_returnable_batch([goods_id])[goods_id]
+    
+    def check_goods_returnable_batch(self, goods_ids):
+        """
+        批量检查商品是否可退：商品和分类一次查询，不可退分类ID集合读缓存；
+        同时按本分类及上两级分类的名称判断，闭包表为空或不全时不可退规则仍然生效
+        :param goods_ids: 商品ID列表
+        :return: dict goods_id -> {"success": bool, "data": dict, "message": str}
+        """
+        results = {}
+        ids = []
+        for goods_id in goods_ids:
+            if not goods_id:
+                results[goods_id] = {"success": False, "data": None, "message": "商品ID不能为空"}
+            elif goods_id not in ids:
+                ids.append(goods_id)
+        if not ids:
+            return results
         
         try:
+            restricted_ids = self.non_returnable_category_ids()
             with DBConnection() as db:
-                sql = """
+                sql = f"""
                     SELECT g.goods_id, g.goods_name, g.barcode, g.shelf_status,
-                           gc.category_name, gc.category_id
+                           gc.category_name, gc.category_id,
+                           p.category_name AS parent_name, gp.category_name AS grandparent_name
                     FROM goods g
                     JOIN goods_category gc ON g.category_id = gc.category_id
-                    WHERE g.goods_id = %s
+                    LEFT JOIN goods_category p ON gc.parent_id = p.category_id
+                    LEFT JOIN goods_category gp ON p.parent_id = gp.category_id
+                    WHERE g.goods_id IN ({', '.join(['%s'] * len(ids))})
                 """
-                db.execute(sql, (goods_id,))
-                goods = db.fetchone()
-                
-                if not goods:
-                    return {
-                        "success": True,
-                        "data": {"is_returnable": False, "reason": "not_found"},
-                        "message": "商品不存在"
-                    }
-                
-                category_name = goods['category_name']
-                if category_name in self.NON_RETURNABLE_CATEGORIES:
-                    return {
-                        "success": True,
-                        "data": {"is_returnable": False, "reason": "category_restricted", "category": category_name, "goods_name": goods['goods_name']},
-                        "message": f"商品 {goods['goods_name']} 属于 {category_name} 分类，不支持退货"
-                    }
-                
-                return {
+                db.execute(sql, ids)
+                goods_map = {row['goods_id']: row for row in db.fetchall()}
+        except Exception as e:
+            failure = {"success": False, "data": None, "message": f"检查失败: {str(e)}"}
+            results.update((goods_id, failure) for goods_id in ids)
+            return results
+        
+        for goods_id in ids:
+            goods = goods_map.get(goods_id)
+            if not goods:
+                results[goods_id] = {
+                    "success": True,
+                    "data": {"is_returnable": False, "reason": "not_found"},
+                    "message": "商品不存在"
+                }
+                continue
+            
+            category_name = goods['category_name']
+            lineage = (category_name, goods['parent_name'], goods['grandparent_name'])
+            if goods['category_id'] in restricted_ids or any(
+                    name in self.NON_RETURNABLE_CATEGORIES for name in lineage):
+                results[goods_id] = {
+                    "success": True,
+                    "data": {"is_returnable": False, "reason": "category_restricted", "category": category_name, "goods_name": goods['goods_name']},
+                    "message": f"商品 {goods['goods_name']} 属于 {category_name} 分类，不支持退货"
+                }
+            else:
+                results[goods_id] = {
                     "success": True,
                     "data": {"is_returnable": True, "goods_id": goods_id, "goods_name": goods['goods_name'], "category": category_name},
                     "message": "商品可退货"
                 }
-                
-        except Exception as e:
-            return {"success": False, "data": None, "message": f"检查失败: {str(e)}"}
+        return results
     
     def handle_points_downgrade(self, member_id):
         """
@@ -192,29 +228,14 @@ class ReturnExceptionLogic:
                     return {"success": False, "data": None, "message": "会员不存在"}
                 
                 current_level = member['level_code']
-                total_consume = float(member['total_consume'])
-                total_points = member['total_points']
-                
-                rule_sql = "SELECT level_code, level_name, min_consume, min_points FROM member_level_rule ORDER BY min_consume ASC"
-                db.execute(rule_sql)
-                rules = db.fetchall()
-                
-                target_level = 'normal'
-                target_level_name = '普通会员'
-                
-                for rule in rules:
-                    if total_consume >= float(rule['min_consume']) and total_points >= rule['min_points']:
-                        target_level = rule['level_code']
-                        target_level_name = rule['level_name']
-                
-                level_order = {'normal': 0, 'silver': 1, 'gold': 2}
-                current_order = level_order.get(current_level, 0)
-                target_order = level_order.get(target_level, 0)
+                change = member_level_engine.evaluate_member(db, member_id, "积分扣减", allow_upgrade=False)
                 
-                if target_order < current_order:
-                    db.execute("UPDATE member SET level_code = %s, update_time = NOW() WHERE member_id = %s", (target_level, member_id))
+                if change:
                     db.commit()
+                    invalidate_member_cache(member_id)
                     
+                    target_level = change['new_level']
+                    target_level_name = (member_level_rules.get_rule(target_level) or {}).get('level_name', target_level)
                     return {
                         "success": True,
                         "data": {"need_downgrade": True, "old_level": current_level, "new_level": target_level, "new_level_name": target_level_name},
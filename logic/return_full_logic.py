@@ -1,10 +1,20 @@
 # -*- coding: utf-8 -*-
 """
 整单退货逻辑 - 组员4负责
+整单退货在一个事务内完成：先锁定订单行（并发的整单/部分退货排队，防止重复退款），
+明细批量写入、订单明细/会员积分用集合语句更新，返回结果附带各阶段耗时
 """
 
+import time
 from datetime import datetime
+from decimal import Decimal
 from db.db_conn import DBConnection
+from logic.inventory_logic import InventoryLogic
+from logic.sequence_logic import generate_return_no
+from logic import stat_rollup_logic
+from logic import member_level_engine
+from logic.member_manage_logic import invalidate_member_cache
+from logic.return_query_logic import invalidate_return_order_cache
 from config import SYSTEM_CONFIG
 
 
@@ -13,34 +23,45 @@ class ReturnFullLogic:
     
     def process_full_return(self, order_id, reason, reason_detail, operator_id, quality_photo=None):
         """
-        处理整单退货
+        处理整单退货（已部分退货的订单退剩余商品，退款和扣减积分扣除已退部分）
         :param order_id: 原订单ID
         :param reason: 退货原因 (quality_issue/no_reason_7day/spec_mismatch/damaged/other)
         :param reason_detail: 原因详情/质量问题描述
         :param operator_id: 操作员ID
         :param quality_photo: 质量问题照片路径（可选）
-        :return: {"success": bool, "data": dict, "message": str}
+        :return: {"success": bool, "data": dict, "message": str}，data["timings"] 为各阶段耗时（毫秒）
         """
         if not order_id or not reason or not operator_id:
             return {"success": False, "data": None, "message": "缺少必要参数"}
         
+        timings = {}
+        phase_start = [time.perf_counter()]
+        
+        def mark(phase):
+            now = time.perf_counter()
+            timings[phase] = round((now - phase_start[0]) * 1000, 2)
+            phase_start[0] = now
+        
         db = DBConnection()
         try:
             db.connect()
             
-            # 1. 获取原订单信息
+            # 1. 锁定原订单（同一订单的其他退货在此等待，提交后再读到最新状态）
             order_sql = """
                 SELECT order_id, order_no, member_id, total_amount, discount_amount,
                        actual_amount, points_earned, order_status, complete_time
                 FROM order_info WHERE order_id = %s
+                FOR UPDATE
             """
             db.execute(order_sql, (order_id,))
             order = db.fetchone()
             
             if not order:
+                db.rollback()
                 return {"success": False, "data": None, "message": "订单不存在"}
             
             if order['order_status'] not in ('completed', 'part_returned'):
+                db.rollback()
                 return {"success": False, "data": None, "message": f"订单状态为 {order['order_status']}，不可退货"}
             
             # 2. 检查退货期限
@@ -48,28 +69,38 @@ class ReturnFullLogic:
             if order['complete_time']:
                 days_passed = (datetime.now() - order['complete_time']).days
                 if days_passed > return_limit_days:
+                    db.rollback()
                     return {"success": False, "data": None, "message": f"订单已超过{return_limit_days}天退货期限"}
+            mark("lock_order")
             
-            # 3. 获取订单明细
+            # 3. 获取待退明细和已退金额/积分
             detail_sql = """
-                SELECT detail_id, goods_id, goods_name, barcode, unit_price,
-                       quantity, discount, subtotal, is_returned, returned_quantity
-                FROM order_detail WHERE order_id = %s
+                SELECT detail_id, goods_id, unit_price, discount,
+                       quantity - returned_quantity AS returnable_qty
+                FROM order_detail
+                WHERE order_id = %s AND returned_quantity < quantity
             """
             db.execute(detail_sql, (order_id,))
             details = db.fetchall()
             
             if not details:
-                return {"success": False, "data": None, "message": "订单明细为空"}
-
-            # 4. 计算退款金额（全额退款）
-            refund_amount = order['actual_amount']
-            points_to_deduct = order['points_earned']
+                db.rollback()
+                return {"success": False, "data": None, "message": "订单商品已全部退货"}
+            
+            db.execute("""
+                SELECT COALESCE(SUM(refund_amount), 0) AS refunded, COALESCE(SUM(points_deducted), 0) AS deducted
+                FROM return_record
+                WHERE order_id = %s AND return_status = 'completed'
+            """, (order_id,))
+            returned = db.fetchone()
+            mark("load_details")
             
-            # 5. 生成退货单号
-            return_no = self._generate_return_no(db)
+            # 4. 计算退款金额（实付金额扣除已退部分）
+            refund_amount = max(Decimal(str(order['actual_amount'])) - Decimal(str(returned['refunded'])), Decimal('0'))
+            points_to_deduct = max((order['points_earned'] or 0) - int(returned['deducted']), 0)
             
-            # 6. 写入退货记录表
+            # 5. 生成退货单号并写入退货记录
+            return_no = generate_return_no(db)
             return_sql = """
                 INSERT INTO return_record 
                 (return_no, order_id, return_type, refund_amount, points_deducted,
@@ -80,38 +111,51 @@ class ReturnFullLogic:
                                     reason, reason_detail, quality_photo, operator_id))
             return_id = db.cursor.lastrowid
             
-            # 7. 写入退货明细表 & 恢复库存
-            for detail in details:
-                returnable_qty = float(detail['quantity']) - float(detail['returned_quantity'])
-                if returnable_qty <= 0:
-                    continue
-                
-                item_refund = float(detail['unit_price']) * returnable_qty * float(detail['discount'])
-                goods_status = 'pending_inspect' if reason == 'quality_issue' else 'to_stock'
-                
-                return_detail_sql = """
-                    INSERT INTO return_detail
-                    (return_id, order_detail_id, goods_id, return_quantity, refund_amount, return_reason, goods_status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """
-                db.execute(return_detail_sql, (return_id, detail['detail_id'], detail['goods_id'],
-                                               returnable_qty, item_refund, reason, goods_status))
-                
-                update_detail_sql = """
-                    UPDATE order_detail SET is_returned = 1, returned_quantity = quantity WHERE detail_id = %s
-                """
-                db.execute(update_detail_sql, (detail['detail_id'],))
-                
-                self._restore_stock(db, detail['goods_id'], int(returnable_qty))
-            
-            # 8. 更新订单状态为整单退货
+            # 6. 批量写入退货明细，一条语句把订单明细全部标记为已退
+            goods_status = 'pending_inspect' if reason == 'quality_issue' else 'to_stock'
+            db.executemany("""
+                INSERT INTO return_detail
+                (return_id, order_detail_id, goods_id, return_quantity, refund_amount, return_reason, goods_status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, [
+                (return_id, detail['detail_id'], detail['goods_id'], detail['returnable_qty'],
+                 Decimal(str(detail['unit_price'])) * Decimal(str(detail['returnable_qty'])) * Decimal(str(detail['discount'])),
+                 reason, goods_status)
+                for detail in details
+            ])
+            db.execute("""
+                UPDATE order_detail SET is_returned = 1, returned_quantity = quantity
+                WHERE order_id = %s AND returned_quantity < quantity
+            """, (order_id,))
             db.execute("UPDATE order_info SET order_status = 'full_returned' WHERE order_id = %s", (order_id,))
+            mark("write_return")
             
-            # 9. 扣减会员积分
+            # 7. 批量恢复库存并写库存流水（语句数固定）
+            restore_items = [(detail['goods_id'], int(detail['returnable_qty']))
+                             for detail in details if int(detail['returnable_qty']) > 0]
+            if restore_items:
+                restore_result = InventoryLogic().restore_stock_batch(restore_items, db=db, allow_missing=True,
+                                                                      ref_no=return_no)
+                if not restore_result['success']:
+                    raise Exception(restore_result['message'])
+            mark("restore_stock")
+            
+            # 8. 扣减会员积分（单条UPDATE，不先读后写）并重算等级
             if order['member_id'] and points_to_deduct > 0:
                 self._reduce_member_points(db, order['member_id'], points_to_deduct)
+                member_level_engine.evaluate_member(db, order['member_id'], "退货扣减积分",
+                                                    operator_id=operator_id)
+            mark("member")
+            
+            # 9. 累加退货汇总表
+            stat_rollup_logic.apply_return(db, return_id)
+            mark("rollup")
             
             db.commit()
+            mark("commit")
+            if order['member_id']:
+                invalidate_member_cache(order['member_id'])
+                invalidate_return_order_cache(order['member_id'])
             
             return {
                 "success": True,
@@ -120,7 +164,8 @@ class ReturnFullLogic:
                     "return_no": return_no,
                     "refund_amount": float(refund_amount),
                     "points_deducted": points_to_deduct,
-                    "return_type": "full"
+                    "return_type": "full",
+                    "timings": timings
                 },
                 "message": "整单退货成功"
             }
@@ -131,45 +176,9 @@ class ReturnFullLogic:
         finally:
             db.close()
 
-    def _generate_return_no(self, db):
-        """生成退货单号"""
-        today = datetime.now().strftime('%Y%m%d')
-        prefix = f"RT{today}"
-        
-        sql = "SELECT return_no FROM return_record WHERE return_no LIKE %s ORDER BY return_no DESC LIMIT 1"
-        db.execute(sql, (f"{prefix}%",))
-        result = db.fetchone()
-        
-        if result:
-            last_no = int(result['return_no'][-4:])
-            new_no = f"{prefix}{last_no + 1:04d}"
-        else:
-            new_no = f"{prefix}0001"
-        
-        return new_no
-    
-    def _restore_stock(self, db, goods_id, num):
-        """恢复库存"""
-        sql = """
-            UPDATE inventory 
-            SET stock_num = stock_num + %s,
-                stock_status = CASE WHEN stock_num + %s >= stock_warning THEN 'sufficient' ELSE stock_status END,
-                update_time = NOW()
-            WHERE goods_id = %s
-        """
-        db.execute(sql, (num, num, goods_id))
-    
     def _reduce_member_points(self, db, member_id, points):
-        """扣减会员积分"""
-        sql = "SELECT total_points FROM member WHERE member_id = %s"
-        db.execute(sql, (member_id,))
-        member = db.fetchone()
-        
-        if not member:
-            return
-        
-        old_points = member['total_points']
-        new_points = max(0, old_points - points)
-        
-        db.execute("UPDATE member SET total_points = %s, update_time = NOW() WHERE member_id = %s", 
-                  (new_points, member_id))
+        """扣减会员积分（不低于0）"""
+        db.execute("""
+            UPDATE member SET total_points = GREATEST(total_points - %s, 0), update_time = NOW()
+            WHERE member_id = %s
+        """, (points, member_id))
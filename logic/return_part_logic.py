@@ -6,6 +6,12 @@
 from datetime import datetime
 from decimal import Decimal
 from db.db_conn import DBConnection
+from logic.inventory_logic import InventoryLogic
+from logic.sequence_logic import generate_return_no
+from logic import stat_rollup_logic
+from logic import member_level_engine
+from logic.member_manage_logic import invalidate_member_cache
+from logic.return_query_logic import invalidate_return_order_cache
 from config import SYSTEM_CONFIG
 
 
@@ -32,11 +38,12 @@ class ReturnPartLogic:
         try:
             db.connect()
             
-            # 1. 获取原订单信息
+            # 1. 获取并锁定原订单（与整单退货互斥，防止重复退款）
             order_sql = """
                 SELECT order_id, order_no, member_id, total_amount, discount_amount,
                        actual_amount, points_earned, order_status, complete_time
                 FROM order_info WHERE order_id = %s
+                FOR UPDATE
             """
             db.execute(order_sql, (order_id,))
             order = db.fetchone()
@@ -54,10 +61,27 @@ class ReturnPartLogic:
                 if days_passed > return_limit_days:
                     return {"success": False, "data": None, "message": f"订单已超过{return_limit_days}天退货期限"}
 
-            # 3. 校验退货商品并计算退款金额
+            # 3. 校验退货商品并计算退款金额（所有明细一次查询并加锁，防止同一明细被并发重复退货）
             total_refund = Decimal('0')
             validated_items = []
             
+            detail_ids = list({item.get('detail_id') for item in return_items if item.get('detail_id')})
+            details = {}
+            if detail_ids:
+                detail_sql = f"""
+                    SELECT detail_id, goods_id, goods_name, barcode, unit_price,
+                           quantity, discount, subtotal, is_returned, returned_quantity
+                    FROM order_detail
+                    WHERE order_id = %s AND detail_id IN ({', '.join(['%s'] * len(detail_ids))})
+                    FOR UPDATE
+                """
+                db.execute(detail_sql, [order_id] + detail_ids)
+                details = {row['detail_id']: row for row in db.fetchall()}
+            
+            # 同一明细出现多次时按剩余可退数量依次扣减
+            remaining = {detail_id: Decimal(str(row['quantity'])) - Decimal(str(row['returned_quantity']))
+                         for detail_id, row in details.items()}
+            
             for item in return_items:
                 detail_id = item.get('detail_id')
                 return_qty = Decimal(str(item.get('quantity', 0)))
@@ -65,23 +89,17 @@ class ReturnPartLogic:
                 if not detail_id or return_qty <= 0:
                     continue
                 
-                detail_sql = """
-                    SELECT detail_id, goods_id, goods_name, barcode, unit_price,
-                           quantity, discount, subtotal, is_returned, returned_quantity
-                    FROM order_detail WHERE detail_id = %s AND order_id = %s
-                """
-                db.execute(detail_sql, (detail_id, order_id))
-                detail = db.fetchone()
-                
+                detail = details.get(detail_id)
                 if not detail:
                     continue
                 
-                returnable_qty = Decimal(str(detail['quantity'])) - Decimal(str(detail['returned_quantity']))
+                returnable_qty = remaining[detail_id]
                 if return_qty > returnable_qty:
                     return_qty = returnable_qty
                 
                 if return_qty <= 0:
                     continue
+                remaining[detail_id] -= return_qty
                 
                 unit_price = Decimal(str(detail['unit_price']))
                 discount = Decimal(str(detail['discount']))
@@ -113,7 +131,7 @@ class ReturnPartLogic:
                 points_to_deduct = 0
             
             # 5. 生成退货单号
-            return_no = self._generate_return_no(db)
+            return_no = generate_return_no(db)
             
             # 6. 写入退货记录表
             return_sql = """
@@ -127,28 +145,35 @@ class ReturnPartLogic:
             return_id = db.cursor.lastrowid
             
             # 7. 写入退货明细表 & 更新订单明细 & 恢复库存
-            for item in validated_items:
-                goods_status = 'pending_inspect' if reason == 'quality_issue' else 'to_stock'
-                
-                return_detail_sql = """
-                    INSERT INTO return_detail
-                    (return_id, order_detail_id, goods_id, return_quantity, refund_amount, return_reason, goods_status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """
-                db.execute(return_detail_sql, (return_id, item['detail_id'], item['goods_id'],
-                                               item['return_quantity'], item['refund_amount'], 
-                                               reason, goods_status))
-                
-                new_returned_qty = item['return_quantity']
-                update_detail_sql = """
-                    UPDATE order_detail
-                    SET returned_quantity = returned_quantity + %s,
-                        is_returned = CASE WHEN returned_quantity + %s >= quantity THEN 1 ELSE is_returned END
-                    WHERE detail_id = %s
-                """
-                db.execute(update_detail_sql, (new_returned_qty, new_returned_qty, item['detail_id']))
-                
-                self._restore_stock(db, item['goods_id'], int(item['return_quantity']))
+            goods_status = 'pending_inspect' if reason == 'quality_issue' else 'to_stock'
+            return_detail_sql = """
+                INSERT INTO return_detail
+                (return_id, order_detail_id, goods_id, return_quantity, refund_amount, return_reason, goods_status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """
+            db.executemany(return_detail_sql, [
+                (return_id, item['detail_id'], item['goods_id'], item['return_quantity'],
+                 item['refund_amount'], reason, goods_status)
+                for item in validated_items
+            ])
+            
+            update_detail_sql = """
+                UPDATE order_detail
+                SET returned_quantity = returned_quantity + %s,
+                    is_returned = CASE WHEN returned_quantity >= quantity THEN 1 ELSE is_returned END
+                WHERE detail_id = %s
+            """
+            db.executemany(update_detail_sql, [(item['return_quantity'], item['detail_id'])
+                                               for item in validated_items])
+            
+            # 批量恢复库存并写库存流水（语句数固定）
+            restore_items = [(item['goods_id'], int(item['return_quantity']))
+                             for item in validated_items if int(item['return_quantity']) > 0]
+            if restore_items:
+                restore_result = InventoryLogic().restore_stock_batch(restore_items, db=db, allow_missing=True,
+                                                                      ref_no=return_no)
+                if not restore_result['success']:
+                    raise Exception(restore_result['message'])
             
             # 8. 更新订单状态为部分退货
             db.execute("UPDATE order_info SET order_status = 'part_returned' WHERE order_id = %s", (order_id,))
@@ -156,8 +181,16 @@ class ReturnPartLogic:
             # 9. 扣减会员积分
             if order['member_id'] and points_to_deduct > 0:
                 self._reduce_member_points(db, order['member_id'], points_to_deduct)
+                member_level_engine.evaluate_member(db, order['member_id'], "退货扣减积分",
+                                                    operator_id=operator_id)
+            
+            # 10. 累加退货汇总表
+            stat_rollup_logic.apply_return(db, return_id)
             
             db.commit()
+            if order['member_id']:
+                invalidate_member_cache(order['member_id'])
+                invalidate_return_order_cache(order['member_id'])
             
             return {
                 "success": True,
@@ -178,34 +211,6 @@ class ReturnPartLogic:
         finally:
             db.close()
 
-    def _generate_return_no(self, db):
-        """生成退货单号"""
-        today = datetime.now().strftime('%Y%m%d')
-        prefix = f"RT{today}"
-        
-        sql = "SELECT return_no FROM return_record WHERE return_no LIKE %s ORDER BY return_no DESC LIMIT 1"
-        db.execute(sql, (f"{prefix}%",))
-        result = db.fetchone()
-        
-        if result:
-            last_no = int(result['return_no'][-4:])
-            new_no = f"{prefix}{last_no + 1:04d}"
-        else:
-            new_no = f"{prefix}0001"
-        
-        return new_no
-    
-    def _restore_stock(self, db, goods_id, num):
-        """恢复库存"""
-        sql = """
-            UPDATE inventory 
-            SET stock_num = stock_num + %s,
-                stock_status = CASE WHEN stock_num + %s >= stock_warning THEN 'sufficient' ELSE stock_status END,
-                update_time = NOW()
-            WHERE goods_id = %s
-        """
-        db.execute(sql, (num, num, goods_id))
-    
     def _reduce_member_points(self, db, member_id, points):
         """扣减会员积分"""
         sql = "SELECT total_points FROM member WHERE member_id = %s"
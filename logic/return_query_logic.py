@@ -6,44 +6,123 @@
 from datetime import datetime, timedelta
 from db.db_conn import DBConnection
 from config import SYSTEM_CONFIG
+from utils.cache_utils import TTLCache
+
+# 可退货订单状态
+RETURNABLE_STATUSES = ('completed', 'part_returned')
+
+_ORDER_COLUMNS = """
+    o.order_id, o.order_no, o.member_id, o.total_amount,
+    o.discount_amount, o.actual_amount, o.points_earned,
+    o.order_status, o.create_time, o.complete_time
+"""
+
+# 会员在退货期内的可退货订单缓存（member_id -> 订单列表），ttl 为0时不缓存
+_member_orders_ttl = SYSTEM_CONFIG.get('return_order_cache_ttl', 60)
+_member_orders_cache = TTLCache(
+    maxsize=SYSTEM_CONFIG.get('return_order_cache_size', 500),
+    ttl=_member_orders_ttl
+)
+
+
+def invalidate_return_order_cache(member_id=None):
+    """
+    使会员可退货订单缓存失效（退货完成后调用）
+    :param member_id: 会员ID，为空时清空整个缓存
+    """
+    if member_id is None:
+        _member_orders_cache.clear()
+    else:
+        _member_orders_cache.pop(member_id)
+
+
+def classify_return_keyword(keyword):
+    """
+    判断退货台输入的类型
+    :return: 'order_no'（ORD开头）/ 'card_no'（VIP开头）/ 'phone'（纯数字）/ 'unknown'
+    """
+    upper = keyword.upper()
+    if upper.startswith('ORD'):
+        return 'order_no'
+    if upper.startswith('VIP'):
+        return 'card_no'
+    if keyword.isdigit():
+        return 'phone'
+    return 'unknown'
 
 
 class ReturnQueryLogic:
     """退货查询业务逻辑"""
     
     def query_order_for_return(self, keyword):
-        """按小票号/卡号/手机号查询可退货订单"""
+        """
+        按小票号/卡号/手机号查询可退货订单
+        先按输入格式判断类型，只走对应的唯一索引；会员订单按 (member_id, order_status, complete_time) 索引取退货期内的订单，
+        查询量与历史订单总数无关
+        """
         if not keyword or not keyword.strip():
             return {"success": False, "data": [], "message": "请输入查询条件"}
         
         keyword = keyword.strip()
+        kind = classify_return_keyword(keyword)
         return_limit_days = SYSTEM_CONFIG.get('return_limit_days', 7)
         limit_date = datetime.now() - timedelta(days=return_limit_days)
         
         try:
             with DBConnection() as db:
-                sql = """
-                    SELECT o.order_id, o.order_no, o.member_id, o.total_amount,
-                           o.discount_amount, o.actual_amount, o.points_earned,
-                           o.order_status, o.create_time, o.complete_time,
-                           m.card_no, m.name AS member_name, m.phone
-                    FROM order_info o
-                    LEFT JOIN member m ON o.member_id = m.member_id
-                    WHERE o.order_status = 'completed'
-                      AND o.complete_time >= %s
-                      AND (o.order_no = %s OR m.card_no = %s OR m.phone = %s)
-                    ORDER BY o.complete_time DESC
-                """
-                db.execute(sql, (limit_date, keyword, keyword, keyword))
-                orders = db.fetchall()
-                
-                if not orders:
-                    return {"success": True, "data": [], "message": "未找到符合条件的可退货订单"}
-                
-                return {"success": True, "data": orders, "message": f"找到 {len(orders)} 条可退货订单"}
+                orders = []
+                if kind in ('order_no', 'unknown'):
+                    orders = self._order_by_no(db, keyword.upper() if kind == 'order_no' else keyword, limit_date)
+                if not orders and kind != 'order_no':
+                    field = 'phone' if kind == 'phone' else 'card_no'
+                    db.execute(f"SELECT member_id, card_no, name, phone FROM member WHERE {field} = %s",
+                               (keyword.upper() if kind == 'card_no' else keyword,))
+                    for member in db.fetchall():
+                        orders.extend(self._member_orders(db, member, limit_date))
+                    orders.sort(key=lambda o: o['complete_time'], reverse=True)
+            
+            if not orders:
+                return {"success": True, "data": [], "message": "未找到符合条件的可退货订单"}
+            
+            return {"success": True, "data": orders, "message": f"找到 {len(orders)} 条可退货订单"}
         except Exception as e:
             return {"success": False, "data": [], "message": f"查询失败: {str(e)}"}
     
+    @staticmethod
+    def _order_by_no(db, order_no, limit_date):
+        """按订单号（唯一索引）查询可退货订单"""
+        db.execute(f"""
+            SELECT {_ORDER_COLUMNS},
+                   m.card_no, m.name AS member_name, m.phone
+            FROM order_info o
+            LEFT JOIN member m ON o.member_id = m.member_id
+            WHERE o.order_no = %s
+              AND o.order_status IN (%s, %s)
+              AND o.complete_time >= %s
+        """, (order_no,) + RETURNABLE_STATUSES + (limit_date,))
+        return db.fetchall()
+    
+    @staticmethod
+    def _member_orders(db, member, limit_date):
+        """某会员在退货期内的可退货订单（读缓存，缓存内容按当前退货期再过滤一次）"""
+        member_id = member['member_id']
+        orders = _member_orders_cache.get(member_id) if _member_orders_ttl else None
+        if orders is None:
+            db.execute(f"""
+                SELECT {_ORDER_COLUMNS}
+                FROM order_info o
+                WHERE o.member_id = %s
+                  AND o.order_status IN (%s, %s)
+                  AND o.complete_time >= %s
+                ORDER BY o.complete_time DESC
+            """, (member_id,) + RETURNABLE_STATUSES + (limit_date,))
+            orders = db.fetchall()
+            for order in orders:
+                order.update(card_no=member['card_no'], member_name=member['name'], phone=member['phone'])
+            if _member_orders_ttl:
+                _member_orders_cache.set(member_id, orders)
+        return [dict(order) for order in orders if order['complete_time'] >= limit_date]
+    
     def get_order_detail(self, order_id):
         """获取订单明细"""
         if not order_id:
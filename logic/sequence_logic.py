@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+单号序列分配逻辑（订单号、退货单号共用）
+"""
+
+import threading
+from datetime import datetime
+from db.db_conn import DBConnection
+
+
+class SequenceAllocator:
+    """
+    基于 sys_sequence 计数行的序列分配器
+    每个 seq_name 对应一行计数，通过一条 upsert 原子地预留一段号码：
+    block_size > 1 时号段缓存在进程内，用完再向数据库申请，多进程之间号段互不重叠；
+    block_size = 1 时每次直接占用一个号码，可在调用方事务中分配（回滚时号码一并回滚，不留空号）；
+    seed(db, seq_name) 返回该序列在业务表中已用到的最大值，计数行不存在时以此为起点
+    （兼容启用计数行之前按旧方式生成的单号），每个进程对每个序列只校准一次
+    """
+
+    def __init__(self, block_size=1, seed=None):
+        if block_size < 1:
+            raise ValueError("block_size 必须大于0")
+        self.block_size = block_size
+        self.seed = seed
+        self._seeded = set()
+        self._lock = threading.Lock()
+        self._key = None
+        self._next = 0
+        self._end = -1
+
+    @staticmethod
+    def _reserve(db, seq_name, count):
+        """
+        预留一段号码
+        :return: (start, end) 闭区间
+        """
+        sql = """
+            INSERT INTO sys_sequence (seq_name, current_value)
+            VALUES (%s, LAST_INSERT_ID(%s))
+            ON DUPLICATE KEY UPDATE current_value = LAST_INSERT_ID(current_value + %s)
+        """
+        db.execute(sql, (seq_name, count, count))
+        db.execute("SELECT LAST_INSERT_ID() AS end_value")
+        end = int(db.fetchone()['end_value'])
+        return end - count + 1, end
+
+    def _ensure_seeded(self, seq_name):
+        """
+        计数行不存在时按业务表中已有的最大值创建（已存在则不变）
+        在独立事务中提交，调用方事务回滚不会撤销校准
+        """
+        if self.seed is None or seq_name in self._seeded:
+            return
+        with DBConnection() as own_db:
+            own_db.execute(
+                "INSERT IGNORE INTO sys_sequence (seq_name, current_value) VALUES (%s, %s)",
+                (seq_name, int(self.seed(own_db, seq_name) or 0))
+            )
+            own_db.commit()
+        self._seeded.add(seq_name)
+
+    def next_value(self, seq_name, db=None):
+        """
+        获取序列的下一个值（从1开始）
+        :param seq_name: 序列名（如 order_no:20260118）
+        :param db: 调用方事务所在的连接，仅 block_size = 1 时使用
+        :return: int
+        """
+        if self.block_size == 1:
+            self._ensure_seeded(seq_name)
+            if db is not None:
+                return self._reserve(db, seq_name, 1)[0]
+            with DBConnection() as own_db:
+                value = self._reserve(own_db, seq_name, 1)[0]
+                own_db.commit()
+                return value
+
+        # 号段模式必须在独立事务中申请，否则调用方回滚后进程内号段会与他人重复
+        with self._lock:
+            if self._key != seq_name or self._next > self._end:
+                self._ensure_seeded(seq_name)
+                with DBConnection() as own_db:
+                    start, end = self._reserve(own_db, seq_name, self.block_size)
+                    own_db.commit()
+                self._key, self._next, self._end = seq_name, start, end
+            value = self._next
+            self._next += 1
+            return value
+
+
+def _max_return_seq(db, seq_name):
+    """当天 return_record 中已用到的最大退货序号（RT + 年月日 之后的部分）"""
+    day = seq_name.split(":", 1)[1]
+    db.execute(
+        """
+        SELECT MAX(CAST(SUBSTRING(return_no, 11) AS UNSIGNED)) AS max_seq
+        FROM return_record WHERE return_no LIKE %s
+        """,
+        (f"RT{day}%",)
+    )
+    row = db.fetchone()
+    return row['max_seq'] if row else 0
+
+
+# 退货单号序列：逐个占号，在退货事务中分配，事务回滚时号码随之回滚；
+# 首次使用时从当天已有的退货单号续号
+_return_seq = SequenceAllocator(block_size=1, seed=_max_return_seq)
+
+
+def generate_return_no(db=None):
+    """
+    生成退货单号: RT + 年月日 + 当日序号(至少4位)
+    :param db: 退货事务所在的连接；计数行锁持有到该事务提交，并发退货不会取到相同序号
+    """
+    today = datetime.now().strftime('%Y%m%d')
+    seq = _return_seq.next_value(f"return_no:{today}", db=db)
+    return f"RT{today}{seq:04d}"
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+销售统计汇总表维护逻辑
+结账、退货在各自事务提交前调用 apply_order / apply_return 增量累加，
+成本按订单明细上结账时写入的成本价计算（升级前没有该值的明细按商品当前成本价）；
+汇总表缺失或需要校正时用 rebuild 按日期范围从明细重算：
+    python -m logic.stat_rollup_logic [开始日期 结束日期]
+"""
+
+import sys
+from datetime import date, timedelta
+from db.db_conn import DBConnection
+
+# 计入销售的订单状态（退货后订单仍计入原销售日，退货单独统计）
+SOLD_STATUSES = ('completed', 'part_returned', 'full_returned')
+
+ROLLUP_TABLES = ('stat_sales_hourly', 'stat_goods_daily', 'stat_member_daily', 'stat_return_daily')
+
+_SALES_HOURLY_SQL = """
+    INSERT INTO stat_sales_hourly
+    (stat_date, stat_hour, order_count, sales_amount, member_order_count, member_sales, cost_amount)
+    SELECT DATE(o.create_time), HOUR(o.create_time), COUNT(*), SUM(o.actual_amount),
+           SUM(o.member_id IS NOT NULL),
+           SUM(CASE WHEN o.member_id IS NOT NULL THEN o.actual_amount ELSE 0 END),
+           SUM(COALESCE((
+               SELECT SUM(d.quantity * COALESCE(d.cost_price, g.cost_price))
+               FROM order_detail d JOIN goods g ON d.goods_id = g.goods_id
+               WHERE d.order_id = o.order_id
+           ), 0))
+    FROM order_info o
+    WHERE {where}
+    GROUP BY DATE(o.create_time), HOUR(o.create_time)
+    ON DUPLICATE KEY UPDATE
+        order_count = stat_sales_hourly.order_count + VALUES(order_count),
+        sales_amount = stat_sales_hourly.sales_amount + VALUES(sales_amount),
+        member_order_count = stat_sales_hourly.member_order_count + VALUES(member_order_count),
+        member_sales = stat_sales_hourly.member_sales + VALUES(member_sales),
+        cost_amount = stat_sales_hourly.cost_amount + VALUES(cost_amount)
+"""
+
+_GOODS_SALE_SQL = """
+    INSERT INTO stat_goods_daily (stat_date, goods_id, sale_qty, sale_amount, cost_amount)
+    SELECT DATE(o.create_time), d.goods_id, SUM(d.quantity), SUM(d.subtotal),
+           SUM(d.quantity * COALESCE(d.cost_price, g.cost_price))
+    FROM order_info o
+    JOIN order_detail d ON d.order_id = o.order_id
+    JOIN goods g ON d.goods_id = g.goods_id
+    WHERE {where}
+    GROUP BY DATE(o.create_time), d.goods_id
+    ON DUPLICATE KEY UPDATE
+        sale_qty = stat_goods_daily.sale_qty + VALUES(sale_qty),
+        sale_amount = stat_goods_daily.sale_amount + VALUES(sale_amount),
+        cost_amount = stat_goods_daily.cost_amount + VALUES(cost_amount)
+"""
+
+_MEMBER_SQL = """
+    INSERT INTO stat_member_daily (stat_date, member_id, order_count, sales_amount)
+    SELECT DATE(o.create_time), o.member_id, COUNT(*), SUM(o.actual_amount)
+    FROM order_info o
+    WHERE o.member_id IS NOT NULL AND {where}
+    GROUP BY DATE(o.create_time), o.member_id
+    ON DUPLICATE KEY UPDATE
+        order_count = stat_member_daily.order_count + VALUES(order_count),
+        sales_amount = stat_member_daily.sales_amount + VALUES(sales_amount)
+"""
+
+# 退货数量记入原订单日期，使商品排行的净销量与订单日期范围一致
+_GOODS_RETURN_SQL = """
+    INSERT INTO stat_goods_daily (stat_date, goods_id, return_qty, return_amount)
+    SELECT DATE(o.create_time), rd.goods_id, SUM(rd.return_quantity), SUM(rd.refund_amount)
+    FROM return_record r
+    JOIN return_detail rd ON rd.return_id = r.return_id
+    JOIN order_info o ON r.order_id = o.order_id
+    WHERE {where}
+    GROUP BY DATE(o.create_time), rd.goods_id
+    ON DUPLICATE KEY UPDATE
+        return_qty = stat_goods_daily.return_qty + VALUES(return_qty),
+        return_amount = stat_goods_daily.return_amount + VALUES(return_amount)
+"""
+
+_RETURN_DAILY_SQL = """
+    INSERT INTO stat_return_daily (stat_date, return_count, refund_amount)
+    SELECT DATE(r.create_time), COUNT(*), SUM(r.refund_amount)
+    FROM return_record r
+    WHERE {where}
+    GROUP BY DATE(r.create_time)
+    ON DUPLICATE KEY UPDATE
+        return_count = stat_return_daily.return_count + VALUES(return_count),
+        refund_amount = stat_return_daily.refund_amount + VALUES(refund_amount)
+"""
+
+
+def apply_order(db, order_id):
+    """
+    将一笔已结账订单累加到汇总表（在结账事务中调用）；
+    先把商品当前成本价写入订单明细，之后调整进价不影响已结账订单的毛利
+    :param db: 结账事务所在的连接（商品行已被锁定）
+    :param order_id: 订单ID
+    """
+    db.execute("""
+        UPDATE order_detail d
+        JOIN goods g ON d.goods_id = g.goods_id
+        SET d.cost_price = g.cost_price
+        WHERE d.order_id = %s
+    """, (order_id,))
+    for sql in (_SALES_HOURLY_SQL, _GOODS_SALE_SQL, _MEMBER_SQL):
+        db.execute(sql.format(where="o.order_id = %s"), (order_id,))
+
+
+def apply_return(db, return_id):
+    """
+    将一张退货单累加到汇总表（在退货事务中调用）
+    :param db: 退货事务所在的连接
+    :param return_id: 退货ID
+    """
+    db.execute(_RETURN_DAILY_SQL.format(where="r.return_id = %s"), (return_id,))
+    db.execute(_GOODS_RETURN_SQL.format(where="r.return_id = %s"), (return_id,))
+
+
+def rebuild(start_date=None, end_date=None):
+    """
+    从订单/退货明细重算指定日期范围的汇总表（不传日期时重算全部）
+    重算期间新结账的订单可能被重复或遗漏计入，应在非营业时间执行
+    :param start_date: 开始日期 'YYYY-MM-DD'
+    :param end_date: 结束日期 'YYYY-MM-DD'
+    :return: {"success": bool, "data": dict, "message": str}
+    """
+    try:
+        with DBConnection() as db:
+            full = start_date is None or end_date is None
+            if full:
+                db.execute("""
+                    SELECT MIN(d) AS min_date, MAX(d) AS max_date FROM (
+                        SELECT DATE(MIN(create_time)) AS d FROM order_info
+                        UNION ALL SELECT DATE(MAX(create_time)) FROM order_info
+                        UNION ALL SELECT DATE(MIN(create_time)) FROM return_record
+                        UNION ALL SELECT DATE(MAX(create_time)) FROM return_record
+                    ) t
+                """)
+                bounds = db.fetchone()
+                if not bounds or bounds['min_date'] is None:
+                    for table in ROLLUP_TABLES:
+                        db.execute(f"DELETE FROM {table}")
+                    db.commit()
+                    return {"success": True, "data": {"start_date": None, "end_date": None},
+                            "message": "无业务数据，汇总表已清空"}
+                start_date, end_date = bounds['min_date'], bounds['max_date']
+
+            start = date.fromisoformat(str(start_date))
+            end_exclusive = date.fromisoformat(str(end_date)) + timedelta(days=1)
+
+            try:
+                for table in ROLLUP_TABLES:
+                    if full:
+                        db.execute(f"DELETE FROM {table}")
+                    else:
+                        db.execute(f"DELETE FROM {table} WHERE stat_date >= %s AND stat_date < %s",
+                                   (start, end_exclusive))
+
+                status_list = ", ".join(["%s"] * len(SOLD_STATUSES))
+                order_where = (f"o.order_status IN ({status_list}) "
+                               f"AND o.create_time >= %s AND o.create_time < %s")
+                order_params = (*SOLD_STATUSES, start, end_exclusive)
+                for sql in (_SALES_HOURLY_SQL, _GOODS_SALE_SQL, _MEMBER_SQL):
+                    db.execute(sql.format(where=order_where), order_params)
+                db.execute(_GOODS_RETURN_SQL.format(where="o.create_time >= %s AND o.create_time < %s"),
+                           (start, end_exclusive))
+                db.execute(_RETURN_DAILY_SQL.format(where="r.create_time >= %s AND r.create_time < %s"),
+                           (start, end_exclusive))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            return {
+                "success": True,
+                "data": {"start_date": str(start), "end_date": str(end_exclusive - timedelta(days=1))},
+                "message": "汇总表重算完成"
+            }
+    except Exception as e:
+        return {"success": False, "data": None, "message": f"汇总表重算失败: {str(e)}"}
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) not in (0, 2):
+        print("用法: python -m logic.stat_rollup_logic [开始日期 结束日期]")
+        sys.exit(1)
+    result = rebuild(*args)
+    print(result['message'], result['data'] or '')
+    sys.exit(0 if result['success'] else 1)
@@ -1,142 +1,230 @@
 # -*- coding: utf-8 -*-
-"""统计分析逻辑"""
+"""
+统计分析逻辑
+一个日期范围的数据（stat_* 汇总表，见 logic/stat_rollup_logic.py）一次性载入为 pandas 列式快照，
+汇总、每日销售、商品/会员排行、订单列表都在快照上做向量化分组计算，切换标签页时复用，日期范围变化或手动刷新时重新载入
+"""
 
+import threading
+from concurrent.futures import Future
+import pandas as pd
 from db.db_conn import DBConnection
 
+# 订单列表最多载入的条数
+ORDER_LIST_LIMIT = 500
 
-class StatisticsLogic:
-    """统计分析业务逻辑"""
+
+def _to_frame(rows, columns, numeric):
+    """查询结果转为DataFrame，数值列统一转为float（Decimal/None -> float/0）"""
+    df = pd.DataFrame(list(rows), columns=columns)
+    for col in numeric:
+        df[col] = df[col].astype(float).fillna(0)
+    return df
+
+
+class AnalyticsSnapshot:
+    """某一日期范围的统计数据快照"""
     
-    def get_summary(self, start_date, end_date):
-        """获取汇总数据"""
+    def __init__(self, start_date, end_date, sales, goods, members, returns, orders):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.sales = sales        # 小时销售: stat_date, stat_hour, order_count, sales_amount, member_sales, cost_amount
+        self.goods = goods        # 商品日汇总: stat_date, goods_id, goods_name, sale_qty, sale_amount, return_qty, return_amount
+        self.members = members    # 会员日汇总: stat_date, member_id, name, card_no, order_count, sales_amount
+        self.returns = returns    # 退货日汇总: stat_date, return_count, refund_amount
+        self.orders = orders      # 订单列表（按创建时间倒序）
+    
+    @classmethod
+    def load(cls, start_date, end_date):
+        """从数据库载入快照（每张表一次查询）"""
+        params = (start_date, end_date)
         with DBConnection() as db:
-            # 销售总额和订单数
-            sql = """
-                SELECT COUNT(*) as order_count, 
-                       COALESCE(SUM(actual_amount), 0) as total_sales,
-                       COALESCE(SUM(CASE WHEN member_id IS NOT NULL THEN actual_amount ELSE 0 END), 0) as member_sales
-                FROM order_info 
-                WHERE order_status = 'completed'
-                AND DATE(create_time) >= %s AND DATE(create_time) <= %s
-            """
-            db.execute(sql, (start_date, end_date))
-            sales = db.fetchone()
+            db.execute("""
+                SELECT stat_date, stat_hour, order_count, sales_amount, member_sales, cost_amount
+                FROM stat_sales_hourly
+                WHERE stat_date >= %s AND stat_date <= %s
+            """, params)
+            sales = _to_frame(db.fetchall(),
+                              ['stat_date', 'stat_hour', 'order_count', 'sales_amount', 'member_sales', 'cost_amount'],
+                              ['order_count', 'sales_amount', 'member_sales', 'cost_amount'])
+            
+            db.execute("""
+                SELECT s.stat_date, s.goods_id, g.goods_name,
+                       s.sale_qty, s.sale_amount, s.return_qty, s.return_amount
+                FROM stat_goods_daily s
+                JOIN goods g ON s.goods_id = g.goods_id
+                WHERE s.stat_date >= %s AND s.stat_date <= %s
+            """, params)
+            goods = _to_frame(db.fetchall(),
+                              ['stat_date', 'goods_id', 'goods_name', 'sale_qty', 'sale_amount', 'return_qty', 'return_amount'],
+                              ['sale_qty', 'sale_amount', 'return_qty', 'return_amount'])
             
-            # 退货金额
-            sql = """
-                SELECT COALESCE(SUM(refund_amount), 0) as total_return
-                FROM return_record
-                WHERE DATE(create_time) >= %s AND DATE(create_time) <= %s
-            """
-            db.execute(sql, (start_date, end_date))
-            returns = db.fetchone()
+            db.execute("""
+                SELECT s.stat_date, s.member_id, m.name, m.card_no, s.order_count, s.sales_amount
+                FROM stat_member_daily s
+                JOIN member m ON s.member_id = m.member_id
+                WHERE s.stat_date >= %s AND s.stat_date <= %s
+            """, params)
+            members = _to_frame(db.fetchall(),
+                                ['stat_date', 'member_id', 'name', 'card_no', 'order_count', 'sales_amount'],
+                                ['order_count', 'sales_amount'])
             
-            total_sales = float(sales['total_sales'] or 0)
-            member_sales = float(sales['member_sales'] or 0)
-            member_ratio = (member_sales / total_sales * 100) if total_sales > 0 else 0
+            db.execute("""
+                SELECT stat_date, return_count, refund_amount
+                FROM stat_return_daily
+                WHERE stat_date >= %s AND stat_date <= %s
+            """, params)
+            returns = _to_frame(db.fetchall(),
+                                ['stat_date', 'return_count', 'refund_amount'],
+                                ['return_count', 'refund_amount'])
             
-            return {
-                'total_sales': total_sales,
-                'total_orders': sales['order_count'] or 0,
-                'total_return': float(returns['total_return'] or 0),
-                'member_ratio': member_ratio
-            }
+            # 按时间范围比较，可以使用 idx_create_time 索引
+            db.execute("""
+                SELECT 
+                    o.order_id, o.order_no, o.actual_amount, 
+                    o.order_status, o.create_time,
+                    m.name as member_name, m.card_no
+                FROM order_info o
+                LEFT JOIN member m ON o.member_id = m.member_id
+                WHERE o.create_time >= %s AND o.create_time < DATE_ADD(%s, INTERVAL 1 DAY)
+                ORDER BY o.create_time DESC
+                LIMIT %s
+            """, (start_date, end_date, ORDER_LIST_LIMIT))
+            orders = db.fetchall()
+        
+        return cls(start_date, end_date, sales, goods, members, returns, orders)
+    
+    def summary(self):
+        """汇总数据"""
+        total_sales = float(self.sales['sales_amount'].sum())
+        member_sales = float(self.sales['member_sales'].sum())
+        member_ratio = (member_sales / total_sales * 100) if total_sales > 0 else 0
+        return {
+            'total_sales': total_sales,
+            'total_orders': int(self.sales['order_count'].sum()),
+            'total_return': float(self.returns['refund_amount'].sum()),
+            'member_ratio': member_ratio
+        }
+    
+    def daily_sales(self):
+        """每日销售（毛利 = 实收金额 - 结账时进价成本，按订单汇总，不随明细行重复累加）"""
+        daily = (self.sales.groupby('stat_date')[['order_count', 'sales_amount', 'cost_amount']]
+                 .sum()
+                 .sort_index(ascending=False))
+        profit = daily['sales_amount'] - daily['cost_amount']
+        return [{
+            'date': str(stat_date),
+            'order_count': int(order_count),
+            'sales': float(sales),
+            'profit': float(p)
+        } for stat_date, order_count, sales, p in zip(
+            daily.index, daily['order_count'], daily['sales_amount'], profit)]
+    
+    def goods_ranking(self, limit=20):
+        """商品销量排行（扣除退货后的净销量）"""
+        ranked = self.goods.groupby('goods_id').agg(
+            goods_name=('goods_name', 'first'),
+            sale_qty=('sale_qty', 'sum'),
+            return_qty=('return_qty', 'sum'),
+            sale_amount=('sale_amount', 'sum'),
+            return_amount=('return_amount', 'sum'),
+        )
+        ranked['total_qty'] = ranked['sale_qty'] - ranked['return_qty']
+        ranked['total_amount'] = ranked['sale_amount'] - ranked['return_amount']
+        ranked = ranked[ranked['total_qty'] > 0].nlargest(limit, 'total_qty')
+        return [{
+            'goods_name': name,
+            'total_qty': int(qty),
+            'total_amount': float(amount)
+        } for name, qty, amount in zip(ranked['goods_name'], ranked['total_qty'], ranked['total_amount'])]
+    
+    def member_ranking(self, limit=20):
+        """会员消费排行"""
+        ranked = self.members.groupby('member_id').agg(
+            name=('name', 'first'),
+            card_no=('card_no', 'first'),
+            order_count=('order_count', 'sum'),
+            total_amount=('sales_amount', 'sum'),
+        ).nlargest(limit, 'total_amount')
+        return [{
+            'name': name,
+            'card_no': card_no,
+            'order_count': int(count),
+            'total_amount': float(amount)
+        } for name, card_no, count, amount in zip(
+            ranked['name'], ranked['card_no'], ranked['order_count'], ranked['total_amount'])]
+    
+    def order_list(self, limit=100):
+        """订单列表"""
+        return self.orders[:limit]
+
+
+class StatisticsLogic:
+    """统计分析业务逻辑"""
+    
+    def __init__(self):
+        # 锁只保护以下字段，载入快照时不持锁（refresh 在界面主线程调用，不能等待后台载入）
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._snapshot = None
+        self._pending = None    # ((generation, start, end), Future) 正在载入的快照
+    
+    def refresh(self):
+        """丢弃当前快照，下次查询时重新载入（进行中的载入结果不再采用）"""
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+            self._pending = None
+    
+    def _get_snapshot(self, start_date, end_date):
+        """
+        获取日期范围对应的快照，范围未变时复用；
+        同一范围的并发查询（汇总和明细）共用一次载入，由第一个请求的线程载入，其余等待结果
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and (snapshot.start_date, snapshot.end_date) == (start_date, end_date):
+                return snapshot
+            key = (self._generation, start_date, end_date)
+            pending = self._pending
+            owner = pending is None or pending[0] != key
+            if owner:
+                pending = self._pending = (key, Future())
+        
+        future = pending[1]
+        if not owner:
+            return future.result()
+        try:
+            snapshot = AnalyticsSnapshot.load(start_date, end_date)
+        except Exception as e:
+            with self._lock:
+                if self._pending is pending:
+                    self._pending = None
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if self._pending is pending:
+                self._pending = None
+                self._snapshot = snapshot
+        future.set_result(snapshot)
+        return snapshot
+    
+    def get_summary(self, start_date, end_date):
+        """获取汇总数据"""
+        return self._get_snapshot(start_date, end_date).summary()
     
     def get_daily_sales(self, start_date, end_date):
         """获取每日销售数据"""
-        with DBConnection() as db:
-            sql = """
-                SELECT 
-                    DATE(o.create_time) as date,
-                    COUNT(DISTINCT o.order_id) as order_count,
-                    COALESCE(SUM(o.actual_amount), 0) as sales,
-                    COALESCE(SUM(o.actual_amount) - SUM(d.quantity * g.cost_price), 0) as profit
-                FROM order_info o
-                LEFT JOIN order_detail d ON o.order_id = d.order_id
-                LEFT JOIN goods g ON d.goods_id = g.goods_id
-                WHERE o.order_status = 'completed'
-                AND DATE(o.create_time) >= %s AND DATE(o.create_time) <= %s
-                GROUP BY DATE(o.create_time)
-                ORDER BY date DESC
-            """
-            db.execute(sql, (start_date, end_date))
-            results = db.fetchall()
-            
-            return [{
-                'date': str(r['date']),
-                'order_count': r['order_count'],
-                'sales': float(r['sales'] or 0),
-                'profit': float(r['profit'] or 0)
-            } for r in results]
+        return self._get_snapshot(start_date, end_date).daily_sales()
     
     def get_goods_ranking(self, start_date, end_date, limit=20):
         """获取商品销量排行"""
-        with DBConnection() as db:
-            sql = """
-                SELECT 
-                    g.goods_name,
-                    COALESCE(SUM(d.quantity - d.returned_quantity), 0) as total_qty,
-                    COALESCE(SUM(d.subtotal), 0) as total_amount
-                FROM order_detail d
-                JOIN goods g ON d.goods_id = g.goods_id
-                JOIN order_info o ON d.order_id = o.order_id
-                WHERE o.order_status = 'completed'
-                AND DATE(o.create_time) >= %s AND DATE(o.create_time) <= %s
-                GROUP BY g.goods_id, g.goods_name
-                HAVING total_qty > 0
-                ORDER BY total_qty DESC
-                LIMIT %s
-            """
-            db.execute(sql, (start_date, end_date, limit))
-            results = db.fetchall()
-            
-            return [{
-                'goods_name': r['goods_name'],
-                'total_qty': int(r['total_qty']),
-                'total_amount': float(r['total_amount'] or 0)
-            } for r in results]
+        return self._get_snapshot(start_date, end_date).goods_ranking(limit)
     
     def get_member_ranking(self, start_date, end_date, limit=20):
         """获取会员消费排行"""
-        with DBConnection() as db:
-            sql = """
-                SELECT 
-                    m.name, m.card_no,
-                    COUNT(o.order_id) as order_count,
-                    COALESCE(SUM(o.actual_amount), 0) as total_amount
-                FROM member m
-                JOIN order_info o ON m.member_id = o.member_id
-                WHERE o.order_status = 'completed'
-                AND DATE(o.create_time) >= %s AND DATE(o.create_time) <= %s
-                GROUP BY m.member_id, m.name, m.card_no
-                ORDER BY total_amount DESC
-                LIMIT %s
-            """
-            db.execute(sql, (start_date, end_date, limit))
-            results = db.fetchall()
-            
-            return [{
-                'name': r['name'],
-                'card_no': r['card_no'],
-                'order_count': r['order_count'],
-                'total_amount': float(r['total_amount'] or 0)
-            } for r in results]
+        return self._get_snapshot(start_date, end_date).member_ranking(limit)
     
     def get_order_list(self, start_date, end_date, limit=100):
         """获取订单列表"""
-        with DBConnection() as db:
-            sql = """
-                SELECT 
-                    o.order_id, o.order_no, o.actual_amount, 
-                    o.order_status, o.create_time,
-                    m.name as member_name, m.card_no
-                FROM order_info o
-                LEFT JOIN member m ON o.member_id = m.member_id
-                WHERE DATE(o.create_time) >= %s AND DATE(o.create_time) <= %s
-                ORDER BY o.create_time DESC
-                LIMIT %s
-            """
-            db.execute(sql, (start_date, end_date, limit))
-            results = db.fetchall()
-            
-            return results
+        return self._get_snapshot(start_date, end_date).order_list(limit)
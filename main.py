@@ -22,6 +22,12 @@ def main():
         from ui.main_ui import MainApp
         app = MainApp()
         app.mainloop()
+    finally:
+        # 退出前停止后台任务并关闭数据库连接池
+        from utils.async_utils import ui_executor
+        ui_executor.shutdown()
+        from db.db_conn import close_pool
+        close_pool()
 
 
 if __name__ == "__main__":
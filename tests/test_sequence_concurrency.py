@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+退货单号并发分配测试（需要可连接的测试数据库，会在当天的 return_no 计数行上占用号码）
+    python -m unittest tests.test_sequence_concurrency
+"""
+
+import threading
+import unittest
+import uuid
+
+try:
+    from db.db_conn import DBConnection
+    from logic.sequence_logic import SequenceAllocator, generate_return_no
+except ImportError:  # 未安装 pymysql 或缺少 config.py
+    DBConnection = None
+
+THREADS = 16
+PER_THREAD = 10
+
+
+def _database_available():
+    if DBConnection is None:
+        return False
+    try:
+        with DBConnection() as db:
+            db.execute("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+
+@unittest.skipUnless(_database_available(), "数据库不可用")
+class SequenceConcurrencyTest(unittest.TestCase):
+
+    def _run_threads(self, worker):
+        """THREADS 个线程同时开始，各自调用 worker PER_THREAD 次，返回全部结果"""
+        barrier = threading.Barrier(THREADS)
+        results, errors = [], []
+        lock = threading.Lock()
+
+        def run():
+            barrier.wait()
+            try:
+                values = [worker() for _ in range(PER_THREAD)]
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                return
+            with lock:
+                results.extend(values)
+
+        threads = [threading.Thread(target=run) for _ in range(THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_parallel_return_numbers_unique(self):
+        """并行退货事务分配的退货单号互不重复"""
+        def allocate():
+            with DBConnection() as db:
+                return_no = generate_return_no(db)
+                db.commit()
+                return return_no
+
+        numbers = self._run_threads(allocate)
+        self.assertEqual(len(numbers), THREADS * PER_THREAD)
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_rolled_back_number_is_reused(self):
+        """退货事务回滚后号码随之回滚，下一次分配拿到同一个号"""
+        with DBConnection() as db:
+            first = generate_return_no(db)
+            db.rollback()
+        with DBConnection() as db:
+            second = generate_return_no(db)
+            db.rollback()
+        self.assertEqual(first, second)
+
+    def test_seed_continues_existing_numbers(self):
+        """计数行不存在时从 seed 返回的已用最大值续号，号段模式并发不重复"""
+        seq_name = f"test_seq:{uuid.uuid4().hex[:16]}"
+        allocator = SequenceAllocator(block_size=5, seed=lambda db, name: 41)
+        try:
+            values = self._run_threads(lambda: allocator.next_value(seq_name))
+            self.assertEqual(min(values), 42)
+            self.assertEqual(len(set(values)), len(values))
+        finally:
+            with DBConnection() as db:
+                db.execute("DELETE FROM sys_sequence WHERE seq_name = %s", (seq_name,))
+                db.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,8 +5,11 @@
 """
 
 import customtkinter as ctk
+import tkinter as tk
 from tkinter import ttk, messagebox
 from decimal import Decimal
+from utils.async_utils import AsyncFrameMixin
+from utils.tree_utils import KeyedTreeAdapter
 
 # 统一风格配置
 COLORS = {
@@ -30,7 +33,7 @@ FONTS = {
 }
 
 
-class CashierUI(ctk.CTkFrame):
+class CashierUI(AsyncFrameMixin, ctk.CTkFrame):
     """收银界面"""
     
     def __init__(self, parent, user_info=None):
@@ -96,11 +99,25 @@ class CashierUI(ctk.CTkFrame):
         
         self.barcode_entry = ctk.CTkEntry(
             input_row, height=42,
-            placeholder_text="扫码枪扫描或手动输入商品条码后回车",
+            placeholder_text="扫码枪扫描或输入条码/商品名/拼音首字母",
             font=FONTS["body"]
         )
         self.barcode_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
         self.barcode_entry.bind("<Return>", lambda e: self._add_goods())
+        self.barcode_entry.bind("<KeyRelease>", self._on_barcode_key)
+        self.barcode_entry.bind("<Down>", lambda e: self._focus_suggest())
+        self.barcode_entry.bind("<Escape>", lambda e: self._hide_suggest())
+        
+        # 输入联想列表（浮在输入框下方）
+        self.suggest_rows = []
+        self._suggest_after = None
+        self.suggest_list = tk.Listbox(
+            left, height=8, font=FONTS["body"], activestyle="none",
+            selectbackground=COLORS["primary"], relief="solid", borderwidth=1
+        )
+        self.suggest_list.bind("<Return>", lambda e: self._pick_suggest())
+        self.suggest_list.bind("<Double-Button-1>", lambda e: self._pick_suggest())
+        self.suggest_list.bind("<Escape>", lambda e: self._hide_suggest(focus_entry=True))
         
         ctk.CTkButton(
             input_row, text="添加", width=80, height=42,
@@ -173,6 +190,7 @@ class CashierUI(ctk.CTkFrame):
         self.tree.column("qty", width=80, anchor="center")
         self.tree.column("subtotal", width=100, anchor="center")
         self.tree.grid(row=1, column=0, sticky="nsew")
+        self.tree_adapter = KeyedTreeAdapter(self.tree)
         
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.tree.yview)
         scrollbar.grid(row=1, column=1, sticky="ns")
@@ -332,28 +350,90 @@ class CashierUI(ctk.CTkFrame):
         self.actual_amount_label.configure(text=f"¥ {amounts['actual_amount']:.2f}")
     
     def _refresh_tree(self):
-        """刷新商品列表"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
+        """刷新商品列表（按明细对象增量更新，扫码只改动一行）"""
+        rows = []
         for item in self.order_items:
             qty = item["quantity"]
             qty_str = str(int(qty)) if qty == int(qty) else f"{qty:.2f}"
-            self.tree.insert("", "end", values=(
+            rows.append((id(item), (
                 item["goods_name"],
                 f"¥{item['unit_price']:.2f}",
                 qty_str,
                 f"¥{item['subtotal']:.2f}"
-            ))
+            )))
+        self.tree_adapter.update(rows)
         
         self._update_totals()
 
 
     
+    def _on_barcode_key(self, event):
+        """输入变化后稍作停顿再查询联想（扫码枪连续输入时不查询）"""
+        if event.keysym in ("Return", "Down", "Up", "Escape"):
+            return
+        if self._suggest_after is not None:
+            self.after_cancel(self._suggest_after)
+        self._suggest_after = self.after(120, self._query_suggest)
+    
+    def _query_suggest(self):
+        """后台查询输入联想"""
+        from logic.goods_search_logic import suggest_goods
+        
+        self._suggest_after = None
+        keyword = self.barcode_entry.get().strip()
+        if not keyword:
+            self._hide_suggest()
+            return
+        self.run_async(suggest_goods, keyword, 8, on_done=self._show_suggest,
+                       on_error=lambda e: self._hide_suggest(), key="goods_suggest")
+    
+    def _show_suggest(self, result):
+        """显示输入联想"""
+        self.suggest_rows = result["data"] if result["success"] else []
+        if not self.suggest_rows or not self.barcode_entry.get().strip():
+            self._hide_suggest()
+            return
+        self.suggest_list.delete(0, "end")
+        for goods in self.suggest_rows:
+            self.suggest_list.insert("end", f"{goods['goods_name']}    {goods['barcode']}    ¥{goods['price']:.2f}")
+        self.suggest_list.configure(height=len(self.suggest_rows))
+        self.suggest_list.place(in_=self.barcode_entry, relx=0, rely=1, relwidth=1, y=2)
+        self.suggest_list.lift()
+    
+    def _hide_suggest(self, focus_entry=False):
+        """关闭输入联想"""
+        if self._suggest_after is not None:
+            self.after_cancel(self._suggest_after)
+            self._suggest_after = None
+        self.suggest_rows = []
+        self.suggest_list.place_forget()
+        if focus_entry:
+            self.barcode_entry.focus_set()
+    
+    def _focus_suggest(self):
+        """方向键进入联想列表"""
+        if self.suggest_rows:
+            self.suggest_list.focus_set()
+            self.suggest_list.selection_clear(0, "end")
+            self.suggest_list.selection_set(0)
+            self.suggest_list.activate(0)
+    
+    def _pick_suggest(self):
+        """选中联想商品，按条码加入清单"""
+        selection = self.suggest_list.curselection()
+        if not selection or selection[0] >= len(self.suggest_rows):
+            return
+        goods = self.suggest_rows[selection[0]]
+        self.barcode_entry.delete(0, "end")
+        self.barcode_entry.insert(0, goods["barcode"])
+        self.barcode_entry.focus_set()
+        self._add_goods()
+    
     def _add_goods(self):
         """添加商品（通过条码）"""
         from logic.cashier_logic import get_goods_by_barcode
         
+        self._hide_suggest()
         barcode = self.barcode_entry.get().strip()
         if not barcode:
             return
@@ -468,10 +548,11 @@ class CashierUI(ctk.CTkFrame):
     
     def _query_member(self):
         """查询会员"""
-        from db.db_conn import DBConnection
+        from logic.member_manage_logic import MemberManageLogic
         
         keyword = self.member_entry.get().strip()
         if not keyword:
+            self.cancel_async("member")
             self.current_member = None
             self.discount_rate = 1.0
             self.member_info_label.configure(text="未选择会员（散客）")
@@ -479,34 +560,33 @@ class CashierUI(ctk.CTkFrame):
             self._update_totals()
             return
         
-        try:
-            with DBConnection() as db:
-                sql = """
-                    SELECT m.member_id, m.card_no, m.name, m.phone, m.level_code,
-                           m.total_points, mlr.discount_rate, mlr.level_name
-                    FROM member m
-                    JOIN member_level_rule mlr ON m.level_code = mlr.level_code
-                    WHERE (m.card_no = %s OR m.phone = %s) AND m.status = 'active'
-                """
-                db.execute(sql, (keyword, keyword))
-                member = db.fetchone()
-                
-                if not member:
-                    messagebox.showwarning("提示", "未找到该会员")
-                    return
-                
-                self.current_member = member
-                self.discount_rate = float(member["discount_rate"])
-                
-                discount_text = f"{member['level_name']} ({int(self.discount_rate * 100)}折)" if self.discount_rate < 1 else "无"
-                self.discount_label.configure(text=discount_text)
-                self.member_info_label.configure(
-                    text=f"✓ {member['name']} | {member['card_no']} | 积分: {member['total_points']}"
-                )
-                self._update_totals()
-                
-        except Exception as e:
+        def show_member(result):
+            # 查询期间会员输入框已改动（换人、结账后重置）时丢弃结果
+            if self.member_entry.get().strip() != keyword:
+                return
+            if not result["success"]:
+                messagebox.showwarning("提示", result["message"])
+                return
+            
+            member = result["data"]
+            self.current_member = member
+            self.discount_rate = float(member["discount_rate"])
+            
+            discount_text = f"{member['level_name']} ({int(self.discount_rate * 100)}折)" if self.discount_rate < 1 else "无"
+            self.discount_label.configure(text=discount_text)
+            self.member_info_label.configure(
+                text=f"✓ {member['name']} | {member['card_no']} | 积分: {member['total_points']}"
+            )
+            self._update_totals()
+        
+        def show_error(e):
+            if self.member_entry.get().strip() != keyword:
+                return
             messagebox.showerror("错误", f"查询失败: {str(e)}")
+        
+        # 后台查询会员，查询期间可继续扫码
+        self.run_async(MemberManageLogic().lookup_member, keyword,
+                       on_done=show_member, on_error=show_error, key="member")
 
     def _hang_order(self):
         """挂单"""
@@ -634,6 +714,10 @@ class CashierUI(ctk.CTkFrame):
             messagebox.showwarning("提示", "请先添加商品")
             return
         
+        if self.is_loading("member"):
+            messagebox.showinfo("提示", "正在查询会员，请稍候再结账")
+            return
+        
         pay_method = self.pay_method.get()
         member_id = self.current_member["member_id"] if self.current_member else None
         
@@ -736,11 +820,12 @@ class CashierUI(ctk.CTkFrame):
         ctk.CTkButton(
             btn_frame, text="打印", width=150, height=40,
             font=FONTS["body"], fg_color=COLORS["info"],
-            command=lambda: messagebox.showinfo("提示", f"小票已保存至:\nreceipts/receipt_{order_data['order_no']}.txt")
+            command=lambda: messagebox.showinfo("提示", f"小票已存档，可按单号补打:\n{order_data['order_no']}")
         ).pack(side="left", pady=10)
 
     def _reset_order(self):
         """重置订单状态"""
+        self.cancel_async("member")
         self.order_items.clear()
         self.current_member = None
         self.discount_rate = 1.0
@@ -7,6 +7,8 @@ import customtkinter as ctk
 from tkinter import ttk, messagebox
 from logic.goods_manage_logic import GoodsManageLogic
 from logic.goods_category_logic import GoodsCategoryLogic
+from utils.async_utils import AsyncFrameMixin
+from utils.tree_utils import PagedTreeLoader
 
 COLORS = {
     "primary": "#4A90D9",
@@ -24,7 +26,7 @@ FONTS = {
 }
 
 
-class GoodsManageUI(ctk.CTkFrame):
+class GoodsManageUI(AsyncFrameMixin, ctk.CTkFrame):
     """商品管理界面"""
     
     def __init__(self, parent):
@@ -83,6 +85,8 @@ class GoodsManageUI(ctk.CTkFrame):
             placeholder_text="条码/商品名", font=FONTS["body"])
         self.search_entry.pack(side="left", padx=(0, 5))
         self.search_entry.bind("<Return>", lambda e: self._search_goods())
+        self.search_entry.bind("<KeyRelease>", self._on_search_key)
+        self._search_after = None
         
         ctk.CTkButton(filter_frame, text="查询", width=50, height=32,
             font=FONTS["body"], fg_color=COLORS["info"],
@@ -149,27 +153,40 @@ class GoodsManageUI(ctk.CTkFrame):
         
         self.tree.grid(row=0, column=0, sticky="nsew", padx=(20, 0), pady=20)
         scrollbar.grid(row=0, column=1, sticky="ns", pady=20, padx=(0, 10))
+        
+        # 分页懒加载：只加载滚动到的页
+        self.loader = PagedTreeLoader(self, self.tree, scrollbar, self._to_row, key="goods_list")
     
     def _load_goods_list(self, filters=None):
-        """加载商品列表"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        result = self.logic.get_goods_list(filters)
-        if result['success']:
-            for goods in result['data']:
-                self.tree.insert("", "end", values=(
-                    goods['goods_id'], goods['barcode'], goods['goods_name'],
-                    goods.get('category_name', ''), goods['sale_price_str'],
-                    goods.get('stock_num', 0), goods['status_display']
-                ))
+        """加载商品列表（后台按页查询，新的筛选会取消未完成的旧查询）"""
+        self.loader.reload(lambda after, limit: self.logic.get_goods_page(filters, after, limit))
+    
+    @staticmethod
+    def _to_row(goods):
+        """商品记录转表格行"""
+        return goods['goods_id'], (
+            goods['goods_id'], goods['barcode'], goods['goods_name'],
+            goods.get('category_name', ''), goods['sale_price_str'],
+            goods.get('stock_num', 0), goods['status_display']
+        )
     
     def _on_filter_change(self, value=None):
         """筛选条件变化"""
         self._search_goods()
     
+    def _on_search_key(self, event):
+        """输入关键词时停顿片刻自动查询"""
+        if event.keysym == "Return":
+            return
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(250, self._search_goods)
+    
     def _search_goods(self):
         """搜索/筛选商品"""
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+            self._search_after = None
         filters = {}
         
         # 分类筛选
@@ -5,9 +5,11 @@ import customtkinter as ctk
 from tkinter import ttk, messagebox
 from logic.inventory_logic import InventoryLogic
 from logic.inventory_warning import InventoryWarning
+from utils.async_utils import AsyncFrameMixin
+from utils.tree_utils import PagedTreeLoader, single_page
 
 
-class InventoryMonitorUI(ctk.CTkFrame):
+class InventoryMonitorUI(AsyncFrameMixin, ctk.CTkFrame):
     """库存监控界面"""
     
     def __init__(self, parent):
@@ -31,6 +33,9 @@ class InventoryMonitorUI(ctk.CTkFrame):
         
         ctk.CTkButton(top_frame, text="查询", width=80, command=self.search_inventory).pack(side="left", padx=5)
         ctk.CTkButton(top_frame, text="刷新", width=80, command=self.refresh_and_check).pack(side="left", padx=5)
+        cancel_button = ctk.CTkButton(top_frame, text="取消", width=60, fg_color="#95a5a6", hover_color="#7f8c8d")
+        cancel_button.pack(side="left", padx=5)
+        self.bind_cancel_button(cancel_button)
         
         # 筛选按钮
         filter_frame = ctk.CTkFrame(top_frame)
@@ -86,6 +91,11 @@ class InventoryMonitorUI(ctk.CTkFrame):
         self.tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
+        # 分页懒加载：只加载滚动到的页
+        self.loader = PagedTreeLoader(self, self.tree, scrollbar, self._to_row,
+                                      on_page=self._on_page_loaded, key="inventory_list")
+        self._count_from_rows = False
+        
         self.tree.bind("<<TreeviewSelect>>", self.on_select)
         
         # 底部操作区
@@ -115,84 +125,104 @@ class InventoryMonitorUI(ctk.CTkFrame):
         
         self.selected_goods_id = None
     
+    def on_loading_changed(self, loading):
+        """加载中提示"""
+        super().on_loading_changed(loading)
+        if loading and self.loader.row_count == 0:
+            self.total_label.configure(text="加载中...")
+    
+    def _show_pages(self, fetch_page, keyword=None):
+        """按分页方式重新加载列表，统计数据由数据库汇总"""
+        self._count_from_rows = False
+        self.loader.reload(fetch_page)
+        self.run_async(self.logic.get_inventory_summary, keyword,
+                       on_done=self._show_summary, key="inventory_summary")
+    
+    def _show_list(self, fetch_list):
+        """一次性加载较小的结果集（如预警列表），统计数据按行计算"""
+        self._count_from_rows = True
+        self.loader.reload(lambda after, limit: single_page(fetch_list()))
+    
     def load_inventory(self):
         """加载库存数据"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        inventory_list = self.logic.get_all_inventory()
-        self.display_inventory(inventory_list)
+        self._show_pages(lambda after, limit: self.logic.get_inventory_page(after, limit))
     
     def refresh_and_check(self):
         """刷新并检查库存状态，触发预警通知"""
+        def done(_):
+            # 重新加载数据
+            self.load_inventory()
+            # 尝试刷新主窗口的通知计数
+            try:
+                main_window = self.winfo_toplevel()
+                if hasattr(main_window, '_refresh_notification_count'):
+                    main_window._refresh_notification_count(schedule=False)
+            except:
+                pass
+        
         # 检查库存状态并创建通知
-        self.warning.check_all_inventory()
-        # 重新加载数据
-        self.load_inventory()
-        # 尝试刷新主窗口的通知计数
-        try:
-            main_window = self.winfo_toplevel()
-            if hasattr(main_window, '_refresh_notification_count'):
-                main_window._refresh_notification_count()
-        except:
-            pass
+        self.run_async(self.warning.check_all_inventory, on_done=done, key="inventory_check")
     
-    def display_inventory(self, inventory_list):
-        """显示库存数据"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        warning_count = 0
-        sufficient_count = 0
-        
-        status_map = {
-            'sufficient': '充足',
-            'stock_shortage': '库存不足',
-            'shelf_shortage': '货架不足',
-            'stock_warning': '库存预警',
-            'shelf_warning': '货架预警',
-            'both_warning': '双重预警',
-            'warning': '预警',
-            'shortage': '缺货'
-        }
-        
-        for inv in inventory_list:
-            stock_status = inv.get('stock_status', 'sufficient')
-            status = status_map.get(stock_status, stock_status)
-            
-            # 根据实际数量判断状态
-            stock_num = inv.get('stock_num', 0)
-            on_shelf_num = inv.get('on_shelf_num', 0)
-            stock_warning = inv.get('stock_warning', 10)
-            shelf_warning = inv.get('shelf_warning', 5)
-            
-            if stock_num <= 0:
-                status = '库存不足'
-                warning_count += 1
-            elif stock_num <= stock_warning:
-                status = '库存预警'
-                warning_count += 1
-            elif on_shelf_num <= shelf_warning:
-                status = '货架预警'
-                warning_count += 1
-            else:
-                status = '充足'
-                sufficient_count += 1
-            
-            self.tree.insert("", "end", values=(
-                inv['goods_id'],
-                inv.get('barcode', ''),
-                inv.get('goods_name', ''),
-                inv['stock_num'],
-                inv['on_shelf_num'],
-                inv['stock_warning'],
-                inv['shelf_warning'],
-                status
-            ))
-        
-        self.total_label.configure(text=f"商品总数: {len(inventory_list)}")
-        self.warning_label.configure(text=f"预警商品: {warning_count}")
-        self.sufficient_label.configure(text=f"库存充足: {sufficient_count}")
+    @staticmethod
+    def _status_of(inv):
+        """根据实际数量判断状态，返回 (状态文字, 是否预警)"""
+        stock_num = inv.get('stock_num', 0)
+        on_shelf_num = inv.get('on_shelf_num', 0)
+        stock_warning = inv.get('stock_warning', 10)
+        shelf_warning = inv.get('shelf_warning', 5)
+        
+        if stock_num <= 0:
+            return '库存不足', True
+        if stock_num <= stock_warning:
+            return '库存预警', True
+        if on_shelf_num <= shelf_warning:
+            return '货架预警', True
+        return '充足', False
+    
+    def _to_row(self, inv):
+        """库存记录转表格行"""
+        status, _ = self._status_of(inv)
+        return inv['goods_id'], (
+            inv['goods_id'],
+            inv.get('barcode', ''),
+            inv.get('goods_name', ''),
+            inv['stock_num'],
+            inv['on_shelf_num'],
+            inv['stock_warning'],
+            inv['shelf_warning'],
+            status
+        )
+    
+    def _on_page_loaded(self, rows, first_page):
+        """一次性加载的列表直接按行统计"""
+        if not self._count_from_rows:
+            return
+        warning_count = sum(1 for inv in rows if self._status_of(inv)[1])
+        self._show_summary({"success": True, "data": {
+            "total": len(rows), "warning": warning_count, "sufficient": len(rows) - warning_count}})
+    
+    def _show_summary(self, result):
+        """显示统计数据"""
+        if not result.get('success'):
+            return
+        data = result['data']
+        self.total_label.configure(text=f"商品总数: {data['total']}")
+        self.warning_label.configure(text=f"预警商品: {data['warning']}")
+        self.sufficient_label.configure(text=f"库存充足: {data['sufficient']}")
+    
+    def _refresh_selected(self):
+        """补货/设置预警后只刷新选中的一行和统计数据"""
+        goods_id = self.selected_goods_id
+        
+        def done(result):
+            if result['success']:
+                self.loader.update_row(result['data'])
+        
+        self.run_async(self.logic.get_stock, goods_id, on_done=done, key="inventory_row")
+        if not self._count_from_rows:
+            keyword = self.search_entry.get().strip() or None
+            self.run_async(self.logic.get_inventory_summary, keyword,
+                           on_done=self._show_summary, key="inventory_summary")
     
     def search_inventory(self):
         """搜索库存"""
@@ -201,18 +231,15 @@ class InventoryMonitorUI(ctk.CTkFrame):
             self.load_inventory()
             return
         
-        inventory_list = self.logic.search_inventory(keyword)
-        self.display_inventory(inventory_list)
+        self._show_pages(lambda after, limit: self.logic.get_inventory_page(after, limit, keyword), keyword)
     
     def show_stock_warning(self):
         """显示库存预警商品"""
-        warning_list = self.warning.get_stock_warning_list()
-        self.display_inventory(warning_list)
+        self._show_list(self.warning.get_stock_warning_list)
     
     def show_shelf_warning(self):
         """显示货架预警商品"""
-        warning_list = self.warning.get_shelf_warning_list()
-        self.display_inventory(warning_list)
+        self._show_list(self.warning.get_shelf_warning_list)
     
     def on_select(self, event):
         """选中商品"""
@@ -240,7 +267,7 @@ class InventoryMonitorUI(ctk.CTkFrame):
             # 返回字典格式
             if result.get('success'):
                 messagebox.showinfo("成功", result.get('message', '入库成功'))
-                self.load_inventory()
+                self._refresh_selected()
                 self.restock_entry.delete(0, "end")
             else:
                 messagebox.showerror("错误", result.get('message', '入库失败'))
@@ -249,7 +276,7 @@ class InventoryMonitorUI(ctk.CTkFrame):
             success, msg = result
             if success:
                 messagebox.showinfo("成功", msg)
-                self.load_inventory()
+                self._refresh_selected()
                 self.restock_entry.delete(0, "end")
             else:
                 messagebox.showerror("错误", msg)
@@ -271,7 +298,7 @@ class InventoryMonitorUI(ctk.CTkFrame):
         success, msg = self.logic.move_to_shelf(self.selected_goods_id, quantity)
         if success:
             messagebox.showinfo("成功", msg)
-            self.load_inventory()
+            self._refresh_selected()
             self.restock_entry.delete(0, "end")
         else:
             messagebox.showerror("错误", msg)
@@ -293,7 +320,7 @@ class InventoryMonitorUI(ctk.CTkFrame):
         success, msg = self.logic.set_stock_warning(self.selected_goods_id, warning_num)
         if success:
             messagebox.showinfo("成功", msg)
-            self.load_inventory()
+            self._refresh_selected()
             self.warning_entry.delete(0, "end")
         else:
             messagebox.showerror("错误", msg)
@@ -315,7 +342,7 @@ class InventoryMonitorUI(ctk.CTkFrame):
         success, msg = self.logic.set_shelf_warning(self.selected_goods_id, warning_num)
         if success:
             messagebox.showinfo("成功", msg)
-            self.load_inventory()
+            self._refresh_selected()
             self.warning_entry.delete(0, "end")
         else:
             messagebox.showerror("错误", msg)
@@ -6,6 +6,9 @@
 
 import customtkinter as ctk
 from logic.notification_logic import NotificationLogic
+from utils.async_utils import ui_executor
+from utils.notify_bus import notification_bus, event_matches, EVENT_CREATED, EVENT_READ, EVENT_REFRESH
+from config import SYSTEM_CONFIG
 
 # ==================== 统一UI风格配置（其他组员请参考） ====================
 COLORS = {
@@ -48,6 +51,9 @@ class MainApp(ctk.CTk):
         self.current_user = user_info or {"username": "admin", "role": "admin", "role_display": "管理员", "permissions": ["cashier", "goods", "member", "return", "statistics", "user_manage"]}
         self.current_frame = None
         
+        # 启动后台任务执行器（界面中的数据库操作在工作线程执行，结果回到主线程）
+        ui_executor.start(self)
+        
         self._create_layout()
         self._show_cashier()
     
@@ -120,7 +126,14 @@ class MainApp(ctk.CTk):
         # 初始隐藏小红点
         self.badge_label.place_forget()
         
-        # 定时刷新未读数量
+        # 未读数量：启动时查询一次，之后由推送事件增减，未连接中转服务时定时查询
+        self._unread_count = 0
+        broker = SYSTEM_CONFIG.get('notify_broker')
+        if broker:
+            notification_bus.connect(*broker)
+        self._unsubscribe_bus = notification_bus.subscribe(
+            lambda event: ui_executor.post(self._on_notification_event, event, owner=self))
+        self.bind("<Destroy>", self._on_destroy, add="+")
         self._refresh_notification_count()
         
         ctk.CTkLabel(
@@ -142,6 +155,9 @@ class MainApp(ctk.CTk):
     def _switch_frame(self, frame_class, **kwargs):
         """切换内容区"""
         if self.current_frame:
+            # 取消旧界面未完成的后台任务，迟到的结果直接丢弃
+            if hasattr(self.current_frame, 'cancel_async'):
+                self.current_frame.cancel_async()
             self.current_frame.destroy()
         self.current_frame = frame_class(self.content, **kwargs)
         self.current_frame.grid(row=0, column=0, sticky="nsew", padx=20, pady=20)
@@ -190,13 +206,47 @@ class MainApp(ctk.CTk):
         from ui.query_comprehensive_ui import QueryComprehensiveUI
         self._switch_frame(QueryComprehensiveUI)
     
-    def _refresh_notification_count(self):
-        """刷新未读通知数量"""
+    def _refresh_notification_count(self, schedule=True):
+        """查询未读通知数量（后台查询，不阻塞收银台输入）"""
+        user_id = self.current_user.get('user_id')
+        role = self.current_user.get('role')
+        ui_executor.submit(self.notification_logic.get_unread_count, user_id, role,
+                           on_done=self._on_unread_count, owner=self)
+        
+        # 已连接中转服务时只需偶尔校正，否则按轮询间隔查询（手动刷新时不重复排程）
+        if schedule:
+            interval = SYSTEM_CONFIG.get('notification_resync_interval', 600) if notification_bus.connected \
+                else SYSTEM_CONFIG.get('notification_poll_interval', 30)
+            self.after(int(interval * 1000), self._refresh_notification_count)
+    
+    def _on_unread_count(self, result):
+        """查询结果覆盖内存中的未读数"""
+        if result.get('success'):
+            self._unread_count = result.get('data', 0)
+            self._update_notification_badge()
+    
+    def _on_notification_event(self, event):
+        """推送事件（主线程）：按事件增减未读数，批量变化时重新查询"""
+        if not event_matches(event, self.current_user.get('user_id'), self.current_user.get('role')):
+            return
+        action = event.get('action')
+        if action == EVENT_CREATED:
+            self._unread_count += 1
+            self._update_notification_badge()
+        elif action == EVENT_READ:
+            self._unread_count = max(0, self._unread_count - 1)
+            self._update_notification_badge()
+        elif action == EVENT_REFRESH:
+            self._refresh_notification_count(schedule=False)
+    
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self._unsubscribe_bus()
+    
+    def _update_notification_badge(self):
+        """更新未读通知小红点"""
         try:
-            user_id = self.current_user.get('user_id')
-            role = self.current_user.get('role')
-            result = self.notification_logic.get_unread_count(user_id, role)
-            count = result.get('data', 0) if result.get('success') else 0
+            count = self._unread_count
             
             if count > 0:
                 # 显示小红点（调整位置到按钮内部右上角）
@@ -209,13 +259,11 @@ class MainApp(ctk.CTk):
                 self.notification_btn.configure(fg_color=COLORS["primary"])
         except:
             pass
-        
-        # 每30秒刷新一次
-        self.after(30000, self._refresh_notification_count)
     
     def _show_notifications(self):
         """显示通知弹窗"""
-        NotificationDialog(self, self.current_user, self.notification_logic, self._refresh_notification_count)
+        NotificationDialog(self, self.current_user, self.notification_logic,
+                           lambda: self._refresh_notification_count(schedule=False))
 
 
 class NotificationDialog(ctk.CTkToplevel):
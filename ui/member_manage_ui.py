@@ -6,6 +6,8 @@
 import customtkinter as ctk
 from tkinter import ttk, messagebox
 from logic.member_manage_logic import MemberManageLogic
+from utils.async_utils import AsyncFrameMixin
+from utils.tree_utils import PagedTreeLoader
 
 COLORS = {
     "primary": "#4A90D9",
@@ -26,7 +28,7 @@ FONTS = {
 }
 
 
-class MemberManageUI(ctk.CTkFrame):
+class MemberManageUI(AsyncFrameMixin, ctk.CTkFrame):
     """会员管理界面"""
     
     def __init__(self, parent):
@@ -50,7 +52,7 @@ class MemberManageUI(ctk.CTkFrame):
         search_frame.pack(side="left", padx=30)
         
         self.search_entry = ctk.CTkEntry(search_frame, width=220, height=36,
-            placeholder_text="输入卡号或手机号查询", font=FONTS["body"])
+            placeholder_text="卡号/手机尾号/姓名", font=FONTS["body"])
         self.search_entry.pack(side="left", padx=(0, 10))
         self.search_entry.bind("<Return>", lambda e: self._search_member())
         
@@ -113,28 +115,31 @@ class MemberManageUI(ctk.CTkFrame):
         
         scrollbar = ttk.Scrollbar(list_card, orient="vertical", command=self.tree.yview)
         scrollbar.grid(row=0, column=1, sticky="ns", pady=20, padx=(0, 10))
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.loader = PagedTreeLoader(self, self.tree, scrollbar, self._to_row,
+                                      on_page=self._on_page_loaded, key="member_list")
+        self._searching = False
     
     def _load_member_list(self):
-        """加载会员列表"""
+        """加载会员列表（后台按页查询，滚动到底部时加载下一页）"""
         self.search_entry.delete(0, "end")
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        result = self.logic.get_member_list()
-        if result['success']:
-            self._fill_tree(result['data'])
+        self._show_pages(None)
+    
+    def _show_pages(self, filters):
+        self._searching = bool(filters)
+        self.loader.reload(lambda after, limit: self.logic.get_member_page(filters, after, limit))
     
-    def _fill_tree(self, members):
-        """填充列表数据"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        for member in members:
-            self.tree.insert("", "end", values=(
-                member['member_id'], member['card_no'], member['name'],
-                member['phone'] or '', member['level_display'],
-                member['total_consume_str'], member['total_points'], member['status_display']
-            ))
+    @staticmethod
+    def _to_row(member):
+        """会员记录转表格行"""
+        return member['member_id'], (
+            member['member_id'], member['card_no'], member['name'],
+            member['phone'] or '', member['level_display'],
+            member['total_consume_str'], member['total_points'], member['status_display']
+        )
+    
+    def _on_page_loaded(self, rows, first_page):
+        if first_page and not rows and self._searching:
+            messagebox.showinfo("提示", "未找到匹配的会员")
     
     def _get_selected_member(self):
         """获取选中的会员"""
@@ -146,18 +151,12 @@ class MemberManageUI(ctk.CTkFrame):
         return {'member_id': values[0], 'card_no': values[1], 'name': values[2]}
     
     def _search_member(self):
-        """查询会员"""
+        """查询会员（卡号/手机号尾号/姓名）"""
         keyword = self.search_entry.get().strip()
         if not keyword:
             self._load_member_list()
             return
-        result = self.logic.query_member(keyword)
-        if result['success']:
-            self._fill_tree(result['data'])
-            if not result['data']:
-                messagebox.showinfo("提示", "未找到匹配的会员")
-        else:
-            messagebox.showerror("错误", result['message'])
+        self._show_pages({'keyword': keyword})
     
     def _add_member(self):
         """新增会员"""
@@ -5,6 +5,8 @@ import customtkinter as ctk
 from tkinter import ttk
 from datetime import datetime, timedelta
 from logic.statistics_logic import StatisticsLogic
+from utils.async_utils import AsyncFrameMixin
+from utils.tree_utils import KeyedTreeAdapter
 
 COLORS = {
     "primary": "#4A90D9",
@@ -24,7 +26,7 @@ FONTS = {
 }
 
 
-class StatisticsUI(ctk.CTkFrame):
+class StatisticsUI(AsyncFrameMixin, ctk.CTkFrame):
     """统计报表界面"""
     
     def __init__(self, parent):
@@ -68,6 +70,12 @@ class StatisticsUI(ctk.CTkFrame):
             font=FONTS["body"], fg_color=COLORS["info"],
             command=self._load_data).pack(side="left", padx=10)
         
+        # 加载中可取消（如误选了很长的日期范围）
+        cancel_button = ctk.CTkButton(header, text="取消", width=80, height=32,
+            font=FONTS["body"], fg_color=COLORS["danger"])
+        cancel_button.pack(side="left", padx=5)
+        self.bind_cancel_button(cancel_button)
+        
         ctk.CTkButton(header, text="刷新", width=80, height=32,
             font=FONTS["body"], fg_color=COLORS["gray"],
             command=self._load_data).pack(side="right", padx=20, pady=15)
@@ -157,6 +165,8 @@ class StatisticsUI(ctk.CTkFrame):
         table_frame.grid_columnconfigure(0, weight=1)
         
         self.tree = ttk.Treeview(table_frame, show="headings", height=15)
+        self.tree_adapter = KeyedTreeAdapter(self.tree)
+        self.shown_tab = None
         scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
         self.tree.configure(yscrollcommand=scrollbar.set)
         
@@ -180,54 +190,68 @@ class StatisticsUI(ctk.CTkFrame):
         start = self.start_date.get().strip()
         end = self.end_date.get().strip()
         
-        # 加载汇总数据
-        summary = self.logic.get_summary(start, end)
+        # 点击查询时重新载入数据，切换标签页复用同一快照
+        self.logic.refresh()
+        
+        # 后台加载汇总数据
+        self.run_async(self.logic.get_summary, start, end, on_done=self._show_summary, key="summary")
         
+        self._load_detail_data()
+    
+    def _show_summary(self, summary):
+        """显示汇总数据"""
         self.total_sales_label.configure(text=f"¥ {summary['total_sales']:,.2f}")
         self.total_orders_label.configure(text=f"{summary['total_orders']} 单")
         self.total_return_label.configure(text=f"¥ {summary['total_return']:,.2f}")
         self.member_ratio_label.configure(text=f"{summary['member_ratio']:.1f}%")
-        
-        self._load_detail_data()
     
     def _load_detail_data(self):
-        """加载详情数据"""
+        """加载详情数据（后台查询，切换标签页时取消上一个标签页未完成的查询）"""
         start = self.start_date.get().strip()
         end = self.end_date.get().strip()
-        
-        # 清空表格
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        if self.current_tab == "daily":
-            self._setup_daily_columns()
-            data = self.logic.get_daily_sales(start, end)
-            for row in data:
-                self.tree.insert("", "end", values=(
-                    row['date'], row['order_count'], 
-                    f"¥{row['sales']:,.2f}", f"¥{row['profit']:,.2f}"
-                ))
-        
-        elif self.current_tab == "goods":
-            self._setup_goods_columns()
-            data = self.logic.get_goods_ranking(start, end)
-            for i, row in enumerate(data, 1):
-                self.tree.insert("", "end", values=(
-                    i, row['goods_name'], row['total_qty'], f"¥{row['total_amount']:,.2f}"
-                ))
-        
-        elif self.current_tab == "member":
-            self._setup_member_columns()
-            data = self.logic.get_member_ranking(start, end)
-            for i, row in enumerate(data, 1):
-                self.tree.insert("", "end", values=(
-                    i, row['name'], row['card_no'], 
-                    row['order_count'], f"¥{row['total_amount']:,.2f}"
-                ))
-        
-        elif self.current_tab == "orders":
-            self._setup_orders_columns()
-            data = self.logic.get_order_list(start, end)
+        tab = self.current_tab
+        
+        fetchers = {
+            "daily": self.logic.get_daily_sales,
+            "goods": self.logic.get_goods_ranking,
+            "member": self.logic.get_member_ranking,
+            "orders": self.logic.get_order_list,
+        }
+        self.run_async(fetchers[tab], start, end,
+                       on_done=lambda data: self._show_detail_data(tab, data), key="detail")
+    
+    def _show_detail_data(self, tab, data):
+        """显示详情数据（同一标签页刷新时按行键增量更新，切换标签页时重建列）"""
+        if tab != self.shown_tab:
+            self.tree_adapter.clear()
+            setup_columns = {
+                "daily": self._setup_daily_columns,
+                "goods": self._setup_goods_columns,
+                "member": self._setup_member_columns,
+                "orders": self._setup_orders_columns,
+            }
+            setup_columns[tab]()
+            self.shown_tab = tab
+        
+        if tab == "daily":
+            self.tree_adapter.update((row['date'], (
+                row['date'], row['order_count'], 
+                f"¥{row['sales']:,.2f}", f"¥{row['profit']:,.2f}"
+            )) for row in data)
+        
+        elif tab == "goods":
+            # 排行榜以名次为行键
+            self.tree_adapter.update((i, (
+                i, row['goods_name'], row['total_qty'], f"¥{row['total_amount']:,.2f}"
+            )) for i, row in enumerate(data, 1))
+        
+        elif tab == "member":
+            self.tree_adapter.update((i, (
+                i, row['name'], row['card_no'], 
+                row['order_count'], f"¥{row['total_amount']:,.2f}"
+            )) for i, row in enumerate(data, 1))
+        
+        elif tab == "orders":
             status_map = {
                 "completed": "已完成",
                 "full_returned": "已退货",
@@ -236,14 +260,13 @@ class StatisticsUI(ctk.CTkFrame):
                 "pending_pay": "待支付",
                 "hanged": "挂单中"
             }
-            for row in data:
-                self.tree.insert("", "end", values=(
-                    row['order_no'],
-                    row['member_name'] or "散客",
-                    f"¥{row['actual_amount']:,.2f}",
-                    status_map.get(row['order_status'], row['order_status']),
-                    row['create_time'].strftime('%Y-%m-%d %H:%M') if row['create_time'] else ""
-                ))
+            self.tree_adapter.update((row['order_no'], (
+                row['order_no'],
+                row['member_name'] or "散客",
+                f"¥{row['actual_amount']:,.2f}",
+                status_map.get(row['order_status'], row['order_status']),
+                row['create_time'].strftime('%Y-%m-%d %H:%M') if row['create_time'] else ""
+            )) for row in data)
     
     def _setup_daily_columns(self):
         """设置每日销售列"""
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+界面后台任务工具
+数据库查询等耗时操作提交到共享线程池执行，结果放入队列，由 Tk 主线程通过 after() 定时取出并回调，
+保证回调中操作控件始终在主线程，耗时查询期间扫码等输入不被阻塞
+"""
+
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class UITask:
+    """一次后台任务"""
+
+    __slots__ = ('future', 'on_done', 'on_error', 'owner', '_cancelled')
+
+    def __init__(self, on_done=None, on_error=None, owner=None):
+        self.future = None
+        self.on_done = on_done
+        self.on_error = on_error
+        self.owner = owner
+        self._cancelled = False
+
+    def cancel(self):
+        """取消任务：未开始的不再执行，已在执行的结果到达后丢弃"""
+        self._cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+
+class UITaskExecutor:
+    """共享后台线程池 + 主线程结果派发"""
+
+    def __init__(self, max_workers=4, poll_interval=30):
+        """
+        :param max_workers: 工作线程数
+        :param poll_interval: 主线程检查结果队列的间隔（毫秒）
+        """
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._pool = None
+        self._results = queue.Queue()
+        self._root = None
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def start(self, root):
+        """绑定 Tk 根窗口并开始派发结果（重复调用时切换到新的根窗口）"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="ui-worker")
+            need_pump = self._root is None
+            self._root = root
+        if need_pump:
+            self._pump()
+
+    @property
+    def started(self):
+        return self._root is not None
+
+    def submit(self, fn, *args, on_done=None, on_error=None, owner=None, **kwargs):
+        """
+        在后台线程执行 fn(*args, **kwargs)
+        :param on_done: 成功回调 on_done(result)，在主线程执行
+        :param on_error: 异常回调 on_error(exc)，在主线程执行
+        :param owner: 发起任务的控件，控件已销毁时丢弃结果
+        :return: UITask
+        """
+        if self._root is None:
+            raise RuntimeError("后台任务执行器未启动，请先调用 start(root)")
+        task = UITask(on_done, on_error, owner)
+
+        def run():
+            if task.cancelled:
+                return
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._results.put((task, False, e))
+            else:
+                self._results.put((task, True, result))
+
+        task.future = self._pool.submit(run)
+        with self._lock:
+            self._pending.add(task)
+        task.future.add_done_callback(lambda _: self._forget(task))
+        return task
+
+    def _forget(self, task):
+        with self._lock:
+            self._pending.discard(task)
+
+    def post(self, callback, value=None, owner=None):
+        """在主线程回调 callback(value)，可在任意线程调用（如推送事件到达时）；执行器未启动时忽略"""
+        if self._root is None:
+            return
+        self._results.put((UITask(callback, None, owner), True, value))
+
+    def _pump(self):
+        """主线程：取出已完成任务并执行回调"""
+        root = self._root
+        if root is None:
+            return
+        try:
+            while True:
+                try:
+                    task, ok, value = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._dispatch(task, ok, value)
+        finally:
+            try:
+                root.after(self.poll_interval, self._pump)
+            except Exception:
+                # 根窗口已销毁
+                with self._lock:
+                    if self._root is root:
+                        self._root = None
+
+    @staticmethod
+    def _dispatch(task, ok, value):
+        if task.cancelled:
+            return
+        owner = task.owner
+        if owner is not None:
+            try:
+                if not owner.winfo_exists():
+                    return
+            except Exception:
+                return
+        callback = task.on_done if ok else task.on_error
+        if callback is None:
+            return
+        try:
+            callback(value)
+        except Exception:
+            # 回调异常不能中断派发循环
+            traceback.print_exc()
+
+    def shutdown(self):
+        """停止派发，取消未开始的任务并关闭线程池（程序退出时调用）"""
+        with self._lock:
+            self._root = None
+            pool, self._pool = self._pool, None
+            pending, self._pending = self._pending, set()
+        # 逐个取消而不用 shutdown(cancel_futures=True)，后者需要 Python 3.9
+        for task in pending:
+            task.cancel()
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+# 进程内共享的执行器，MainApp 创建时启动
+ui_executor = UITaskExecutor()
+
+
+class AsyncFrameMixin:
+    """
+    界面框架的后台任务支持
+    run_async 提交任务，同一 key 的新任务会取消旧任务（如重复点击刷新），
+    cancel_async 取消本界面全部任务（切换界面时由 MainApp 调用，或由界面上的取消按钮调用），
+    子类可重写 on_loading_changed 显示加载状态
+    """
+
+    def run_async(self, fn, *args, on_done=None, on_error=None, key=None, **kwargs):
+        """
+        后台执行 fn，结果在主线程回调
+        :param key: 任务标识，默认使用 fn 本身
+        :return: UITask
+        """
+        tasks = self.__dict__.setdefault('_async_tasks', {})
+        key = key if key is not None else fn
+        previous = tasks.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+
+        if not ui_executor.started:
+            ui_executor.start(self.winfo_toplevel())
+
+        def finish(callback):
+            def handler(value):
+                if tasks.get(key) is task:
+                    del tasks[key]
+                    self._update_loading()
+                if callback is not None:
+                    callback(value)
+            return handler
+
+        if on_error is None:
+            on_error = self.on_async_error
+        task = ui_executor.submit(fn, *args, on_done=finish(on_done), on_error=finish(on_error),
+                                  owner=self, **kwargs)
+        tasks[key] = task
+        self._update_loading()
+        return task
+
+    def cancel_async(self, key=None):
+        """
+        取消本界面未完成的后台任务
+        :param key: 只取消该标识的任务，默认取消全部
+        """
+        tasks = self.__dict__.get('_async_tasks') or {}
+        if key is None:
+            for task in tasks.values():
+                task.cancel()
+            tasks.clear()
+        else:
+            task = tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+        self._update_loading()
+
+    def is_loading(self, key=None):
+        """是否有未完成的后台任务（传入 key 时只看该任务）"""
+        tasks = self.__dict__.get('_async_tasks') or {}
+        return bool(tasks) if key is None else key in tasks
+
+    def _update_loading(self):
+        loading = self.is_loading()
+        if loading != self.__dict__.get('_async_loading', False):
+            self._async_loading = loading
+            try:
+                self.on_loading_changed(loading)
+            except Exception:
+                pass
+
+    def on_loading_changed(self, loading):
+        """加载状态变化（默认切换鼠标指针，并启用/禁用 bind_cancel_button 绑定的取消按钮）"""
+        try:
+            self.configure(cursor="watch" if loading else "")
+        except Exception:
+            pass
+        button = self.__dict__.get('_async_cancel_button')
+        if button is not None:
+            try:
+                button.configure(state="normal" if loading else "disabled")
+            except Exception:
+                pass
+
+    def bind_cancel_button(self, button):
+        """绑定取消按钮：点击时取消本界面全部后台任务，仅在加载中可用"""
+        self._async_cancel_button = button
+        button.configure(command=lambda: self.cancel_async(),
+                         state="normal" if self.is_loading() else "disabled")
+
+    def on_async_error(self, exc):
+        """后台任务异常的默认处理"""
+        from tkinter import messagebox
+        messagebox.showerror("错误", f"加载失败: {exc}")
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+进程内缓存工具
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """线程安全的LRU缓存，条目超过TTL后失效"""
+
+    def __init__(self, maxsize=1000, ttl=300):
+        """
+        :param maxsize: 最大条目数，超出时淘汰最久未使用的条目
+        :param ttl: 条目存活秒数（0表示不过期）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expire_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, default=None):
+        """读取缓存，未命中或已过期返回default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            expire_at, value = entry
+            if expire_at and expire_at < time.monotonic():
+                del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value):
+        """写入缓存"""
+        expire_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """删除单个条目"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def pop_if(self, predicate):
+        """
+        删除满足条件的条目
+        :param predicate: 函数 (key, value) -> bool
+        :return: 删除的条目数
+        """
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self):
+        """获取命中统计"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / total if total else 0.0,
+            }
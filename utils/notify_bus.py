@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+通知推送总线
+进程内发布/订阅：创建通知、标记已读后发布事件，订阅者（主界面的未读计数）直接更新，不再定时查询数据库；
+配置 notify_broker 后各终端通过本地中转服务互相推送事件（按行传输JSON），
+中转服务不可用时自动重连，期间各终端退回定时查询
+    python -m utils.notify_bus 127.0.0.1 9631
+"""
+
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+# 事件类型
+EVENT_CREATED = "created"   # 新通知（未读数+1）
+EVENT_READ = "read"         # 某条通知被标记已读（未读数-1）
+EVENT_REFRESH = "refresh"   # 批量变化，订阅者重新查询未读数
+
+
+def event_matches(event, user_id, role):
+    """事件是否发给该用户（与 NotificationLogic.get_unread_count 的条件一致）"""
+    target_role = event.get('target_role')
+    target_user_id = event.get('target_user_id')
+    return (not target_role or target_role == role) and (target_user_id is None or target_user_id == user_id)
+
+
+class NotificationBus:
+    """通知事件总线（进程内共享）"""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._address = None
+        self._thread = None
+
+    def subscribe(self, callback):
+        """
+        订阅事件，callback(event) 可能在任意线程调用
+        :return: 取消订阅的函数
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, action, **fields):
+        """
+        发布事件：先派发给本进程订阅者，再转发给中转服务（未连接时忽略）
+        :param action: EVENT_CREATED / EVENT_READ / EVENT_REFRESH
+        """
+        event = dict(fields, action=action)
+        self._dispatch(event)
+        sock = self._sock
+        if sock is not None:
+            data = (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+            try:
+                with self._send_lock:
+                    sock.sendall(data)
+            except OSError:
+                self._drop(sock)
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                traceback.print_exc()
+
+    @property
+    def connected(self):
+        """是否已连接中转服务（未连接时订阅者应定时查询）"""
+        return self._sock is not None
+
+    def connect(self, host, port, retry_interval=10):
+        """在后台线程连接中转服务，断开后每 retry_interval 秒重连（重复调用忽略）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._address = (host, port)
+            self._thread = threading.Thread(target=self._run, args=(retry_interval,),
+                                            name="notify-bus", daemon=True)
+        self._thread.start()
+
+    def _run(self, retry_interval):
+        while True:
+            try:
+                sock = socket.create_connection(self._address, timeout=5)
+                sock.settimeout(None)
+            except OSError:
+                time.sleep(retry_interval)
+                continue
+            self._sock = sock
+            # 断线期间可能漏掉事件，连上后让订阅者校正一次
+            self._dispatch({"action": EVENT_REFRESH})
+            try:
+                for line in sock.makefile("r", encoding="utf-8"):
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._dispatch(event)
+            except OSError:
+                pass
+            self._drop(sock)
+            time.sleep(retry_interval)
+
+    def _drop(self, sock):
+        if self._sock is sock:
+            self._sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
+notification_bus = NotificationBus()
+
+
+class _RelayHandler(socketserver.StreamRequestHandler):
+    """中转服务：把每个终端发来的事件转发给其他所有终端"""
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.clients.add(self)
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                with server.lock:
+                    others = [client for client in server.clients if client is not self]
+                for client in others:
+                    try:
+                        with client.write_lock:
+                            client.wfile.write(line)
+                    except OSError:
+                        pass
+        finally:
+            with server.lock:
+                server.clients.discard(self)
+
+
+class RelayServer(socketserver.ThreadingTCPServer):
+    """通知中转服务"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _RelayHandler)
+        self.lock = threading.Lock()
+        self.clients = set()
+
+
+if __name__ == "__main__":
+    host = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9631
+    with RelayServer((host, port)) as server:
+        print(f"通知中转服务已启动: {host}:{port}")
+        server.serve_forever()
@@ -3,8 +3,8 @@
 小票打印工具 - 组员1负责
 """
 
-import os
 from datetime import datetime
+from utils.receipt_store import get_store
 
 
 # 小票配置
@@ -13,7 +13,8 @@ RECEIPT_CONFIG = {
     "store_address": "XX市XX区XX路XX号",
     "store_phone": "400-XXX-XXXX",
     "width": 48,  # 小票宽度（字符数）
-    "receipts_dir": "receipts"  # 小票保存目录
+    "receipts_dir": "receipts",  # 旧版单文件小票目录（迁移工具的默认来源）
+    "store_dir": "receipts/store"  # 小票存档目录（按天分段的压缩文件）
 }
 
 
@@ -141,29 +142,18 @@ def generate_receipt(order_info, order_details, member_info=None, cashier_name="
 
 def print_receipt(receipt_text, order_no):
     """
-    打印/保存小票
+    打印/保存小票（追加到小票存档）
     :param receipt_text: 小票文本内容
-    :param order_no: 订单号（用于文件名）
-    :return: {"success": bool, "file_path": str, "message": str}
+    :param order_no: 订单号（存档键，补打时使用）
+    :return: {"success": bool, "file_path": str, "message": str}，file_path 为所在段文件
     """
     try:
-        # 确保目录存在
-        receipts_dir = RECEIPT_CONFIG["receipts_dir"]
-        if not os.path.exists(receipts_dir):
-            os.makedirs(receipts_dir)
-        
-        # 生成文件名
-        filename = f"receipt_{order_no}.txt"
-        file_path = os.path.join(receipts_dir, filename)
-        
-        # 保存文件
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(receipt_text)
+        file_path = get_store().put(order_no, receipt_text)
         
         return {
             "success": True,
             "file_path": file_path,
-            "message": f"小票已保存: {file_path}"
+            "message": f"小票已存档，单号: {order_no}"
         }
         
     except Exception as e:
@@ -254,26 +244,18 @@ def generate_return_receipt(return_info, return_details, member_info=None, opera
 
 def print_return_receipt(receipt_text, return_no):
     """
-    打印/保存退货凭证
+    打印/保存退货凭证（追加到小票存档）
     :param receipt_text: 凭证文本内容
-    :param return_no: 退货单号
+    :param return_no: 退货单号（存档键）
     :return: {"success": bool, "file_path": str, "message": str}
     """
     try:
-        receipts_dir = RECEIPT_CONFIG["receipts_dir"]
-        if not os.path.exists(receipts_dir):
-            os.makedirs(receipts_dir)
-        
-        filename = f"return_{return_no}.txt"
-        file_path = os.path.join(receipts_dir, filename)
-        
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(receipt_text)
+        file_path = get_store().put(return_no, receipt_text)
         
         return {
             "success": True,
             "file_path": file_path,
-            "message": f"退货凭证已保存: {file_path}"
+            "message": f"退货凭证已存档，单号: {return_no}"
         }
         
     except Exception as e:
@@ -282,3 +264,17 @@ def print_return_receipt(receipt_text, return_no):
             "file_path": None,
             "message": f"保存退货凭证失败: {str(e)}"
         }
+
+
+def reprint_receipt(receipt_no):
+    """
+    按订单号/退货单号从存档中取出小票补打
+    :return: {"success": bool, "data": 小票文本, "message": str}
+    """
+    try:
+        text = get_store().get(receipt_no)
+        if text is None:
+            return {"success": False, "data": None, "message": f"未找到小票: {receipt_no}"}
+        return {"success": True, "data": text, "message": "读取成功"}
+    except Exception as e:
+        return {"success": False, "data": None, "message": f"读取小票失败: {str(e)}"}
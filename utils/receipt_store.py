@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+小票存档
+小票/退货凭证按天追加写入压缩段文件（YYYYMMDD.seg），同名索引文件（YYYYMMDD.idx）记录 单号 -> 偏移，
+按单号补打只读一条记录；单号中带有日期（ORD/RT + 年月日），直接定位到当天的段文件。
+段文件只追加，索引缺失或落后（写段文件后、写索引前中断）时从段文件尾部补建。
+同一存档目录只应由一个进程写入（每台收银机各自存档）。
+    python -m utils.receipt_store migrate [receipts目录] [--remove]
+    python -m utils.receipt_store get 单号
+    python -m utils.receipt_store export 开始日期 结束日期 输出文件 [ORD|RT]
+"""
+
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, date
+
+# 记录头：魔数、单号长度、压缩内容长度、CRC32、写入时间戳
+_HEADER = struct.Struct("<4sHIId")
+_MAGIC = b"RCP1"
+
+# 单号中的日期（ORD20260107134500..., RT202601070001）
+_KEY_DATE = re.compile(r"^[A-Za-z]+(\d{8})")
+
+# 旧版单文件小票的文件名
+_LEGACY_FILE = re.compile(r"^(?:receipt|return)_(.+)\.txt$")
+
+
+def _day_of(key, created=None):
+    """单号所属日期 YYYYMMDD（单号中没有日期时取写入时间）"""
+    match = _KEY_DATE.match(key)
+    if match:
+        try:
+            datetime.strptime(match.group(1), "%Y%m%d")
+            return match.group(1)
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(created or time.time()).strftime("%Y%m%d")
+
+
+class ReceiptStore:
+    """分段追加的小票存档"""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self._lock = threading.Lock()
+        self._indexes = {}   # day -> {key: offset}
+        self._indexed_end = {}  # day -> 索引覆盖到的段文件末尾
+
+    def _paths(self, day):
+        base = os.path.join(self.store_dir, day)
+        return base + ".seg", base + ".idx"
+
+    def _load_index(self, day):
+        """加载某天的索引（调用方持有锁），并补建索引落后的部分"""
+        index = self._indexes.get(day)
+        if index is not None:
+            return index
+        seg_path, idx_path = self._paths(day)
+        index, end = {}, 0
+        if os.path.exists(idx_path):
+            with open(idx_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) != 3:
+                        continue
+                    key, offset, length = parts[0], int(parts[1]), int(parts[2])
+                    index[key] = offset
+                    end = max(end, offset + length)
+        self._indexes[day] = index
+        self._indexed_end[day] = end
+        if os.path.exists(seg_path) and os.path.getsize(seg_path) > end:
+            self._recover(day)
+        return index
+
+    def _recover(self, day):
+        """从段文件中索引未覆盖的位置开始扫描，补写索引（截断的尾记录忽略）"""
+        seg_path, idx_path = self._paths(day)
+        index = self._indexes[day]
+        offset = self._indexed_end[day]
+        entries = []
+        with open(seg_path, "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                magic, key_len, data_len, _, _ = _HEADER.unpack(header)
+                if magic != _MAGIC:
+                    break
+                body = f.read(key_len + data_len)
+                if len(body) < key_len + data_len:
+                    break
+                key = body[:key_len].decode("utf-8")
+                length = _HEADER.size + key_len + data_len
+                entries.append((key, offset, length))
+                offset += length
+        if entries:
+            with open(idx_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{key}\t{start}\t{length}\n" for key, start, length in entries)
+            for key, start, _ in entries:
+                index[key] = start
+        self._indexed_end[day] = offset
+
+    def put(self, key, text, created=None):
+        """
+        追加一张小票（同一单号重复写入时以最后一次为准）
+        :param key: 订单号/退货单号
+        :param text: 小票文本
+        :param created: 写入时间戳，默认当前时间（迁移旧文件时取文件修改时间）
+        :return: 段文件路径
+        """
+        created = created or time.time()
+        day = _day_of(key, created)
+        key_bytes = key.encode("utf-8")
+        data = zlib.compress(text.encode("utf-8"))
+        record = _HEADER.pack(_MAGIC, len(key_bytes), len(data), zlib.crc32(data), created) + key_bytes + data
+        seg_path, idx_path = self._paths(day)
+        with self._lock:
+            os.makedirs(self.store_dir, exist_ok=True)
+            index = self._load_index(day)
+            with open(seg_path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(record)
+            with open(idx_path, "a", encoding="utf-8") as f:
+                f.write(f"{key}\t{offset}\t{len(record)}\n")
+            index[key] = offset
+            self._indexed_end[day] = offset + len(record)
+        return seg_path
+
+    def _read_at(self, day, offset):
+        """读取段文件中某偏移处的记录 -> (key, text, created)"""
+        seg_path, _ = self._paths(day)
+        with open(seg_path, "rb") as f:
+            f.seek(offset)
+            magic, key_len, data_len, crc, created = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"小票存档损坏: {seg_path}@{offset}")
+            key = f.read(key_len).decode("utf-8")
+            data = f.read(data_len)
+        if zlib.crc32(data) != crc:
+            raise ValueError(f"小票校验失败: {key}")
+        return key, zlib.decompress(data).decode("utf-8"), created
+
+    def _days(self):
+        """存档中已有的日期（升序）"""
+        if not os.path.isdir(self.store_dir):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.store_dir) if name.endswith(".seg"))
+
+    def get(self, key):
+        """按单号读取小票文本，不存在返回None"""
+        match = _KEY_DATE.match(key)
+        days = [_day_of(key)] if match else self._days()
+        for day in days:
+            with self._lock:
+                offset = self._load_index(day).get(key)
+            if offset is not None:
+                return self._read_at(day, offset)[1]
+        return None
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._load_index(_day_of(key))
+
+    def iter_range(self, start_day, end_day, prefix=None):
+        """
+        按日期范围遍历小票（按写入顺序）
+        :param start_day: 开始日期 YYYYMMDD（含）
+        :param end_day: 结束日期 YYYYMMDD（含）
+        :param prefix: 单号前缀过滤（如 ORD / RT）
+        :return: 生成器 (key, text, created)
+        """
+        for day in self._days():
+            if not start_day <= day <= end_day:
+                continue
+            with self._lock:
+                offsets = sorted(set(self._load_index(day).values()))
+            for offset in offsets:
+                key, text, created = self._read_at(day, offset)
+                if prefix and not key.startswith(prefix):
+                    continue
+                # 同一单号重复写入时只导出最后一次
+                with self._lock:
+                    if self._indexes[day].get(key) != offset:
+                        continue
+                yield key, text, created
+
+    def export_range(self, start_day, end_day, out_path, prefix=None):
+        """
+        导出日期范围内的小票到一个文本文件
+        :return: 导出张数
+        """
+        count = 0
+        with open(out_path, "w", encoding="utf-8") as out:
+            for key, text, created in self.iter_range(start_day, end_day, prefix):
+                out.write(f"===== {key} {datetime.fromtimestamp(created).strftime('%Y-%m-%d %H:%M:%S')} =====\n")
+                out.write(text)
+                out.write("\n\n")
+                count += 1
+        return count
+
+    def migrate_directory(self, src_dir, remove=False):
+        """
+        导入旧版 receipts/ 目录中的单文件小票（receipt_单号.txt / return_单号.txt），已存档的单号跳过
+        :param remove: 导入成功后删除原文件
+        :return: (导入数, 跳过数)
+        """
+        imported = skipped = 0
+        for name in sorted(os.listdir(src_dir)):
+            match = _LEGACY_FILE.match(name)
+            path = os.path.join(src_dir, name)
+            if not match or not os.path.isfile(path):
+                continue
+            key = match.group(1)
+            if self.contains(key):
+                skipped += 1
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                self.put(key, text, created=os.path.getmtime(path))
+                imported += 1
+            if remove:
+                os.remove(path)
+        return imported, skipped
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(store_dir=None):
+    """按目录取共享的存档实例，默认目录取 RECEIPT_CONFIG['store_dir']"""
+    if store_dir is None:
+        from utils.print_utils import RECEIPT_CONFIG
+        store_dir = RECEIPT_CONFIG["store_dir"]
+    with _stores_lock:
+        store = _stores.get(store_dir)
+        if store is None:
+            store = _stores[store_dir] = ReceiptStore(store_dir)
+        return store
+
+
+def _parse_day(text):
+    return date.fromisoformat(text).strftime("%Y%m%d") if "-" in text else text
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    command = args[0] if args else ""
+    store = get_store()
+    if command == "migrate":
+        from utils.print_utils import RECEIPT_CONFIG
+        paths = [arg for arg in args[1:] if arg != "--remove"]
+        src = paths[0] if paths else RECEIPT_CONFIG["receipts_dir"]
+        imported, skipped = store.migrate_directory(src, remove="--remove" in args)
+        print(f"导入{imported}张，已存在跳过{skipped}张")
+    elif command == "get" and len(args) == 2:
+        text = store.get(args[1])
+        if text is None:
+            print("未找到该单号的小票")
+            sys.exit(1)
+        print(text)
+    elif command == "export" and len(args) in (4, 5):
+        count = store.export_range(_parse_day(args[1]), _parse_day(args[2]), args[3],
+                                   args[4] if len(args) == 5 else None)
+        print(f"已导出{count}张小票到 {args[3]}")
+    else:
+        print("用法: python -m utils.receipt_store migrate [目录] [--remove] | get 单号 | "
+              "export 开始日期 结束日期 输出文件 [ORD|RT]")
+        sys.exit(1)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Treeview 表格工具
+"""
+
+
+class KeyedTreeAdapter:
+    """
+    按行键增量更新 ttk.Treeview
+    每次传入完整的目标数据，只对新增/变化/删除的行调用 insert/item/delete，
+    未变化的行不重建，选中状态和滚动位置随之保留
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._iids = {}    # 行键 -> Treeview iid
+        self._rows = {}    # 行键 -> (values, tags)
+
+    def update(self, rows):
+        """
+        同步表格内容
+        :param rows: 可迭代对象，元素为 (key, values) 或 (key, values, tags)，顺序即显示顺序
+        :return: dict {inserted, updated, deleted}
+        """
+        tree = self.tree
+        desired = []
+        new_rows = {}
+        for row in rows:
+            key, values = row[0], tuple(row[1])
+            tags = tuple(row[2]) if len(row) > 2 and row[2] else ()
+            if key in new_rows:
+                raise ValueError(f"重复的行键: {key!r}")
+            new_rows[key] = (values, tags)
+            desired.append(key)
+
+        # 删除
+        removed = [key for key in self._rows if key not in new_rows]
+        if removed:
+            tree.delete(*[self._iids.pop(key) for key in removed])
+            for key in removed:
+                del self._rows[key]
+
+        # 新增/更新
+        inserted = updated = 0
+        for key in desired:
+            values, tags = new_rows[key]
+            old = self._rows.get(key)
+            if old is None:
+                self._iids[key] = tree.insert("", "end", values=values, tags=tags)
+                inserted += 1
+            elif old != (values, tags):
+                tree.item(self._iids[key], values=values, tags=tags)
+                updated += 1
+            self._rows[key] = (values, tags)
+
+        # 调整顺序：从第一处不一致的位置开始移动
+        target = [self._iids[key] for key in desired]
+        current = list(tree.get_children())
+        if current != target:
+            start = next((i for i, (a, b) in enumerate(zip(current, target)) if a != b),
+                         min(len(current), len(target)))
+            for index in range(start, len(target)):
+                tree.move(target[index], "", index)
+
+        return {"inserted": inserted, "updated": updated, "deleted": len(removed)}
+
+    def clear(self):
+        """清空表格"""
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._iids.clear()
+        self._rows.clear()
+
+    def key_of(self, iid):
+        """根据 Treeview iid 查找行键"""
+        for key, item_iid in self._iids.items():
+            if item_iid == iid:
+                return key
+        return None
+
+
+def single_page(rows):
+    """把一次性查询的结果包装为分页结果（无后续页）"""
+    return {"success": True, "data": {"rows": rows, "next_after": None, "has_more": False}, "message": ""}
+
+
+class PagedTreeLoader:
+    """
+    Treeview 分页懒加载（滑动窗口）
+    首屏只取一页，滚动接近底部时在后台预取下一页并追加，接近顶部时重新取回已移出的上一页；
+    表格中最多保留 max_pages 页的行数，超出时移除离可见区域最远的页（记住各页的游标，滚回时按游标重取），
+    打开时间、内存占用和重绘开销与总行数无关；滚动条表示的是当前窗口而不是整个列表。
+    查询通过所属界面的 run_async 执行（需混入 AsyncFrameMixin）
+    """
+
+    def __init__(self, frame, tree, scrollbar, to_row, page_size=200, prefetch_at=0.8,
+                 on_page=None, key="paged_tree", max_pages=5):
+        """
+        :param frame: 所属界面
+        :param tree: ttk.Treeview
+        :param scrollbar: 纵向滚动条
+        :param to_row: 记录转表格行 to_row(record) -> (key, values)
+        :param page_size: 每页条数
+        :param prefetch_at: 可见区域底部到达该比例时预取下一页（顶部低于 1 - prefetch_at 时取回上一页）
+        :param on_page: 每页首次加载完成的回调 on_page(rows, first_page)，滚回时重取的页不再回调
+        :param key: 后台任务标识
+        :param max_pages: 表格中最多保留的页数（至少3页，避免上下预取来回触发）
+        """
+        self.frame = frame
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.to_row = to_row
+        self.page_size = page_size
+        self.prefetch_at = prefetch_at
+        self.on_page = on_page
+        self.key = key
+        self.max_pages = max(3, max_pages)
+
+        self._fetch = None
+        self._cursors = []      # 第 i 页的查询游标（after），已知的页才有
+        self._window = []       # 表格中保留的各页行键，依次为第 _first_page 页起的连续页
+        self._first_page = 0
+        self._pages_seen = 0    # 已回调过 on_page 的页数
+        self._stopped = False
+        self._loading = False
+        self._task = None
+        self._generation = 0
+        self._iids = {}
+
+        tree.configure(yscrollcommand=self._on_yscroll)
+
+    def reload(self, fetch_page):
+        """
+        清空并从第一页开始加载
+        :param fetch_page: 分页查询 fetch_page(after, limit) -> {"success", "data": {"rows", "next_after", "has_more"}, "message"}
+        """
+        self._generation += 1
+        self._fetch = fetch_page
+        self._cursors = [None]
+        self._window = []
+        self._first_page = 0
+        self._pages_seen = 0
+        self._stopped = False
+        self._loading = False
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._iids.clear()
+        self._load_page(0)
+
+    def update_row(self, record):
+        """更新已加载的某一行（如补货后），未加载时忽略"""
+        key, values = self.to_row(record)[:2]
+        iid = self._iids.get(key)
+        if iid is not None:
+            self.tree.item(iid, values=tuple(values))
+
+    @property
+    def row_count(self):
+        return len(self._iids)
+
+    def _load_page(self, index):
+        # 加载中的页被取消（界面的取消按钮）时允许重新请求
+        if self._loading and self._task is not None and self._task.cancelled:
+            self._loading = False
+        if self._loading or self._stopped or self._fetch is None:
+            return
+        if not 0 <= index < len(self._cursors):
+            return
+        self._loading = True
+        generation = self._generation
+        self._task = self.frame.run_async(self._fetch, self._cursors[index], self.page_size,
+                                          on_done=lambda result: self._on_page(generation, index, result),
+                                          on_error=lambda e: self._on_error(generation, e),
+                                          key=self.key)
+
+    def _load_next(self):
+        self._load_page(self._first_page + len(self._window))
+
+    def _load_previous(self):
+        if self._first_page > 0:
+            self._load_page(self._first_page - 1)
+
+    def _on_page(self, generation, index, result):
+        if generation != self._generation:
+            return
+        self._loading = False
+        if not result.get('success'):
+            self._stopped = True
+            self.frame.on_async_error(result.get('message'))
+            return
+
+        data = result['data']
+        rows = []
+        for record in data['rows']:
+            key, values = self.to_row(record)[:2]
+            if key not in self._iids:
+                rows.append((key, tuple(values)))
+        if data['has_more'] and len(self._cursors) == index + 1:
+            self._cursors.append(data['next_after'])
+
+        top = self._top_index()
+        if index == self._first_page + len(self._window):
+            for key, values in rows:
+                self._iids[key] = self.tree.insert("", "end", values=values)
+            self._window.append([key for key, _ in rows])
+            removed = 0
+            while self._over_limit():
+                removed += self._evict(self._window.pop(0))
+                self._first_page += 1
+            if removed:
+                self._scroll_to(top - removed)
+            if index >= self._pages_seen and self.on_page is not None:
+                self._pages_seen = index + 1
+                self.on_page(data['rows'], index == 0)
+        elif index == self._first_page - 1:
+            for position, (key, values) in enumerate(rows):
+                self._iids[key] = self.tree.insert("", position, values=values)
+            self._window.insert(0, [key for key, _ in rows])
+            self._first_page -= 1
+            self._scroll_to(top + len(rows))
+            while self._over_limit():
+                self._evict(self._window.pop())
+
+        # 已加载的行还不足一屏时继续预取
+        self.tree.after_idle(self._check_prefetch)
+
+    def _over_limit(self):
+        """表格中的行数超过 max_pages 页（按行数计，分段查询可能返回不满一页）"""
+        return len(self._window) > 1 and len(self._iids) > self.max_pages * self.page_size
+
+    def _evict(self, keys):
+        """移除一页的行，返回移除的行数"""
+        iids = [self._iids.pop(key) for key in keys if key in self._iids]
+        if iids:
+            self.tree.delete(*iids)
+        return len(iids)
+
+    def _top_index(self):
+        """可见区域第一行的序号"""
+        try:
+            first, _ = self.tree.yview()
+        except Exception:
+            return 0
+        return round(float(first) * len(self._iids))
+
+    def _scroll_to(self, top):
+        """顶部增删行之后滚动到原来可见的行（top 为该行现在的序号）"""
+        total = len(self._iids)
+        if total:
+            self.tree.yview_moveto(max(0, top) / total)
+
+    def _on_error(self, generation, exc):
+        if generation != self._generation:
+            return
+        self._loading = False
+        self._stopped = True
+        self.frame.on_async_error(exc)
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._prefetch(float(first), float(last))
+
+    def _check_prefetch(self):
+        try:
+            first, last = self.tree.yview()
+        except Exception:
+            return
+        self._prefetch(first, last)
+
+    def _prefetch(self, first, last):
+        if last >= self.prefetch_at:
+            self._load_next()
+        elif first <= 1 - self.prefetch_at:
+            self._load_previous()